@@ -0,0 +1,127 @@
+"""
+Microbenchmark: figure construction through plotly.express vs the figure factory in figures.py.
+
+    python bench_figures.py [repeats]
+
+Builds the county map, the national subcounty map and the county / PCN bar charts
+both ways on the real boundary files with random scores, and prints the median
+build time of each. Only server-side construction is timed; st.plotly_chart
+serialises the figure the same way for both.
+"""
+import json
+import statistics
+import sys
+import time
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import plotly.express as px
+
+from figures import align_to_features, choropleth_map, feature_keys, single_trace_bar
+
+COUNTY_SHAPE = "ken_admbnda_adm1_iebc_20191031.shp"
+SUBCOUNTY_SHAPE = "ken_admbnda_adm2_iebc_20191031.shp"
+CENTER = {"lat": 0.5, "lon": 37.9}
+INDICATOR = "Indicator"
+
+
+def load_geojson(path, name_column, key):
+    gdf = gpd.read_file(path)
+    if gdf.crs != "EPSG:4326":
+        gdf = gdf.to_crs(epsg=4326)
+    gdf = gdf[[name_column, 'geometry']].rename(columns={name_column: key})
+    return json.loads(gdf.to_json())
+
+
+def express_map(df, geojson, location_col, featureidkey, zoom, opacity, line_width):
+    # the px.choropleth_mapbox path the dashboard used
+    fig = px.choropleth_mapbox(
+        df, geojson=geojson, locations=location_col, featureidkey=featureidkey,
+        color=INDICATOR, hover_name=location_col, color_continuous_scale="RdYlGn",
+        mapbox_style="white-bg", zoom=zoom, center=CENTER, opacity=opacity,
+        labels={INDICATOR: "Score (%)"},
+    )
+    fig.update_traces(marker_line={'width': line_width, 'color': 'grey'}, selector=dict(type='choroplethmapbox'))
+    fig.update_layout(
+        coloraxis_colorbar=dict(
+            title=dict(text="Score (%)", font=dict(color="black", size=12)),
+            tickformat=".0f", tickfont=dict(color="black"),
+            x=0.97, xanchor="right", y=0.5, yanchor="middle", len=0.6, thickness=12,
+            bgcolor="rgba(255,255,255,0.6)",
+        ),
+        margin={"r": 0, "t": 30, "l": 0, "b": 0},
+    )
+    fig.add_annotation(
+        text=f"{INDICATOR} map", xref="paper", yref="paper", x=0.5, y=0.98, showarrow=False,
+        font=dict(size=11, color="black"), bgcolor="rgba(255,255,255,0.7)",
+        bordercolor="black", borderwidth=1, borderpad=6,
+    )
+    return fig
+
+
+def express_bar(df, x):
+    fig = px.bar(
+        df.sort_values(INDICATOR, ascending=False), x=x, y=INDICATOR, color=x,
+        text=INDICATOR, title=INDICATOR, labels={INDICATOR: 'Score (%)'},
+    )
+    fig.update_traces(texttemplate='%{text:.1f}', textposition='outside')
+    fig.update_layout(showlegend=False)
+    return fig
+
+
+def timed(fn, repeats):
+    fn()  # first call pays for imports and the layout template
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+
+def main(argv):
+    repeats = int(argv[1]) if len(argv) > 1 else 10
+    rng = np.random.default_rng(0)
+    county_geojson = load_geojson(COUNTY_SHAPE, 'ADM1_EN', 'County_Name_Key')
+    sub_geojson = load_geojson(SUBCOUNTY_SHAPE, 'ADM2_EN', 'Subcounty_Name_Key')
+
+    county_names = feature_keys(county_geojson, "properties.County_Name_Key")
+    sub_names = feature_keys(sub_geojson, "properties.Subcounty_Name_Key")
+    county_df = pd.DataFrame({'County': county_names, INDICATOR: rng.uniform(0, 100, len(county_names))})
+    sub_df = pd.DataFrame({'Sub county': sub_names, INDICATOR: rng.uniform(0, 100, len(sub_names))})
+
+    def factory_map(df, geojson, location_col, featureidkey, style, zoom):
+        locations, values = align_to_features(
+            feature_keys(geojson, featureidkey), df[location_col].to_numpy(), df[INDICATOR].to_numpy())
+        return choropleth_map(geojson, featureidkey, locations, values, f"{INDICATOR} map",
+                              style=style, zoom=zoom, center=CENTER, location_title=location_col)
+
+    cases = [
+        ('county map', f"{len(county_names)} features",
+         lambda: express_map(county_df, county_geojson, 'County', "properties.County_Name_Key", 5.0, 0.8, 0.8),
+         lambda: factory_map(county_df, county_geojson, 'County', "properties.County_Name_Key", 'county', 5.0)),
+        ('subcounty map', f"{len(sub_names)} features",
+         lambda: express_map(sub_df, sub_geojson, 'Sub county', "properties.Subcounty_Name_Key", 5.0, 0.85, 0.5),
+         lambda: factory_map(sub_df, sub_geojson, 'Sub county', "properties.Subcounty_Name_Key", 'subcounty', 5.0)),
+        ('county bar', f"{len(county_df)} bars",
+         lambda: express_bar(county_df, 'County'),
+         lambda: single_trace_bar(county_df['County'].to_numpy(), county_df[INDICATOR].to_numpy(), INDICATOR, 'County')),
+        ('subcounty bar', f"{len(sub_df)} bars",
+         lambda: express_bar(sub_df, 'Sub county'),
+         lambda: single_trace_bar(sub_df['Sub county'].to_numpy(), sub_df[INDICATOR].to_numpy(), INDICATOR,
+                                  'Sub county', top_n=30, bottom_n=15)),
+    ]
+
+    rows = []
+    for name, size, express_fn, factory_fn in cases:
+        express_ms = timed(express_fn, repeats)
+        factory_ms = timed(factory_fn, repeats)
+        rows.append({'figure': name, 'size': size, 'express_ms': round(express_ms, 1),
+                     'factory_ms': round(factory_ms, 1), 'speedup': round(express_ms / factory_ms, 1)})
+    print(f"median of {repeats} builds")
+    print(pd.DataFrame(rows).set_index('figure').to_string())
+
+
+if __name__ == "__main__":
+    main(sys.argv)
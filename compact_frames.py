@@ -0,0 +1,155 @@
+"""
+Compact in-memory layout for the cleaned county and PCN frames.
+
+Today's layout keeps every score as float64 and County / Sub county / PCN as
+Python string objects, and every pillar .copy() or filter copy repeats those
+object columns. The compact layout turns the name columns into categoricals that
+share one dictionary across both frames (so a copy only duplicates small integer
+codes) and downcasts the scores to float32, or to nullable small ints when every
+value is a whole number. Section-header columns are already dropped by the
+declared schema in data_schema.py.
+
+Turn it on with PCN_COMPACT_FRAMES=1 (float32 scores) or PCN_COMPACT_FRAMES=ints
+(nullable UInt8/Int16/Int32 where the data allows, float32 otherwise).
+
+    python compact_frames.py [county_csv] [pcn_csv]
+
+prints the memory report comparing both layouts.
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+COMPACT_ENV_VAR = "PCN_COMPACT_FRAMES"
+NAME_COLUMNS = ['County', 'Sub county', 'PCN']
+
+# smallest first; the first one that holds the column's range wins
+_INT_DTYPES = [('UInt8', np.uint8), ('Int16', np.int16), ('Int32', np.int32)]
+
+
+def compact_mode():
+    # "" (off), "float32" or "ints"
+    value = os.environ.get(COMPACT_ENV_VAR, "").strip().lower()
+    if value in ("", "0", "false", "off"):
+        return ""
+    return "ints" if value == "ints" else "float32"
+
+
+def shared_name_dtype(frames, columns=NAME_COLUMNS):
+    # one dictionary for every name column of every frame, so codes compare and merge across frames
+    values = set()
+    for df in frames:
+        for col in columns:
+            if col in df.columns:
+                values.update(df[col].dropna().astype(str).unique())
+    return pd.CategoricalDtype(sorted(values))
+
+
+def downcast_scores(series, nullable_ints=False):
+    if nullable_ints:
+        values = series.dropna().to_numpy()
+        if len(values) and np.array_equal(values, np.round(values)):
+            lo, hi = values.min(), values.max()
+            for dtype_name, np_type in _INT_DTYPES:
+                info = np.iinfo(np_type)
+                if lo >= info.min and hi <= info.max:
+                    return series.astype(dtype_name)
+    return series.astype('float32')
+
+
+def compact_frame(df, name_dtype, nullable_ints=False):
+    columns = {}
+    for col in df.columns:
+        s = df[col]
+        if col in NAME_COLUMNS:
+            columns[col] = s.astype(str).where(s.notna()).astype(name_dtype)
+        elif pd.api.types.is_float_dtype(s):
+            columns[col] = downcast_scores(s, nullable_ints)
+        else:
+            columns[col] = s
+    return pd.DataFrame(columns, index=df.index)
+
+
+def compact_frames(frames, nullable_ints=False):
+    name_dtype = shared_name_dtype(frames)
+    return [compact_frame(df, name_dtype, nullable_ints) for df in frames], name_dtype
+
+
+def frame_bytes(df, deep=True):
+    # categorical columns count their codes only: the dictionary is shared, see dictionary_bytes().
+    # deep=False counts object columns as pointers, which is what a copy of an existing frame costs
+    total = int(df.index.memory_usage(deep=deep))
+    for _, s in df.items():
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            total += s.cat.codes.nbytes
+        else:
+            total += int(s.memory_usage(deep=deep, index=False))
+    return total
+
+
+def dictionary_bytes(name_dtype):
+    return int(name_dtype.categories.memory_usage(deep=True))
+
+
+def memory_report(current, compact, name_dtype=None):
+    # current / compact: {label: DataFrame, or a list of copies taken from one}; one row per label plus a total
+    def size(frames):
+        if isinstance(frames, list):
+            # copies share the string objects of the frame they came from
+            return sum(frame_bytes(df, deep=False) for df in frames)
+        return frame_bytes(frames)
+
+    rows = [
+        {'frame': label, 'current_bytes': size(frames), 'compact_bytes': size(compact[label])}
+        for label, frames in current.items()
+    ]
+    if name_dtype is not None:
+        rows.append({'frame': 'shared name dictionary', 'current_bytes': 0,
+                     'compact_bytes': dictionary_bytes(name_dtype)})
+    report = pd.DataFrame(rows)
+    total = pd.DataFrame([{
+        'frame': 'TOTAL',
+        'current_bytes': report['current_bytes'].sum(),
+        'compact_bytes': report['compact_bytes'].sum(),
+    }])
+    report = pd.concat([report, total], ignore_index=True)
+    saved = 1 - report['compact_bytes'] / report['current_bytes'].where(report['current_bytes'] > 0)
+    report['saved_pct'] = (100 * saved).round(1)
+    return report.set_index('frame')
+
+
+def indicator_slices(df):
+    # what the UI copies on a rerun: [name columns + one indicator] for every indicator
+    names = [c for c in NAME_COLUMNS if c in df.columns]
+    return [df[names + [c]].copy() for c in df.columns if c not in names and df[c].dtype.kind in 'fiu']
+
+
+def main(argv):
+    # the dashboard's own loaders, so the report measures the frames the app actually holds
+    from pcn_data import read_county_csv, read_pcn_csv
+
+    county_csv = argv[1] if len(argv) > 1 else "county_lvl_data.csv"
+    pcn_csv = argv[2] if len(argv) > 2 else "pcn_lvl_data.csv"
+    county_df, _ = read_county_csv(county_csv)
+    pcn_df, _ = read_pcn_csv(pcn_csv)
+    nullable_ints = compact_mode() == "ints"
+    (county_small, pcn_small), name_dtype = compact_frames([county_df, pcn_df], nullable_ints)
+
+    current = {
+        'county': county_df, 'pcn': pcn_df,
+        'county indicator slices': indicator_slices(county_df),
+        'pcn indicator slices': indicator_slices(pcn_df),
+    }
+    compact = {
+        'county': county_small, 'pcn': pcn_small,
+        'county indicator slices': indicator_slices(county_small),
+        'pcn indicator slices': indicator_slices(pcn_small),
+    }
+    print(f"score dtype: {'nullable ints where whole numbers' if nullable_ints else 'float32'}")
+    print(memory_report(current, compact, name_dtype).to_string())
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,77 @@
+"""
+Pairwise indicator correlations for the county and PCN tables.
+
+The full matrix is computed once for every numeric column with a handful of
+matrix products instead of a Python loop over column pairs: each pair uses only
+the rows where both indicators are present (pairwise-complete, like
+DataFrame.corr), and pairs with too few shared rows or no variance come out NaN.
+Pillar views are slices of that one matrix.
+"""
+import numpy as np
+import pandas as pd
+
+METHODS = ('pearson', 'spearman')
+
+
+def _rank_columns(X):
+    # average ranks per column, NaN stays NaN. Spearman ranks each column over all of its
+    # observed values rather than re-ranking inside every pair's overlap (what pandas does),
+    # which is what keeps it to one vectorized pass; the two agree when missingness is shared.
+    return pd.DataFrame(X).rank(method='average').to_numpy()
+
+
+def pairwise_corr(X, method='pearson', min_periods=3):
+    """Correlation and shared-row counts for the columns of a 2-D float array with NaNs."""
+    if method not in METHODS:
+        raise ValueError(f"method must be one of {METHODS}, got {method!r}")
+    X = np.asarray(X, dtype=np.float64)
+    if method == 'spearman':
+        X = _rank_columns(X)
+
+    present = ~np.isnan(X)
+    mask = present.astype(np.float64)
+    # centring first keeps the sums of squares small, so the one-pass formulas below don't lose precision
+    counts = present.sum(axis=0)
+    col_means = np.where(present, X, 0.0).sum(axis=0) / np.maximum(counts, 1)
+    Xc = np.where(present, X - col_means, 0.0)
+
+    n = mask.T @ mask                  # rows shared by each pair
+    sx = Xc.T @ mask                   # sum of column i over rows where j is present
+    sxx = (Xc * Xc).T @ mask
+    sxy = Xc.T @ Xc
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cov = sxy - sx * sx.T / n
+        var_x = sxx - sx * sx / n
+        var_y = var_x.T
+        r = cov / np.sqrt(var_x * var_y)
+
+    r[(n < min_periods) | ~np.isfinite(r)] = np.nan
+    # sub-epsilon variances come out as tiny noise instead of zero; clip to the valid range
+    r = np.clip(r, -1.0, 1.0)
+    return r, n.astype(np.int64)
+
+
+def correlation_frames(df, method='pearson', min_periods=3):
+    """(corr, counts) as DataFrames over every numeric column of df."""
+    numeric = df.select_dtypes(include='number')
+    numeric = numeric.loc[:, numeric.notna().any()]
+    r, n = pairwise_corr(numeric.to_numpy(dtype=np.float64, na_value=np.nan), method, min_periods)
+    cols = numeric.columns
+    return pd.DataFrame(r, index=cols, columns=cols), pd.DataFrame(n, index=cols, columns=cols)
+
+
+def strongest_pairs(corr, counts, top=15):
+    # upper triangle only, sorted by |r|
+    k = corr.shape[0]
+    iu = np.triu_indices(k, 1)
+    values = corr.to_numpy()[iu]
+    keep = ~np.isnan(values)
+    order = np.argsort(-np.abs(values[keep]))[:top]
+    rows, cols = iu[0][keep][order], iu[1][keep][order]
+    return pd.DataFrame({
+        'Indicator A': corr.index[rows],
+        'Indicator B': corr.columns[cols],
+        'r': values[keep][order].round(3),
+        'Shared rows': counts.to_numpy()[rows, cols],
+    })
@@ -1,11 +1,36 @@
-import pandas as pd
 import streamlit as st
 import numpy as np
-import plotly.express as px
 import plotly.graph_objects as go
-import io
-import geopandas as gpd
-import json
+import os
+from warmup import CacheWarmer, log_selection, top_selections, warmup_enabled
+from disk_cache import data_version, disk_cached
+from data_schema import format_drift_report, has_drift
+from pcn_data import (PCN_PILLAR_KEYWORDS, PILLAR_KEYWORDS, county_geojson, group_columns_by_pillar, read_county_csv,
+                      read_pcn_csv, standardize_name, subcounty_geojson)
+from compact_frames import compact_frames, compact_mode
+from correlation import correlation_frames, strongest_pairs
+from scoring import ScoringEngine, compare_rankings
+from rollup import ROLLUP_STATS, CountyRollup
+from hierarchy import ALL, PCNHierarchy
+from data_table import PAGE_SIZES, page_count, page_frame, table_positions
+from exports import (EXPORT_FORMATS, MAX_MB_ENV_VAR, available_formats, export_callable, export_name, selection_frame,
+                     too_large)
+from indicator_search import IndicatorIndex, catalog_entries
+from rounds import CHANGE_METRICS, RoundComparison, load_rounds
+from indicator_matrix import ROW_ORDERS, SCALES, IndicatorMatrix
+from peers import MAX_K, PeerIndex
+from spatial import COLDSPOT, HOTSPOT, adjacency_path, global_morans_i, load_adjacency, local_morans_i
+from data_bundle import DataBundle, bundle_path
+from geo_partitions import bbox_view, features_bbox, load_national, load_partition, partition_index
+from figures import (COLDSPOT_COLOR, HOTSPOT_COLOR, add_outlines, align_to_features, choropleth_map, delta_bar, feature_keys,
+                     single_trace_bar, unique_labels)
+from metrics import RerunTimer, counted, metrics_enabled, record_figure, start_metrics_server
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+# per-section rerun timings, cache hit/miss counts and chart sizes (opt-in: PCN_METRICS_PORT / PCN_METRICS_FILE)
+_run_ctx = get_script_run_ctx()
+rerun_timer = RerunTimer(_run_ctx.session_id if _run_ctx is not None else None)
+rerun_timer.section("setup")
 
 # -------------------------
 # 1. CONFIG (kept from your final script)
@@ -13,332 +38,669 @@ import json
 
 # --- 1. CONFIGURATION AND DATA STRUCTURES ---
 
-PILLAR_KEYWORDS = {
-    '1. Governance': [
-        'Proportion of functional PHC advisory Committees in Place',
-        'Proportion of PCNs Established',
-        'Proportion of PCNs Gazetted',
-        'Availability of a Functional PCN management committee',
-        'Proportion of Hospital management boards appointed/gazetted:',
-        'Proportion of Health Facilities (level 2&3) with Health Facility Management Committee Appointed/Gazetted',
-        'Availability of a functional PHC TWG Score',
-        'Proportion of PCNs with an operational budget for the MDT activities:',
-        'Perfomance Review Score',
-        'CHMT Support Supervision Score',
-        'Governance Score',
-        'Governance Weighted Score'
-    ],
-    '2. Human Resources for Health (HRH)': [
-        'Does the County have a mechanism to enhance health workers skills',
-        'HRH Score',
-        'HRH Weighted Score'
-    ],
-    '3. Health Product Technologies (HPT)': [
-        'Proportion of county health budget allocated to drugs and supplies',
-        'Proportion of county HPT budget allocated to levels 2&3 :',
-        'HPT Score',
-        'HPT Weighted Score'
-    ],
-    '4. Service Delivery Systems': [
-        'PCNs with functional refferal mechanisms',
-        'Service Delivery Systems Score',
-        'Service Delivery Systems Weighted Score'
-    ],
-    '5. Healthcare Financing': [
-        'Proportion of households registered on SHA within the County',
-        'Healthcare Financing Score',
-        'Healthcare Financing Weighted Score'
-    ],
-    '6. HMIS/Digital Health': [
-        'Proportion of SMART PCNs in the County',
-        'HMIS Score',
-        'HMIS Weighted Score'
-    ],
-    '7. Quality of Care (QoC) - Management Systems': [
-        'Mechanism to Coordinate Quality Improvement Score',
-        'Mechanism for Implementation of Support Supervision in Health Facilities Score',
-        'Presence of an Infection Prevention Control (IPC) committee Score',
-        'QoC Management Systems Score',
-        'QoC Management Systems Weighted Score'
-    ],
-    '8. Multisectoral Partnerships and Coordination': [
-        'Number of bi-annual multisectoral stakeholder forums Score',
-        'Proportion of MOUs and partnership agreements aligned to PHC signed',
-        'Research studies done on PCN implementation Score',
-        'Multisectoral Partnerships and Coordination Score',
-        'Multisectoral Partnerships and Coordination Weighted Score'
-    ],
-    '9. Innovations and Learning': [
-        'Number of knowledge management and learning forums conducted Score:',
-        'No. of research studies done on PCN implementation Score',
-        'Innovations and Learning Score',
-        'Innovations and Learning Weighted Score'
-    ],
-    '10. Overall Score': [
-        'Total County Score (Total Weighted Score)',
-    ]
-}
-
-# PCN-level pillar keywords (based on the long header you shared).
-# Use substrings from the header so group_columns_by_pillar will catch the right columns.
-PCN_PILLAR_KEYWORDS = {
-    '1. Governance': [
-        'Proportion of functional Community Health Committees',
-        'Proportion of Health facilities that have received supportive supervision',
-        'Functional PCN Management committee',
-        'Functionallity of MDTs',
-        'Governance Score', 'Governance Weighted Score'
-    ],
-    '2. Population Health Needs': [
-        'Number of population profiling assessments conducted',
-        'Proportion of population health needs that have been addressed',
-        'Number of wellness activities conducted',
-        'Population Needs Score', 'Population Needs Weighted Score'
-    ],
-    '3. Capacity Readiness': [
-        'Proportion of facilities in the PCN that had all 22 tracer pharmaceuticals',
-        'Proportion of facilities in the PCN that have all 23 tracer non-pharmaceuticals',
-        'Availability of the whole blood and blood components',
-        'Percentage of Health facilities with stock out on any of the 22 tracer pharmaceuticals',
-        'Percentage of Health facilities with stock out on any of the 22 tracer non-pharmaceuticals',
-        'Proportion of hospitals with comprehensive lab services',
-        'Proportion of spokes with basic lab services',
-        'Proportion of Facilities within the PCN with all basic tracer equipment',
-        'Capacity Readiness Score', 'Capacity Readiness Weighted Score'
-    ],
-    '4. Healthcare Financing': [
-        'Proportion of clients accessing Health Services using SHIF',
-        'Proportion of the target Health Facilities empanneled on SHA',
-        'Proportion of Health Facilities in the PCN making SHA claims',
-        'Proportion of claims reimbursed to HFs within the PCN',
-        'Proportion of FIF collected rolled back to the facilities within PCN',
-        'Number of people waived for user fees',
-        'Total amount of user fees waived',
-        'Healthcare Financing Score', 'Healthcare Financing Weighted Score'
-    ],
-    '5. Health Infrastructure': [
-        'Proportion of health facilities with accessible road network',
-        'Proportion of facilities with the appropriate WASH facilities',
-        'Proportion of facilities with the tracer list of infrastructure',
-        'Proportion of facilties with a reliable power source',
-        'PCN access to adequate ambulance services',
-        'Ambulance request Score', 'Health infrastructure Score', 'Health infrastructure Weighted Score'
-    ],
-    '6. HMIS/Digital Health': [
-        'Proprtion of facilties with reliable internet connection',
-        'Proportion of facilities in the PCN with the key OPD reporting tools',
-        'No of performance and data quality review meetings held quarterly',
-        'Proportion of facilities with ICT infrastructure',
-        'Proportion of facilities in a PCN with an integrated functional EMR',
-        'Proportion of CHUs within the PCN reporting monthly',
-        'HMIS Score', 'HMIS Weighted Score'
-    ],
-    '7. Human Resources for Health (HRH)': [
-        'Core HRH density', 'Doctor to population ratio', 'Clinical officer to  population ratio',
-        'Nurse to population ratio', 'CHA/CHO  to population ratio',
-        'Proportion of CHPs trained on basic modules',
-        'Health care workers sensitized on PHC /PCN',
-        'Does the PCN have a mechanism to enhance health workers skills',
-        'Proportion of health workers who have undergone a skills/ competency buliding course',
-        'HRH Score', 'HRH Weighted Score'
-    ],
-    '8. Service Delivery': [
-        'Number of outreaches conducted by the MDT',
-        'Number of in-reaches conducted within the PCN',
-        'Service Delivery Score', 'Service Delivery Weighted Score'
-    ],
-    '9. Quality of Care - Management Systems': [
-        'Proportion of hospitals with functional facility quality improvement teams',
-        'Proportion of spokes with functional facility work improvement teams',
-        'Average availability of selected IPC items',
-        'QoC Management Systems Score', 'QoC Management Systems Weighted Score'
-    ],
-    '10. Quality of Care - PHC Core Systems': [
-        'Adherence to clinical guidelines', 'Provider Availability (absenteeism)',
-        'QoC PHC Core Systems Score'
-    ],
-    '11. Quality of Care - Outcomes': [
-        'Proportion of facilities conducting MPDSR',
-        'Fresh Stillbirth rate', 'Number of maternal deaths', 'Proportion of maternal deaths Audited',
-        'Number of neonatal deaths', 'Proportion of neonatal deaths audited',
-        'TB Treatment Success Rate',
-        'QoC Outcomes Score'
-    ],
-    '12. Social Accountability': [
-        'Proportion of facilities which have conducted a client satisfaction survey',
-        'No. of MDT engagements with the community',
-        'No. of health facilities with functional GRMs',
-        'Social Accountability Score'
-    ],
-    '13. Multisectoral Partnerships and Coordination': [
-        'Proportion of multi-sectoral actions implemented',
-        'Number of inter- PCN peer to peer learning sessions held',
-        'Multisectoral Partnerships and Coordination Score'
-    ],
-    '14. Innovations and Learning': [
-        'Number of PHC related innovations', 'Innovations and Learning Score', 'Innovations and Learning Weighted Score'
-    ],
-    '15. Overall PCN Score': [
-        'Total PCN Score', 'Total PCN Score (Total Weighted Score)'
-    ]
-}
+# PILLAR_KEYWORDS / PCN_PILLAR_KEYWORDS live in pcn_data.py so data_bundle.py builds from the same definitions
+
+# file locations (defined up here so the cached builders can use them as defaults)
+# update these paths to match your environment (or set PCN_COUNTY_CSV / PCN_PCN_CSV, e.g. for test data)
+COUNTY_CSV = os.environ.get("PCN_COUNTY_CSV", "county_lvl_data.csv")
+PCN_CSV = os.environ.get("PCN_PCN_CSV", "pcn_lvl_data.csv")
+COUNTY_SHAPE = "ken_admbnda_adm1_iebc_20191031.shp"  # your shapefile for counties
+SUBCOUNTY_SHAPE = "ken_admbnda_adm2_iebc_20191031.shp"  # optional, only if you have subcounty boundaries
+# load county geojson
+GEOJSON_COUNTY_KEY = "properties.County_Name_Key"
+
 # -------------------------
 # 2. UTILITIES (kept and restored)
 # -------------------------
 
-def standardize_name(name):
-    if pd.isna(name):
-        return name
-    name = str(name).strip().title()
-    
-    # --- START FIX: More robust cleaning ---
-    name = (
-        name.replace('\xa0', ' ')
-        .replace('/', ' ')
-        .replace('-', ' ')
-        .replace('Sub County', '') # Added to remove "Sub County"
-        .replace('Sub-County', '') # Added to remove "Sub-County"
-        .replace('District', '')   # Added to remove "District"
-        .replace('Division', '')   # Added to remove "Division"
-        .replace('County', '')     # Original line
-    )
-    # --- END FIX ---
-    
-    while '  ' in name: # Note: two spaces here
-        name = name.replace('  ', ' ')
-    
-    # 2. Add explicit mapping for problematic names
-    name_standardization_map = {
-        'Nairobi City': 'Nairobi',
-        # Add explicit fixes for the names that still don't match after cleaning:
-        # Example: If 'Garissa Township Sub ' is still the GeoJSON name, map it to the desired name.
-        # However, the expanded cleaning above should fix this, so start with the cleaning.
-    }
-    name = name_standardization_map.get(name, name)
-    return name.strip()
-
-def group_columns_by_pillar(df_raw, pillar_keywords):
-    pillar_dfs = {}
-    for pillar, keywords in pillar_keywords.items():
-        # match any keyword substring (case-insensitive) appearing inside column names
-        matching_cols = ['County'] + [
-            col for col in df_raw.columns
-            if any(keyword.lower() in col.lower() for keyword in keywords)
-        ]
-        if len(matching_cols) > 1:
-            pillar_dfs[pillar] = df_raw[matching_cols].copy()
-    return pillar_dfs
+# standardize_name / group_columns_by_pillar and the cleaning steps are in pcn_data.py (shared with data_bundle.py)
 
+# boundaries are held once per process (st.cache_resource) and shared by every rerun and session: st.cache_data
+# would unpickle a fresh copy of the whole geojson on every hit. Nothing downstream modifies them.
 # restore load_geodata for counties (your previous working function)
-@st.cache_data
+@counted(st.cache_resource)
+@disk_cached
 def load_geodata(shp_path):
     try:
-        gdf = gpd.read_file(shp_path)
-        if gdf.crs != "EPSG:4326":
-            gdf = gdf.to_crs(epsg=4326)
-        gdf_clean = gdf[['ADM1_EN', 'geometry']].rename(columns={'ADM1_EN': 'County_Name_Key'})
-        gdf_clean['County_Name_Key'] = gdf_clean['County_Name_Key'].apply(standardize_name)
-        geojson_data = json.loads(gdf_clean.to_json())
-        return geojson_data
+        return county_geojson(shp_path)
     except Exception as e:
         st.error(f"Error loading geospatial data: {e}")
         return None
 
-# helper to load subcounty shapefile / geojson when available
-@st.cache_data
+# helper to load subcounty shapefile / geojson when available; only called once the PCN map is drawn
+@counted(st.cache_resource(show_spinner="Loading subcounty boundaries..."))
+@disk_cached
 def load_subcounty_geodata(shp_path):
     try:
-        gdf = gpd.read_file(shp_path)
-        if gdf.crs != "EPSG:4326":
-            gdf = gdf.to_crs(epsg=4326)
-        
-        # CRITICAL FIX: Explicitly use ADM2_EN for Subcounty name and ADM1_EN for County name
-        NAME_COLUMN_KEY = 'ADM2_EN'
-        COUNTY_COLUMN_KEY = 'ADM1_EN' # Assumed County column in the adm2 shapefile
-        
-        if NAME_COLUMN_KEY not in gdf.columns or COUNTY_COLUMN_KEY not in gdf.columns:
-            st.error(f"Shapefile is missing expected columns ('{NAME_COLUMN_KEY}' or '{COUNTY_COLUMN_KEY}'). Cannot map.")
-            return None 
-            
-        # Select both name columns and rename them
-        gdf_clean = gdf[[NAME_COLUMN_KEY, COUNTY_COLUMN_KEY, 'geometry']].rename(
-            columns={
-                NAME_COLUMN_KEY: 'Subcounty_Name_Key',
-                COUNTY_COLUMN_KEY: 'County_Name_Key' # New property for filtering
-            }
-        )
-        
-        # Apply standardization to both names
-        gdf_clean['Subcounty_Name_Key'] = gdf_clean['Subcounty_Name_Key'].apply(standardize_name)
-        gdf_clean['County_Name_Key'] = gdf_clean['County_Name_Key'].apply(standardize_name)
-        
-        geojson_data = json.loads(gdf_clean.to_json())
-        return geojson_data
+        return subcounty_geojson(shp_path)
     except Exception as e:
         st.error(f"Error loading subcounty geospatial data: {e}")
         return None
 
+# per-county simplified ADM2 files written by `python geo_partitions.py` (PCN_GEOMETRY_DIR, default geometry/);
+# a county view loads just its own file instead of filtering the national one
+@counted(st.cache_resource)
+def load_partition_index(level, shp_path):
+    return partition_index(level, shape=shp_path)
+
+@counted(st.cache_resource(max_entries=64))
+def load_county_partition(level, county, shp_path):
+    return load_partition(load_partition_index(level, shp_path), level, county)
+
+# the same simplified features for the whole country, for the national subcounty maps
+@counted(st.cache_resource)
+def load_national_partition(level, shp_path):
+    return load_national(load_partition_index(level, shp_path), level)
+
 # -------------------------
 # 3. LOAD & CLEAN CSVs (preserve original logic)
 # -------------------------
-@st.cache_data
+# optional precompiled bundle (PCN_DATA_BUNDLE=pcn_dashboard.bundle, built by `python data_bundle.py`):
+# memory-mapped once per process, frames/index/geometry come from it instead of the CSVs and shapefiles
+@counted(st.cache_resource)
+def open_data_bundle(path):
+    return DataBundle(path)
+
+@counted(st.cache_data)
+@disk_cached
 def load_and_clean_county_csv(path):
-    df_raw = pd.read_csv(path, encoding='ISO-8859-1')
-    df_raw.columns = df_raw.columns.str.strip().str.replace('\n', ' ').str.replace('\r', '').str.replace(' +', ' ', regex=True)
-    df = df_raw.head(47).copy()
-    df = df.replace(['N/A', 'N\\A', '#DIV/0!', '', ' '], np.nan)
-    score_cols = [col for col in df.columns if col != 'County']
-    for col in score_cols:
-        df[col] = pd.to_numeric(df[col], errors='coerce')
-    df['County'] = df['County'].apply(standardize_name)
-   # Filtering (to prevent plotting zero-data counties)
-    df_filtered = df.dropna(subset=score_cols, how='all').copy()
-    df_county_clean = df_filtered.fillna(0).copy()
-    
+    # typed read (COUNTY_SCHEMA), standardized names, empty counties dropped, gaps filled with 0
+    df_county_clean, schema_report = read_county_csv(path)
     pillar_dfs = group_columns_by_pillar(df_county_clean, PILLAR_KEYWORDS)
-    return df_county_clean, pillar_dfs
+    return df_county_clean, pillar_dfs, schema_report
 
-@st.cache_data
+@counted(st.cache_data)
+@disk_cached
 def load_and_clean_pcn_csv(path):
-    df = pd.read_csv(path, encoding='ISO-8859-1')
-    df.columns = df.columns.str.strip().str.replace('\n', ' ').str.replace('\r', '').str.replace(' +', ' ', regex=True)
-    # apply standardization to County and Subcounty if present
-    if 'County' in df.columns:
-        df['County'] = df['County'].apply(standardize_name)
-    if 'Sub county' in df.columns:
-        df['Sub county'] = df['Sub county'].apply(standardize_name)
-    # coerce numeric columns where possible
-    for col in df.columns:
-        if col not in ['County', 'Sub county', 'Pillar', 'Indicator']:
-            df[col] = pd.to_numeric(df[col], errors='coerce')
-    return df
+    # typed read (PCN_SCHEMA) with County / Sub county standardized
+    return read_pcn_csv(path)
+
+# -------------------------
+# 3b. FIGURE BUILDERS (cached, so reruns and the background warm-up share them)
+# -------------------------
+KENYA_CENTER = {"lat": 0.5, "lon": 37.9}
+# every distinct selection is one cache entry; bounded so a long-running server doesn't keep all of them
+FIGURE_CACHE_ENTRIES = 64
+# maps cache only their trace arrays (locations, z): the figure is put together around the geojson that is
+# already loaded, so no cache entry holds (and every hit unpickles) its own copy of the boundaries
+MAP_CACHE_ENTRIES = 256
+
+@counted(st.cache_data(max_entries=FIGURE_CACHE_ENTRIES))
+@disk_cached
+def build_county_bar(pillar_df, selected_indicator):
+    # one trace with a colour per bar instead of px.bar(color='County')'s one trace per county
+    fig_bar = single_trace_bar(
+        pillar_df['County'].astype(str).to_numpy(),
+        pillar_df[selected_indicator].to_numpy(dtype=float, na_value=np.nan),
+        title=f"{selected_indicator}",
+        x_title='County',
+    )
+    fig_bar.update_layout(height=550, uniformtext_minsize=8, uniformtext_mode='hide')
+    return fig_bar
+
+# geojson is passed with a leading underscore so streamlit doesn't hash the whole dict on every call;
+# geo_source stands in for it in the cache key (the disk cache fingerprints the shapefile)
+@counted(st.cache_data(max_entries=MAP_CACHE_ENTRIES))
+@disk_cached
+def county_map_values(pillar_df, selected_indicator, _geojson_data, geo_source=COUNTY_SHAPE):
+    # every county from the geojson is kept (no score -> 0) so all borders render
+    return align_to_features(
+        feature_keys(_geojson_data, GEOJSON_COUNTY_KEY),
+        pillar_df['County'].astype(str).to_numpy(),
+        pillar_df[selected_indicator].to_numpy(dtype=float, na_value=np.nan),
+    )
+
+def build_county_map(pillar_df, selected_indicator, geojson_data, geo_source=COUNTY_SHAPE):
+    locations, values = county_map_values(pillar_df, selected_indicator, geojson_data, geo_source)
+    # built directly on the cached map layout (colorbar, title box, mapbox) instead of through plotly express
+    return choropleth_map(
+        geojson_data, GEOJSON_COUNTY_KEY, locations, values,
+        title=f"{selected_indicator} by County",
+        style='county', zoom=5.0, center=KENYA_CENTER, location_title='County',
+    )
+
+# national views can hold hundreds of PCNs: past this many bars keep the top/bottom ones and fold the rest
+PCN_BAR_TOP_N = 30
+PCN_BAR_BOTTOM_N = 15
+
+@counted(st.cache_data(max_entries=FIGURE_CACHE_ENTRIES))
+@disk_cached
+def build_pcn_bar(pcn_filtered_plot, selected_indicator_pcn, selected_subcounty_pcn):
+    # subcounties with more than one PCN are labelled by PCN so their bars don't stack
+    labels = unique_labels(pcn_filtered_plot['Sub county'].astype(str).to_numpy(),
+                           pcn_filtered_plot['PCN'].astype(str).to_numpy())
+    fig_bar_pcn = single_trace_bar(
+        labels,
+        pcn_filtered_plot[selected_indicator_pcn].to_numpy(dtype=float, na_value=np.nan),
+        title=f"{selected_indicator_pcn} in {selected_subcounty_pcn} Subcounty",
+        x_title='Sub county',
+        top_n=PCN_BAR_TOP_N,
+        bottom_n=PCN_BAR_BOTTOM_N,
+    )
+    fig_bar_pcn.update_layout(title_x=0, xaxis_tickangle=0, margin={"r":0,"t":30,"l":0,"b":0})
+    return fig_bar_pcn
+
+def pcn_map_features(subcounty_geojson, selected_county_pcn, map_view=None):
+    # county partitions hold just that county already; the national file is cut down to it
+    if selected_county_pcn == "All" or map_view is not None:
+        return subcounty_geojson
+    map_geojson = subcounty_geojson.copy()
+    map_geojson['features'] = [
+        f for f in subcounty_geojson['features']
+        if f['properties'].get('County_Name_Key') == selected_county_pcn
+    ]
+    return map_geojson
+
+@counted(st.cache_data(max_entries=MAP_CACHE_ENTRIES))
+@disk_cached
+def pcn_map_values(pcn_filtered_plot, selected_indicator_pcn, selected_county_pcn, _subcounty_geojson, geo_source=SUBCOUNTY_SHAPE,
+                   map_view=None):
+    # --- Match scores to the GeoJSON subcounties (no data -> 0 so borders still render) ---
+    return align_to_features(
+        feature_keys(pcn_map_features(_subcounty_geojson, selected_county_pcn, map_view), "properties.Subcounty_Name_Key"),
+        pcn_filtered_plot['Sub county'].map(standardize_name).to_numpy(dtype=object),
+        pcn_filtered_plot[selected_indicator_pcn].to_numpy(dtype=float, na_value=np.nan),
+    )
+
+def build_pcn_map(pcn_filtered_plot, selected_indicator_pcn, selected_county_pcn, subcounty_geojson, geo_source=SUBCOUNTY_SHAPE,
+                  map_view=None):
+    map_geojson = pcn_map_features(subcounty_geojson, selected_county_pcn, map_view)
+    if map_view is not None:
+        # county partitions come with their own extent
+        map_center, map_zoom = map_view
+    elif selected_county_pcn != "All":
+        map_center, map_zoom = KENYA_CENTER, 8.5  # zoom level suitable for viewing a single county
+    else:
+        map_center, map_zoom = KENYA_CENTER, 5.0  # national zoom level
+    locations, values = pcn_map_values(pcn_filtered_plot, selected_indicator_pcn, selected_county_pcn, subcounty_geojson,
+                                       geo_source, map_view)
+    return choropleth_map(
+        map_geojson, "properties.Subcounty_Name_Key", locations, values,
+        title=f"{selected_indicator_pcn} across PCNs in {selected_county_pcn}",
+        style='subcounty', zoom=map_zoom, center=map_center, location_title='Sub county',
+    )
+
+# two rounds aligned and every indicator's change computed once per round pair (version = the files' data_version)
+@counted(st.cache_resource)
+def get_round_comparison(level, before_path, after_path, version):
+    loader = load_and_clean_county_csv if level == "County" else load_and_clean_pcn_csv
+    return RoundComparison(loader(before_path)[0], loader(after_path)[0], level)
+
+ROUND_NAME_COLUMN = {"County": "County", "PCN": "Sub county"}
+
+@counted(st.cache_data(max_entries=FIGURE_CACHE_ENTRIES))
+def build_round_bar(change_frame, indicator, metric, level, lower_better):
+    labels = change_frame['County'].to_numpy(dtype=object)
+    if level == "PCN":
+        labels = unique_labels(change_frame['Sub county'].to_numpy(dtype=object), change_frame['PCN'].to_numpy(dtype=object))
+    fig = delta_bar(
+        labels, change_frame[metric].to_numpy(dtype=float),
+        title=f"{metric}: {indicator}", x_title=ROUND_NAME_COLUMN[level], y_title=metric,
+        lower_is_better=lower_better,
+        top_n=PCN_BAR_TOP_N if level == "PCN" else None, bottom_n=PCN_BAR_BOTTOM_N if level == "PCN" else None,
+    )
+    fig.update_layout(height=550)
+    return fig
+
+ROUND_FEATURE_KEY = {"County": GEOJSON_COUNTY_KEY, "PCN": "properties.Subcounty_Name_Key"}
+
+@counted(st.cache_data(max_entries=MAP_CACHE_ENTRIES))
+def round_map_values(change_frame, metric, level, _geojson, geo_source):
+    # counties / subcounties missing from either round stay blank (NaN), not "no change"
+    return align_to_features(
+        feature_keys(_geojson, ROUND_FEATURE_KEY[level]),
+        change_frame[ROUND_NAME_COLUMN[level]].map(standardize_name).to_numpy(dtype=object),
+        change_frame[metric].to_numpy(dtype=float),
+        fill=np.nan,
+    )
+
+def build_round_map(change_frame, indicator, metric, level, lower_better, geojson, geo_source):
+    locations, values = round_map_values(change_frame, metric, level, geojson, geo_source)
+    return choropleth_map(
+        geojson, ROUND_FEATURE_KEY[level], locations, values,
+        title=f"{metric}: {indicator}",
+        style='county' if level == "County" else 'subcounty', zoom=5.0, center=KENYA_CENTER,
+        location_title=ROUND_NAME_COLUMN[level],
+        scale='change_lower_better' if lower_better else 'change',
+    )
+
+def national_subcounty_geometry():
+    """(ADM2 geojson of the whole country, cache key): the simplified national partition when built, else the full file."""
+    index = load_partition_index('adm2', SUBCOUNTY_SHAPE)
+    national = load_national_partition('adm2', SUBCOUNTY_SHAPE) if index else None
+    if national:
+        return national, f"{SUBCOUNTY_SHAPE}:{index['source']}:national"
+    return get_subcounty_geojson(), SUBCOUNTY_SHAPE
+
+def pcn_map_geometry(county):
+    """(ADM2 geojson, (center, zoom) or None, cache key) for the PCN map: the county's partition, else the national file."""
+    if county != ALL:
+        subcounties = load_county_partition('adm2', county, SUBCOUNTY_SHAPE)
+        if subcounties:
+            index = load_partition_index('adm2', SUBCOUNTY_SHAPE)
+            return subcounties, bbox_view(index['counties'][county]['bbox']), f"{SUBCOUNTY_SHAPE}:{index['source']}:{county}"
+    geojson, source = national_subcounty_geometry()
+    return geojson, None, source
+
+def counties_geometry(counties):
+    """(ADM2 geojson of these counties, cache key): their partition files when built, else the national file."""
+    index = load_partition_index('adm2', SUBCOUNTY_SHAPE)
+    if not index:
+        return get_subcounty_geojson(), SUBCOUNTY_SHAPE
+    # a county without a file has no subcounties in the shapefile either
+    features = [f for county in counties if county in index['counties']
+                for f in load_county_partition('adm2', county, SUBCOUNTY_SHAPE)['features']]
+    return {"type": "FeatureCollection", "features": features}, f"{SUBCOUNTY_SHAPE}:{index['source']}"
+
+# the frame itself is the cache key, so the matrix is recomputed only when the data changes
+@counted(st.cache_data)
+def indicator_correlations(df, method):
+    return correlation_frames(df, method=method)
+
+MAX_HEATMAP_INDICATORS = 150
 
+@counted(st.cache_data(max_entries=FIGURE_CACHE_ENTRIES))
+def build_correlation_heatmap(corr, counts, title):
+    names = list(corr.index)
+    short = [name if len(name) <= 40 else name[:37] + '...' for name in names]
+    positions = list(range(len(names)))
+    # full names + shared row count go in the hover; axes use positions so truncated names can't collide
+    hover = np.dstack([
+        np.broadcast_to(np.array(names, dtype=object)[None, :], corr.shape),
+        np.broadcast_to(np.array(names, dtype=object)[:, None], corr.shape),
+        counts.to_numpy(),
+    ])
+    fig_corr = go.Figure(go.Heatmap(
+        z=corr.to_numpy(),
+        x=positions,
+        y=positions,
+        customdata=hover,
+        zmin=-1, zmax=1, zmid=0,
+        colorscale="RdBu",
+        hovertemplate="%{customdata[0]}<br>%{customdata[1]}<br>r = %{z:.2f} (n = %{customdata[2]})<extra></extra>",
+        colorbar=dict(title=dict(text="r", font=dict(color="black", size=12)), thickness=12, len=0.6),
+    ))
+    fig_corr.update_layout(
+        title=title,
+        height=max(450, min(1100, 18 * len(names) + 200)),
+        xaxis=dict(tickmode='array', tickvals=positions, ticktext=short, tickangle=45, tickfont=dict(size=9)),
+        yaxis=dict(tickmode='array', tickvals=positions, ticktext=short, autorange='reversed', tickfont=dict(size=9)),
+        margin={"r":0, "t":40, "l":0, "b":0},
+    )
+    return fig_corr
+
+# PCN x indicator heatmap: the matrix (percentiles, row orders) is built once per data version and indicator set
+@counted(st.cache_resource)
+def get_indicator_matrix(pcn_df, indicators):
+    return IndicatorMatrix(pcn_df, list(indicators))
+
+# the browser draws every cell, so bigger matrices are averaged into runs of rows / columns before they are sent
+HEATMAP_MAX_ROWS = 150
+HEATMAP_MAX_COLS = 120
+
+@counted(st.cache_data(max_entries=FIGURE_CACHE_ENTRIES))
+def build_pcn_heatmap(pcn_df, indicators, scale, order, max_rows, title):
+    cells = get_indicator_matrix(pcn_df, indicators).heatmap(scale, order, max_rows, HEATMAP_MAX_COLS)
+    z = cells['z']
+    n_rows, n_cols = z.shape
+    short = [name if len(name) <= 40 else name[:37] + '...' for name in cells['col_labels']]
+    hover = np.dstack([
+        np.broadcast_to(np.array(cells['row_labels'], dtype=object)[:, None], z.shape),
+        np.broadcast_to(np.array(cells['col_labels'], dtype=object)[None, :], z.shape),
+        np.broadcast_to(cells['row_counts'][:, None], z.shape),
+        np.broadcast_to(cells['col_counts'][None, :], z.shape),
+    ])
+    percentile = scale == SCALES[0]
+    fig = go.Figure(go.Heatmap(
+        z=z,
+        x=list(range(n_cols)),
+        y=list(range(n_rows)),
+        customdata=hover,
+        zmin=0 if percentile else None, zmax=100 if percentile else None,
+        colorscale="RdYlGn" if percentile else "Viridis",
+        hoverongaps=False,
+        hovertemplate=("%{customdata[0]}<br>%{customdata[1]}<br>%{z:.1f}"
+                       + (" (mean of %{customdata[2]} PCNs x %{customdata[3]} indicators)" if cells['binned'] else "")
+                       + "<extra></extra>"),
+        colorbar=dict(title=dict(text="Percentile" if percentile else "Value", font=dict(color="black", size=12)),
+                      thickness=12, len=0.6),
+    ))
+    # rows are too many to label one by one: county names at the start of each county block, with a divider
+    if len(cells['county_starts']):
+        yaxis = dict(tickmode='array', tickvals=list(cells['county_starts']), ticktext=cells['county_names'])
+        fig.update_layout(shapes=[
+            dict(type='line', xref='paper', x0=0, x1=1, y0=start - 0.5, y1=start - 0.5, line=dict(color='white', width=1))
+            for start in cells['county_starts'][1:]
+        ])
+    else:
+        yaxis = dict(showticklabels=False)
+    fig.update_layout(
+        title=title,
+        height=max(450, min(1100, 6 * n_rows + 250)),
+        xaxis=dict(tickmode='array', tickvals=list(range(n_cols)), ticktext=short, tickangle=45, tickfont=dict(size=9)),
+        yaxis=dict(autorange='reversed', tickfont=dict(size=9), **yaxis),
+        margin={"r":0, "t":40, "l":0, "b":0},
+    )
+    return fig, cells['shape'], z.shape
+
+# nearest neighbours of every PCN, built once per data version and indicator set; a lookup is an array slice
+@counted(st.cache_resource)
+def get_peer_index(pcn_df, indicators):
+    return PeerIndex(pcn_df, list(indicators))
+
+def peer_map_features(subcounty_geojson, counties):
+    # only the counties the selected PCN and its peers are in, not the national ADM2 file on every rerun
+    features = [f for f in subcounty_geojson['features'] if f['properties'].get('County_Name_Key') in counties]
+    return {"type": "FeatureCollection", "features": features}
+
+@counted(st.cache_data(max_entries=MAP_CACHE_ENTRIES))
+def peer_map_values(selected_subcounty, peer_subcounties, counties, _subcounty_geojson, geo_source=SUBCOUNTY_SHAPE):
+    # 2 = the selected PCN's subcounty, 1 = a peer's, 0 = the rest of those counties; plus the view that fits them
+    geojson = peer_map_features(_subcounty_geojson, counties)
+    keys = feature_keys(geojson, "properties.Subcounty_Name_Key")
+    values = np.where(keys == selected_subcounty, 2.0, np.where(np.isin(keys, list(peer_subcounties)), 1.0, 0.0))
+    bbox = features_bbox(geojson['features'])
+    return keys, values, bbox_view(bbox) if bbox else (KENYA_CENTER, 5.0)
+
+def build_peer_map(selected_subcounty, peer_subcounties, counties, title, subcounty_geojson, geo_source=SUBCOUNTY_SHAPE):
+    keys, values, (center, zoom) = peer_map_values(selected_subcounty, peer_subcounties, counties, subcounty_geojson,
+                                                   geo_source)
+    geojson = peer_map_features(subcounty_geojson, counties)
+    return choropleth_map(
+        geojson, "properties.Subcounty_Name_Key", keys, values,
+        title=title, style='subcounty', zoom=zoom, center=center, location_title='Sub county', scale='peers',
+    )
+
+# which counties / subcounties share a border: only ever the file `python spatial.py` prebuilds (PCN_GEOMETRY_DIR),
+# never built during a request; version = data_version of the shapefile and that file, so a (re)built file is picked up
+@counted(st.cache_resource)
+def get_spatial_weights(level, shp_path, version):
+    return load_adjacency(level, shape=shp_path)
+
+def spatial_version(level, shp_path):
+    return data_version(shp_path, adjacency_path(level))
+
+def spatial_ready(level, shp_path):
+    return get_spatial_weights(level, shp_path, spatial_version(level, shp_path)) is not None
+
+# global + local Moran's I of one indicator: a few sparse products, cheap enough for every indicator change
+@counted(st.cache_data)
+def spatial_clusters(level, names, values, shp_path, version):
+    weights = get_spatial_weights(level, shp_path, version)
+    if weights is None:
+        return None, None
+    values = weights.align(names, values)
+    return global_morans_i(weights, values), local_morans_i(weights, values)
+
+SPATIAL_UNITS = {'adm1': "counties", 'adm2': "subcounties"}
+
+def spatial_overlay(fig, level, names, values, geojson, featureidkey, shp_path):
+    """Outline the significant hotspots / coldspots on a map; returns the Moran's I caption."""
+    moran, lisa = spatial_clusters(level, names, values, shp_path, spatial_version(level, shp_path))
+    if moran is None:
+        return (f"Which {SPATIAL_UNITS[level]} are neighbours isn't built yet (or is older than {shp_path}): "
+                "run `python spatial.py` to outline hotspots / coldspots.")
+    if np.isnan(moran['I']):
+        return f"Too few neighbouring {SPATIAL_UNITS[level]} with data to test for spatial clustering."
+    for cluster, color, label in ((HOTSPOT, HOTSPOT_COLOR, "Hotspot (high, high neighbours)"),
+                                  (COLDSPOT, COLDSPOT_COLOR, "Coldspot (low, low neighbours)")):
+        add_outlines(fig, geojson, featureidkey, lisa.loc[lisa['cluster'] == cluster, 'key'], color, label)
+    pattern = "clustered" if moran['I'] > moran['expected'] else "dispersed"
+    verdict = pattern if moran['p_value'] <= 0.05 else "no clear spatial pattern"
+    return (f"Moran's I = {moran['I']:.2f} (p = {moran['p_value']:.3f}, {moran['n']} {SPATIAL_UNITS[level]}): {verdict}. "
+            f"{(lisa['cluster'] == HOTSPOT).sum()} hotspots, {(lisa['cluster'] == COLDSPOT).sum()} coldspots at p <= 0.05.")
+
+# engine holds the precomputed matrices; every slider move only pays for one matrix product
+@counted(st.cache_resource)
+def get_scoring_engine(df, level, source):
+    if level == "PCN":
+        return ScoringEngine(df, PCN_PILLAR_KEYWORDS, ['County', 'Sub county', 'PCN'], source=source)
+    return ScoringEngine(df, PILLAR_KEYWORDS, ['County'], source=source)
+
+# the data table only ever shows these columns plus the selected indicator
+PCN_TABLE_COLUMNS = ['County', 'Sub county', 'PCN']
+
+# filter + sort once per selection/search/sort; paging through the result reuses the cached positions
+@counted(st.cache_data)
+def pcn_table_positions(pcn_rows, indicator, search, sort_by, ascending):
+    columns = [c for c in PCN_TABLE_COLUMNS if c in pcn_rows.columns] + [indicator]
+    return table_positions(pcn_rows, columns, search=search, sort_by=sort_by, ascending=ascending,
+                           search_columns=columns[:-1])
+
+# county table + per-county roll-ups of every PCN indicator, built once per data version
+@counted(st.cache_resource)
+def get_county_rollup(county_df, pcn_df):
+    return CountyRollup(county_df, pcn_df)
+
+# built once per process from the column catalog; queries only touch the prebuilt index
+@counted(st.cache_resource)
+def get_indicator_index(county_columns, pcn_columns):
+    return IndicatorIndex(
+        catalog_entries("County", county_columns, PILLAR_KEYWORDS)
+        + catalog_entries("PCN", pcn_columns, PCN_PILLAR_KEYWORDS)
+    )
+
+# widget keys of the pillar / indicator pickers each search result can jump to
+INDICATOR_PICKER_KEYS = {"County": ("county_pillar", "county_indicator"), "PCN": ("pcn_pillar", "pcn_indicator")}
+
+def jump_to_indicator(level, pillar, indicator):
+    # button callback: runs before the rerun, so the pickers come up on the chosen pillar/indicator
+    pillar_key, indicator_key = INDICATOR_PICKER_KEYS[level]
+    st.session_state[pillar_key] = pillar
+    st.session_state[indicator_key] = indicator
+    if level == "PCN":
+        # the batched form's picker holds (pillar, indicator) pairs and keeps its own state
+        st.session_state[PCN_FORM_KEYS['indicator']] = (pillar, indicator)
+        if 'pcn_selection' in st.session_state:
+            st.session_state['pcn_selection'].update(pillar=pillar, indicator=indicator)
+
+# County -> Subcounty -> PCN -> row positions, built once per frame; filter options and rows are lookups
+@counted(st.cache_resource)
+def get_pcn_hierarchy(pcn_df):
+    return PCNHierarchy(pcn_df)
+
+def dashboard_hierarchy(pcn_df):
+    # the bundle ships the index prebuilt
+    return DATA_BUNDLE.hierarchy() if DATA_BUNDLE is not None else get_pcn_hierarchy(pcn_df)
+
+def select_pcn_rows(pcn_df, hierarchy, county, subcounty, pcn=ALL):
+    # the rows the PCN section plots for this filter selection ("All" = everything under the level above)
+    return pcn_df.iloc[hierarchy.positions(county, subcounty, pcn)]
+
+# PCN filter state: one selection in session_state, shared by the per-widget filters and the batched form, and
+# mirrored in the URL (?county=..&subcounty=..&pcn=..&pillar=..&indicator=..) so a link opens straight on that view
+PCN_FILTER_KEYS = {'county': 'pcn_county', 'subcounty': 'pcn_subcounty', 'pcn': 'pcn_pcn',
+                   'pillar': 'pcn_pillar', 'indicator': 'pcn_indicator'}
+# the batched form's two pickers: (county, subcounty, pcn) and (pillar, indicator)
+PCN_FORM_KEYS = {'area': 'pcn_form_area', 'indicator': 'pcn_form_indicator'}
+
+def pcn_indicator_options(pillars_map, pillar):
+    return [col for col in pillars_map[pillar].columns if col not in ['County','Subcounty']]
+
+def valid_pcn_selection(selection, hierarchy, pillars_map):
+    # anything that isn't an option any more (other data, a stale link) falls back to the default
+    county, subcounty, pcn = hierarchy.valid(selection.get('county', ALL), selection.get('subcounty', ALL),
+                                             selection.get('pcn', ALL))
+    pillar = selection.get('pillar') if selection.get('pillar') in pillars_map else next(iter(pillars_map))
+    indicators = pcn_indicator_options(pillars_map, pillar)
+    indicator = selection.get('indicator') if selection.get('indicator') in indicators else (indicators or [None])[0]
+    return {'county': county, 'subcounty': subcounty, 'pcn': pcn, 'pillar': pillar, 'indicator': indicator}
+
+def pcn_selection_state():
+    # a session's first run starts from the URL, every later one from the last applied selection
+    if 'pcn_selection' not in st.session_state:
+        st.session_state['pcn_selection'] = {name: st.query_params[name] for name in PCN_FILTER_KEYS if name in st.query_params}
+    return st.session_state['pcn_selection']
+
+def sync_pcn_query_params(selection):
+    # only changed values are written; "All" levels are left out of the link
+    for name, value in selection.items():
+        if value is None or value == ALL:
+            if name in st.query_params:
+                del st.query_params[name]
+        elif st.query_params.get(name) != value:
+            st.query_params[name] = value
+
+def area_label(path):
+    return ALL if path[0] == ALL else " / ".join(part for part in path if part != ALL)
+
+rerun_timer.section("load")
 # -------------------------
 # 4. EXECUTION: load files and geodata (paths must exist in your app folder)
 # -------------------------
-# update these paths to match your environment
-COUNTY_CSV = "county_lvl_data.csv"
-PCN_CSV = "pcn_lvl_data.csv"
-COUNTY_SHAPE = "ken_admbnda_adm1_iebc_20191031.shp"  # your shapefile for counties
-SUBCOUNTY_SHAPE = "ken_admbnda_adm2_iebc_20191031.shp"  # optional, only if you have subcounty boundaries
-# load county geojson
-GEOJSON_COUNTY_KEY = "properties.County_Name_Key"
+# data bundle, if configured and still built from the current files; a stale one is ignored (warning below)
+DATA_BUNDLE, BUNDLE_STALE = None, False
+if bundle_path():
+    try:
+        DATA_BUNDLE = open_data_bundle(bundle_path())
+    except (OSError, ValueError) as e:
+        st.error(f"Could not open data bundle {bundle_path()}: {e}")
+    if DATA_BUNDLE is not None and not DATA_BUNDLE.matches(COUNTY_CSV, PCN_CSV, COUNTY_SHAPE, SUBCOUNTY_SHAPE):
+        DATA_BUNDLE, BUNDLE_STALE = None, True
+
+# optional compact layout (PCN_COMPACT_FRAMES=1 or =ints): categorical names sharing one dictionary,
+# float32 / small-int scores. `python compact_frames.py` prints the memory comparison.
+# Not applied to bundle frames, which are already categorical and stay on the mapped float64 pages.
+COMPACT_MODE = compact_mode() if DATA_BUNDLE is None else ""
+
+@counted(st.cache_data)
+def load_compact_frames(county_path, pcn_path, mode):
+    # parsed here rather than through load_and_clean_*_csv, so only the compact copy is ever cached
+    county_df, county_schema_report = read_county_csv(county_path)
+    pcn_df, pcn_schema_report = read_pcn_csv(pcn_path)
+    (county_small, pcn_small), _ = compact_frames([county_df, pcn_df], nullable_ints=(mode == "ints"))
+    return (county_small, group_columns_by_pillar(county_small, PILLAR_KEYWORDS), pcn_small,
+            county_schema_report, pcn_schema_report)
 
-# load CSVs
-df_county_raw, pillar_dfs = load_and_clean_county_csv(COUNTY_CSV)
-pcn_lvl_df = load_and_clean_pcn_csv(PCN_CSV)
+def load_dashboard_data():
+    # (county frame, county pillar frames, PCN frame, county schema report, PCN schema report), from exactly one
+    # source: the bundle's frames (views of the mapped file, nothing parsed), the compact layout or the CSVs
+    if DATA_BUNDLE is not None:
+        return (DATA_BUNDLE.frame('county'), DATA_BUNDLE.pillar_frames('county'), DATA_BUNDLE.frame('pcn'),
+                DATA_BUNDLE.schema_report('county'), DATA_BUNDLE.schema_report('pcn'))
+    if COMPACT_MODE:
+        return load_compact_frames(COUNTY_CSV, PCN_CSV, COMPACT_MODE)
+    county_df, county_pillars, county_schema_report = load_and_clean_county_csv(COUNTY_CSV)
+    pcn_df, pcn_schema_report = load_and_clean_pcn_csv(PCN_CSV)
+    return county_df, county_pillars, pcn_df, county_schema_report, pcn_schema_report
+
+def load_dashboard_frames():
+    # the frames the UI works on, in whichever layout is configured
+    return load_dashboard_data()[:3]
+
+df_county_raw, pillar_dfs, pcn_lvl_df, county_schema_report, pcn_schema_report = load_dashboard_data()
+
+
+# exports are cached on disk by selection + this version, so editing a CSV (or the layout) invalidates them
+DATA_VERSION = data_version(COUNTY_CSV, PCN_CSV) + (f"-{COMPACT_MODE}" if COMPACT_MODE else "") + (
+    "-bundle" if DATA_BUNDLE is not None else "")
+
+def export_buttons(df, selection, key_prefix):
+    # one button per format; the file is written only when its button is clicked
+    formats = available_formats()
+    # Streamlit holds a clicked download in memory, so oversized selections aren't offered
+    oversized = too_large(df)
+    for col, fmt in zip(st.columns(len(formats)), formats):
+        with col:
+            st.download_button(
+                f"Download {fmt}",
+                data=export_callable(df, selection, fmt, DATA_VERSION),
+                file_name=export_name(selection, fmt),
+                mime=EXPORT_FORMATS[fmt][1],
+                key=f"{key_prefix}_{fmt}",
+                on_click="ignore",
+                disabled=oversized,
+                help=f"Selection is over the {MAX_MB_ENV_VAR} limit; narrow it down" if oversized else None,
+            )
 
+def get_county_geojson():
+    if DATA_BUNDLE is not None:
+        return DATA_BUNDLE.geojson('county')
+    return load_geodata(COUNTY_SHAPE)
 
-geojson_data = load_geodata(COUNTY_SHAPE)
-subcounty_geojson = load_subcounty_geodata(SUBCOUNTY_SHAPE)
+def get_subcounty_geojson():
+    if DATA_BUNDLE is not None:
+        return DATA_BUNDLE.geojson('subcounty')
+    return load_subcounty_geodata(SUBCOUNTY_SHAPE)
 
-# load subcounty geojson if available (optional)
-#subcounty_geojson = None
-#try:
-    #subcounty_geojson = load_subcounty_geodata(SUBCOUNTY_SHAPE)
-#except Exception:
-    #subcounty_geojson = None
+geojson_data = get_county_geojson()
+# the subcounty (ADM2) geometry is not loaded here: the PCN map section loads it the first time it is drawn
 
+# -------------------------
+# 4b. OPTIONAL BACKGROUND WARM-UP (opt-in: PCN_DASHBOARD_WARMUP=1)
+# -------------------------
+# Streamlit has no server-start hook, so the warmer starts with the first script run of the
+# process and then keeps going in the background while that (and every later) session renders.
+WARMUP_TOP_N = 5
+
+def warm_county_view(pillar=None, indicator=None):
+    _, pillars, _ = load_dashboard_frames()
+    pillar = pillar or next(iter(pillars), None)
+    if pillar not in pillars:
+        return
+    options = [col for col in pillars[pillar].columns if col != 'County']
+    indicator = indicator or (options[0] if options else None)
+    if indicator not in options:
+        return
+    build_county_bar(pillars[pillar], indicator)
+    geo = get_county_geojson()
+    if geo is not None:
+        # st.cache_data keys on the arguments as passed, so geo_source is given as the page gives it
+        county_map_values(pillars[pillar], indicator, geo, COUNTY_SHAPE)
+
+def warm_pcn_view(county="All", subcounty="All", pillar=None, indicator=None, pcn="All"):
+    _, _, pcn_df = load_dashboard_frames()
+    pillars = group_columns_by_pillar(pcn_df, PCN_PILLAR_KEYWORDS)
+    pillar = pillar or next(iter(pillars), None)
+    if pillar not in pillars:
+        return
+    options = [col for col in pillars[pillar].columns if col not in ['County','Subcounty']]
+    indicator = indicator or (options[0] if options else None)
+    if indicator not in options:
+        return
+    rows = select_pcn_rows(pcn_df, dashboard_hierarchy(pcn_df), county, subcounty, pcn)
+    if not rows.empty:
+        build_pcn_bar(rows, indicator, subcounty)
+    # same geometry and the same arguments as the page's map, so it finds these entries
+    map_geojson, map_view, map_source = pcn_map_geometry(county)
+    if map_geojson is None:
+        return
+    pcn_map_values(rows, indicator, county, map_geojson, map_source, map_view)
+
+@st.cache_resource
+def start_cache_warmer():
+    # one warmer per server process, shared by every session
+    warmer = CacheWarmer()
+    if DATA_BUNDLE is None:
+        warmer.submit(0, "csv frames", load_dashboard_data)
+    warmer.submit(1, "county geometry", get_county_geojson)
+    warmer.submit(1, "subcounty geometry", get_subcounty_geojson)
+    warmer.submit(2, "county default view", warm_county_view)
+    warmer.submit(2, "pcn default view", warm_pcn_view)
+    # then the most used selections from the local usage log, most popular first
+    for rank, sel in enumerate(top_selections("county", WARMUP_TOP_N)):
+        warmer.submit(3 + rank, f"county view #{rank + 1}", warm_county_view, **sel)
+    for rank, sel in enumerate(top_selections("pcn", WARMUP_TOP_N)):
+        warmer.submit(3 + rank, f"pcn view #{rank + 1}", warm_pcn_view, **sel)
+    return warmer.start()
+
+@st.cache_resource
+def get_metrics_server():
+    # one endpoint per server process; None when no port is set or another process already serves it
+    return start_metrics_server()
+
+if metrics_enabled():
+    get_metrics_server()
+
+def show_chart(fig, name, slot=st):
+    record_figure(name, fig)
+    slot.plotly_chart(fig, use_container_width=True)
+
+cache_warmer = start_cache_warmer() if warmup_enabled() else None
+if cache_warmer is not None:
+    cache_warmer.note_activity()
+
+rerun_timer.section("county")
 # ============================
 # 5. STREAMLIT UI: County-Level (your original working section)
 # ============================
@@ -350,6 +712,31 @@ st.markdown(
 st.markdown("<h2 style='color:#1E90FF'>County-Level PCN Establishment Analysis</h2>", unsafe_allow_html=True)
 st.markdown("---")
 
+if BUNDLE_STALE:
+    st.warning(f"Data bundle {bundle_path()} was built from older files; reading the CSVs instead. "
+               "Rebuild it with `python data_bundle.py`.")
+
+# schema drift from the typed CSV parse (missing/new columns, non-numeric scores)
+for schema_label, schema_report in [("County CSV", county_schema_report), ("PCN CSV", pcn_schema_report)]:
+    if has_drift(schema_report):
+        with st.expander(f"{schema_label} does not match the declared schema"):
+            for line in format_drift_report(schema_report):
+                st.write(line)
+
+# indicator search: finds the pillar an indicator lives in, typos included
+indicator_index = get_indicator_index(tuple(df_county_raw.columns), tuple(pcn_lvl_df.columns))
+with st.sidebar:
+    st.markdown("### Find an indicator")
+    indicator_query = st.text_input("Search indicators", key="indicator_search",
+                                    placeholder="e.g. referral, gazetted, nurse ratio")
+    if indicator_query:
+        results = indicator_index.search(indicator_query, limit=10)
+        if not results:
+            st.caption("No matching indicators.")
+        for i, (level, pillar, indicator, _) in enumerate(results):
+            st.button(f"{indicator} ({level}: {pillar})", key=f"indicator_result_{i}",
+                      on_click=jump_to_indicator, args=(level, pillar, indicator), use_container_width=True)
+
 # sidebar controls for county-level (keeps your original behavior)
 st.markdown("Select Performance Metric.", unsafe_allow_html=True)
 pillar_keys = list(pillar_dfs.keys())
@@ -357,151 +744,134 @@ pillar_keys = list(pillar_dfs.keys())
 if not pillar_keys:
     st.warning("No county-level pillars detected. Check column names and PILLAR_KEYWORDS.")
 else:
-    selected_pillar = st.selectbox("1. Select Pillar:", options=pillar_keys, index=0)
+    selected_pillar = st.selectbox("1. Select Pillar:", options=pillar_keys, index=0, key="county_pillar")
     pillar_dfs = group_columns_by_pillar(df_county_raw, PILLAR_KEYWORDS)
     pillar_df = pillar_dfs[selected_pillar]
     indicator_options = [col for col in pillar_df.columns if col != 'County']
-    selected_indicator = st.selectbox("2. Select Indicator/Metric:", options=indicator_options)
+    selected_indicator = st.selectbox("2. Select Indicator/Metric:", options=indicator_options, key="county_indicator")
+
+    if cache_warmer is not None:
+        log_selection("county", {"pillar": selected_pillar, "indicator": selected_indicator})
 
     # layout: bar + map
     col1, col2 = st.columns([1, 1])
     with col1:
         st.subheader("Bar Chart")
-        df_chart = pillar_df[['County', selected_indicator]].sort_values(by=selected_indicator, ascending=False)
-        fig_bar = px.bar(
-            df_chart,
-            x='County',
-            y=selected_indicator,
-            color='County',
-            text=selected_indicator,
-            height=550,
-            labels={selected_indicator: "Score (%)"},
-            title=f"{selected_indicator}"
-        )
-        fig_bar.update_traces(texttemplate='%{text:.1f}', textposition='outside')
-        fig_bar.update_layout(uniformtext_minsize=8, uniformtext_mode='hide', xaxis={'categoryorder':'total descending'})
-        st.plotly_chart(fig_bar, use_container_width=True)
+        fig_bar = build_county_bar(pillar_df, selected_indicator)
+        show_chart(fig_bar, "county bar")
 
     with col2:
         st.subheader("Geographic Map")
-        KENYA_CENTER = {"lat": 0.5, "lon": 37.9}
         if geojson_data is None:
             st.error("County shapefile not loaded; can't render map.")
         else:
-            # ensure we include all counties from geojson so borders render
-            geojson_counties = [feature['properties']['County_Name_Key'] for feature in geojson_data['features']]
-            df_all_counties = pd.DataFrame({'County': geojson_counties})
-            df_score_data = pillar_df[['County', selected_indicator]].copy()
-            df_map_data = df_all_counties.merge(df_score_data, on='County', how='left')
-
-            # Convert to numeric, preserve NaN for missing; do NOT fill with 0
-            df_map_data[selected_indicator] = df_map_data[selected_indicator].fillna(0)
-
-            fig_map = px.choropleth_mapbox(
-                df_map_data,
-                geojson=geojson_data,
-                locations='County',
-                featureidkey=GEOJSON_COUNTY_KEY,
-                color=selected_indicator,
-                hover_name='County',
-                color_continuous_scale="RdYlGn",
-                mapbox_style="white-bg",
-                zoom=5.0,
-                center=KENYA_CENTER,
-                opacity=0.8,
-                labels={'County': 'County', selected_indicator: 'Score (%)'},
-            )
-
-            # thin grey borders for all counties; NaNs will render as no fill
-            fig_map.update_traces(marker_line={'width': 0.8, 'color': 'grey'}, selector=dict(type='choroplethmapbox'))
-            # colorbar inside map, black ticks, labelled Score (%)
-            fig_map.update_layout(
-                coloraxis_colorbar=dict(
-                    title=dict(text="Score (%)", font=dict(color="black", size=12)),
-                    tickformat=".0f",
-                    tickfont=dict(color="black", size=11),
-                    x=0.97, xanchor="right", y=0.5, yanchor="middle", len=0.6, thickness=12,
-                    bgcolor="rgba(255,255,255,0.6)", outlinecolor="rgba(0,0,0,0.2)", outlinewidth=1
-                ),
-                margin={"r":0, "t":30, "l":0, "b":0},
-                mapbox=dict(bearing=0, pitch=0)
-            )
+            fig_map = build_county_map(pillar_df, selected_indicator, geojson_data)
+            spatial_caption = None
+            # on by default only when the adjacency file is there; ticked without it, it says how to build it
+            if st.checkbox("Outline hotspots / coldspots", value=spatial_ready('adm1', COUNTY_SHAPE), key="county_hotspots"):
+                spatial_caption = spatial_overlay(
+                    fig_map, 'adm1', tuple(pillar_df['County'].map(standardize_name)),
+                    tuple(pillar_df[selected_indicator].to_numpy(dtype=float, na_value=np.nan)),
+                    geojson_data, GEOJSON_COUNTY_KEY, COUNTY_SHAPE,
+                )
+            show_chart(fig_map, "county map")
+            if spatial_caption:
+                st.caption(spatial_caption)
 
-            # title annotation inside map
-            fig_map.add_annotation(
-                text=f"{selected_indicator} by County",
-                xref="paper", yref="paper", x=0.5, y=0.98, showarrow=False,
-                font=dict(size=12, color="black", family="Arial Black"),
-                bgcolor="rgba(255,255,255,0.7)", bordercolor="black", borderwidth=1, borderpad=6
-            )
-        #Manually make missing data appear white ---
-        # Recolor counties with 0 (previously NaN) to white
-            for feature in geojson_data["features"]:
-                county_name = feature["properties"]["County_Name_Key"]
-                if county_name in df_map_data["County"].values:
-                    val = df_map_data.loc[df_map_data["County"] == county_name, selected_indicator].iloc[0]
-                    if val == 0:
-                        feature["properties"]["fill"] = "white"
-            st.plotly_chart(fig_map, use_container_width=True)
+    # the selected pillar's indicators for every county
+    export_buttons(pillar_df, {"level": "county", "pillar": selected_pillar}, "county_export")
 
 
 st.markdown("""---""")
 
+rerun_timer.section("pcn")
 # ============================
 # 6. PCN-LEVEL SECTION (new, built on your final script)
 # ============================
 st.markdown("<h2 style='color:#1E90FF'>Subcounty Level Analysis</h2>", unsafe_allow_html=True)
 st.markdown("Use the filters below to drill down to PCN level.", unsafe_allow_html=True)
 
-# Horizontal filters: independent of sidebar controls
-filter_col1, filter_col2, filter_col3, filter_col4 = st.columns([2,2,2,2])
-
 # Build dictionary of PCN pillar groups from the PCN_PILLAR_KEYWORDS mapping (dynamic)
 pcn_pillars_map = group_columns_by_pillar(pcn_lvl_df, PCN_PILLAR_KEYWORDS)
+pcn_hierarchy = dashboard_hierarchy(pcn_lvl_df)
+pcn_filtered_plot = None
 if not pcn_pillars_map:
     st.warning("No PCN-level pillars detected automatically. Please check PCN_PILLAR_KEYWORDS or column names in pcn_lvl_data.csv.")
 else:
-    with filter_col1:
-# Add "All" option for County
-        county_options_pcn = sorted(pcn_lvl_df['County'].dropna().unique())
-        county_options_pcn_with_all = ["All"] + county_options_pcn
-        selected_county_pcn = st.selectbox("County (PCN data)", options=county_options_pcn_with_all)
-        
-    # --- Filter data based on County Selection ---
-    if selected_county_pcn == "All":
-        pcn_filtered = pcn_lvl_df.copy()
+    pcn_selection = pcn_selection_state()
+    pcn_batched = st.toggle("Apply filters together", key="pcn_batched",
+                            help="Pick the area and the indicator, then apply both in one update instead of one per filter.")
+    if pcn_batched:
+        # staged in a form: nothing reruns until Apply, and then only once
+        for widget_key in PCN_FILTER_KEYS.values():
+            st.session_state.pop(widget_key, None)
+        pcn_selection = valid_pcn_selection(pcn_selection, pcn_hierarchy, pcn_pillars_map)
+        area_paths = pcn_hierarchy.paths()
+        indicator_pairs = [(pillar, indicator) for pillar in pcn_pillars_map
+                           for indicator in pcn_indicator_options(pcn_pillars_map, pillar)]
+        # the pickers are seeded through their keys (a jump to an indicator sets one directly), so no index=
+        for name, options, current in (
+            ('area', area_paths, (pcn_selection['county'], pcn_selection['subcounty'], pcn_selection['pcn'])),
+            ('indicator', indicator_pairs, (pcn_selection['pillar'], pcn_selection['indicator'])),
+        ):
+            if st.session_state.get(PCN_FORM_KEYS[name]) not in options:
+                st.session_state[PCN_FORM_KEYS[name]] = current
+        with st.form("pcn_filter_form"):
+            form_col1, form_col2, form_col3 = st.columns([4, 5, 1])
+            with form_col1:
+                form_area = st.selectbox("Area", options=area_paths, format_func=area_label, key=PCN_FORM_KEYS['area'])
+            with form_col2:
+                form_pair = st.selectbox("Pillar / indicator", options=indicator_pairs,
+                                         format_func=lambda pair: f"{pair[0]}: {pair[1]}", key=PCN_FORM_KEYS['indicator'])
+            with form_col3:
+                st.form_submit_button("Apply")
+        pcn_selection = valid_pcn_selection(
+            dict(zip(['county', 'subcounty', 'pcn', 'pillar', 'indicator'], form_area + form_pair)),
+            pcn_hierarchy, pcn_pillars_map,
+        )
     else:
-        pcn_filtered = pcn_lvl_df[(pcn_lvl_df['County'] == selected_county_pcn)].copy()
-       
-    with filter_col2:
-        subcounty_list = sorted(pcn_lvl_df[pcn_lvl_df['County'] == selected_county_pcn]['Sub county'].dropna().unique())
-        subcounty_list = ["All"] + subcounty_list
-        selected_subcounty_pcn = st.selectbox("Subcounty", options=subcounty_list)
-        
-    with filter_col3:
-        # list unique standardized county names from PCN dataset
-         selected_pillar_pcn = st.selectbox("PCN Pillar", options=list(pcn_pillars_map.keys()))
-    with filter_col4:
-        indicator_options_pcn = [col for col in pcn_pillars_map[selected_pillar_pcn].columns if col not in ['County','Subcounty']]
-        selected_indicator_pcn = st.selectbox("PCN Indicator", options=indicator_options_pcn)
-        # allow "All" option
-        
-
-    # filter pcn dataframe
-    pcn_filtered = pcn_lvl_df[(pcn_lvl_df['County'] == selected_county_pcn)].copy()
-
-    # if a specific indicator was chosen, ensure its column exists in filtered frame
-    if selected_indicator_pcn not in pcn_filtered.columns:
+        # the form is re-seeded from the shared selection when it is switched back on
+        for widget_key in PCN_FORM_KEYS.values():
+            st.session_state.pop(widget_key, None)
+        # the widgets' own values are the newest input; the shared selection seeds them (URL, the form, a jump)
+        pcn_selection = dict(pcn_selection, **{name: st.session_state[key] for name, key in PCN_FILTER_KEYS.items()
+                                               if key in st.session_state})
+        pcn_selection = valid_pcn_selection(pcn_selection, pcn_hierarchy, pcn_pillars_map)
+        for name, key in PCN_FILTER_KEYS.items():
+            st.session_state[key] = pcn_selection[name]
+
+        # Horizontal filters: independent of sidebar controls
+        filter_col1, filter_col2, filter_col3, filter_col4, filter_col5 = st.columns([2,2,2,2,2])
+        # options come straight from the hierarchy index; "All" keeps everything under the level above
+        with filter_col1:
+            st.selectbox("County (PCN data)", options=[ALL] + pcn_hierarchy.counties(), key="pcn_county")
+        with filter_col2:
+            st.selectbox("Subcounty", options=[ALL] + pcn_hierarchy.subcounties(pcn_selection['county']), key="pcn_subcounty")
+        with filter_col3:
+            st.selectbox("PCN", options=[ALL] + pcn_hierarchy.pcns(pcn_selection['county'], pcn_selection['subcounty']),
+                         key="pcn_pcn")
+        with filter_col4:
+            st.selectbox("PCN Pillar", options=list(pcn_pillars_map.keys()), key="pcn_pillar")
+        with filter_col5:
+            st.selectbox("PCN Indicator", options=pcn_indicator_options(pcn_pillars_map, pcn_selection['pillar']),
+                         key="pcn_indicator")
+
+    st.session_state['pcn_selection'] = pcn_selection
+    sync_pcn_query_params(pcn_selection)
+    selected_county_pcn, selected_subcounty_pcn, selected_pcn = (pcn_selection['county'], pcn_selection['subcounty'],
+                                                                 pcn_selection['pcn'])
+    selected_pillar_pcn, selected_indicator_pcn = pcn_selection['pillar'], pcn_selection['indicator']
+
+    if cache_warmer is not None:
+        log_selection("pcn", {"county": selected_county_pcn, "subcounty": selected_subcounty_pcn, "pcn": selected_pcn,
+                              "pillar": selected_pillar_pcn, "indicator": selected_indicator_pcn})
+
+    # if a specific indicator was chosen, ensure its column exists in the PCN frame
+    if selected_indicator_pcn not in pcn_lvl_df.columns:
         st.warning(f"Indicator column '{selected_indicator_pcn}' not found in PCN dataset. Select another indicator.")
     else:
-        # apply subcounty filter if not 'All'
-        if selected_subcounty_pcn != "All":
-            pcn_filtered_plot = pcn_filtered[pcn_filtered['Sub county'] == selected_subcounty_pcn]
-        else:
-            pcn_filtered_plot = pcn_filtered.copy()
-
-        # ensure numeric conversion on the chosen indicator
-        pcn_filtered_plot[selected_indicator_pcn] = pd.to_numeric(pcn_filtered_plot[selected_indicator_pcn], errors='coerce')
+        # one lookup in the hierarchy index (numeric coercion already happened in load_and_clean_pcn_csv)
+        pcn_filtered_plot = select_pcn_rows(pcn_lvl_df, pcn_hierarchy, selected_county_pcn, selected_subcounty_pcn, selected_pcn)
 
         # layout: bar + map (same style)
         colA, colB = st.columns([1,1])
@@ -509,122 +879,348 @@ else:
         # BAR
         with colA:
             st.subheader(f"Bar Chart")
-            df_bar_pcn = pcn_filtered_plot.sort_values(by=selected_indicator_pcn, ascending=False)
             # if there are many columns, guard against empty
-            
-            if df_bar_pcn.empty:
+            if pcn_filtered_plot.empty:
                 st.info("No PCN data available for this selection.")
             else:
-                fig_bar_pcn = px.bar(
-                    df_bar_pcn,
-                    x='Sub county',
-                    y=selected_indicator_pcn,
-                    color='Sub county',
-                    text=selected_indicator_pcn,
-                    labels={selected_indicator_pcn: "Score (%)"},
-                    title=f"{selected_indicator_pcn} in {selected_subcounty_pcn} Subcounty"
-                )
-                fig_bar_pcn.update_traces(texttemplate='%{text:.1f}', textposition='outside')
-                fig_bar_pcn.update_layout(title_x=0, xaxis_tickangle=0, margin={"r":0,"t":30,"l":0,"b":0})
-                st.plotly_chart(fig_bar_pcn, use_container_width=True)
+                fig_bar_pcn = build_pcn_bar(pcn_filtered_plot, selected_indicator_pcn, selected_subcounty_pcn)
+                show_chart(fig_bar_pcn, "pcn bar")
 
         # MAP
         with colB:
             st.subheader("Geographic Map by Sub County")
-            if subcounty_geojson is None:
-                st.error("No subcounty shapefile/geojson loaded (SUBCOUNTY_SHAPE). Map rendering is optional.")
+            # everything above is already on screen while the ADM2 geometry loads (first time per process)
+            pcn_map_slot = st.empty()
+            pcn_map_slot.info("Loading subcounty map...")
+            # the county's own subcounty file when geo_partitions.py has built it
+            map_geojson, map_view, map_source = pcn_map_geometry(selected_county_pcn)
+            if map_geojson is None:
+                pcn_map_slot.error("No subcounty shapefile/geojson loaded (SUBCOUNTY_SHAPE). Map rendering is optional.")
             else:
+                fig_map_pcn = build_pcn_map(pcn_filtered_plot, selected_indicator_pcn, selected_county_pcn, map_geojson,
+                                            map_source, map_view)
+                spatial_caption = None
+                if st.checkbox("Outline hotspots / coldspots", value=spatial_ready('adm2', SUBCOUNTY_SHAPE),
+                               key="pcn_hotspots"):
+                    # tested over every subcounty in the country, then outlined where they are on this map
+                    spatial_caption = spatial_overlay(
+                        fig_map_pcn, 'adm2', tuple(pcn_lvl_df['Sub county'].map(standardize_name)),
+                        tuple(pcn_lvl_df[selected_indicator_pcn].to_numpy(dtype=float, na_value=np.nan)),
+                        map_geojson, "properties.Subcounty_Name_Key", SUBCOUNTY_SHAPE,
+                    )
+                show_chart(fig_map_pcn, "pcn map", pcn_map_slot)
+                if spatial_caption:
+                    st.caption(spatial_caption)
 
-                # --- Prepare mapping dataframe and ensure matches with GeoJSON ---
-                geo_sub_names = [f['properties']['Subcounty_Name_Key'] for f in subcounty_geojson['features']]
-                df_all_sub = pd.DataFrame({'Sub county': geo_sub_names})
-
-                df_score = pcn_filtered_plot[['Sub county', selected_indicator_pcn]].copy()
-                df_score['Sub county'] = df_score['Sub county'].apply(standardize_name)
-
-# --- Insert this *before* the merge (df_map_pcn = df_all_sub.merge(...)) ---
-
-                # 1. Filter the GeoJSON features based on the selected county
-                if selected_county_pcn != "All":
-                    
-                    # Filter features where the 'County_Name_Key' property matches the selected County
-                    filtered_features = [
-                        f for f in subcounty_geojson['features']
-                        if f['properties'].get('County_Name_Key') == selected_county_pcn
-                    ]
-                    
-                    # Create a new, filtered GeoJSON object
-                    map_geojson = subcounty_geojson.copy()
-                    map_geojson['features'] = filtered_features
-                    
-                    # Set map settings for a specific county view
-                    map_center = {"lat": 0.5, "lon": 37.9} # Default center
-                    map_zoom = 8.5 # Zoom level suitable for viewing a single county
-                    map_title_text = f"{selected_indicator_pcn} across PCNs in {selected_county_pcn}"
+        # the selected pillar's indicators for the PCNs in the current county / subcounty
+        if not pcn_filtered_plot.empty:
+            export_buttons(
+                selection_frame(pcn_filtered_plot, PCN_TABLE_COLUMNS + list(pcn_pillars_map[selected_pillar_pcn].columns)),
+                {"level": "pcn", "county": selected_county_pcn, "subcounty": selected_subcounty_pcn,
+                 "pcn": selected_pcn, "pillar": selected_pillar_pcn},
+                "pcn_export",
+            )
 
-                else:
-                    # If "All" is selected, use the full GeoJSON and national zoom/center
-                    map_geojson = subcounty_geojson
-                    map_center = {"lat": 0.5, "lon": 37.9} # National center
-                    map_zoom = 5.0 # National zoom level
-                    map_title_text = f"{selected_indicator_pcn} across all PCNs nationally"
-
-                # --- Prepare mapping dataframe and ensure matches with GeoJSON ---
-                geo_sub_names = [f['properties']['Subcounty_Name_Key'] for f in map_geojson['features']]
-                df_all_sub = pd.DataFrame({'Sub county': geo_sub_names})
-
-                df_score = pcn_filtered_plot[['Sub county', selected_indicator_pcn]].copy()
-                df_score['Sub county'] = df_score['Sub county'].apply(standardize_name)
-
-                # Merge all subcounties from geojson with actual data
-                df_map_pcn = df_all_sub.merge(df_score, on='Sub county', how='left')
-
-                # Fill NaN scores (for subcounties with no data) with 0 for plotting
-                df_map_pcn[selected_indicator_pcn] = df_map_pcn[selected_indicator_pcn].fillna(0)
-
-                # --- Create map ---
-                fig_map_pcn = px.choropleth_mapbox(
-                    df_map_pcn,
-                    geojson=map_geojson, # Use the filtered GeoJSON
-                    locations='Sub county',
-                    featureidkey="properties.Subcounty_Name_Key",
-                    color=selected_indicator_pcn,
-                    hover_name='Sub county',
-                    color_continuous_scale="RdYlGn",
-                    mapbox_style="white-bg",
-                    zoom=map_zoom, # Use dynamic zoom
-                    center=map_center, # Use dynamic center
-                    opacity=0.85,
-                    labels={selected_indicator_pcn: "Score (%)"},
-                )
+rerun_timer.section("table")
+# -------------------------
+# 7. Data Table Summary (optional) - show the filtered PCN data for transparency
+# -------------------------
+st.markdown("---")
+st.header("PCN Data (Filtered)")
+if pcn_filtered_plot is None or pcn_filtered_plot.empty:
+    st.write("Select PCN Pillar/Indicator/County to view PCN table.")
+else:
+    # sorting, search and paging happen here; only the visible page goes to the browser
+    table_columns = [c for c in PCN_TABLE_COLUMNS if c in pcn_filtered_plot.columns] + [selected_indicator_pcn]
+    tcol1, tcol2, tcol3, tcol4 = st.columns([3, 2, 2, 1])
+    with tcol1:
+        table_search = st.text_input("Search County / Sub county / PCN", key="pcn_table_search")
+    with tcol2:
+        table_sort_by = st.selectbox("Sort by", options=table_columns, index=len(table_columns) - 1,
+                                     key="pcn_table_sort_by")
+    with tcol3:
+        table_order = st.selectbox("Order", options=["Descending", "Ascending"], key="pcn_table_order")
+    with tcol4:
+        table_page_size = st.selectbox("Rows", options=PAGE_SIZES, key="pcn_table_page_size")
 
-                fig_map_pcn.update_traces(marker_line={'width':0.5,'color':'grey'}, selector=dict(type='choroplethmapbox'))
-                fig_map_pcn.update_layout(
-                    coloraxis_colorbar=dict(
-                        title=dict(text="Score (%)", font=dict(color="black", size=12)),
-                        tickformat=".0f",
-                        tickfont=dict(color="black"),
-                        x=0.97, xanchor="right", y=0.5, yanchor="middle", len=0.6, thickness=12,
-                        bgcolor="rgba(255,255,255,0.6)"
-                    ),
-                    margin={"r":0,"t":30,"l":0,"b":0}
-                )
+    positions = pcn_table_positions(pcn_filtered_plot, selected_indicator_pcn, table_search,
+                                    table_sort_by, table_order == "Ascending")
+    n_pages = page_count(len(positions), table_page_size)
+    # the page widget is keyed by the selection, so a new filter/sort starts again at page 1
+    page_key = "pcn_table_page_" + "|".join(map(str, [
+        selected_county_pcn, selected_subcounty_pcn, selected_pcn, selected_indicator_pcn,
+        table_search, table_sort_by, table_order, table_page_size,
+    ]))
+    table_page = st.number_input(f"Page (of {n_pages})", min_value=1, max_value=n_pages, value=1, step=1,
+                                 key=page_key)
+    page_df = page_frame(pcn_filtered_plot, positions, table_columns, int(table_page), table_page_size)
+    st.dataframe(page_df, use_container_width=True)
+    first_row = (int(table_page) - 1) * table_page_size + 1
+    st.caption(f"Rows {first_row if len(positions) else 0}-{first_row + len(page_df) - 1 if len(page_df) else 0} "
+               f"of {len(positions)}")
 
-                fig_map_pcn.add_annotation(
-                    text=f"{selected_indicator_pcn} across PCNs in {selected_county_pcn}",
-                    xref="paper", yref="paper", x=0.5, y=0.98, showarrow=False,
-                    font=dict(size=11, color="black"), bgcolor="rgba(255,255,255,0.7)",
-                    bordercolor="black", borderwidth=1, borderpad=6
-                )
+rerun_timer.section("heatmap")
+# -------------------------
+# 7b. EVERY PCN x EVERY INDICATOR OF A PILLAR
+# -------------------------
+st.markdown("---")
+st.markdown("<h2 style='color:#1E90FF'>PCN x Indicator Heatmap</h2>", unsafe_allow_html=True)
+st.markdown("Every PCN against every indicator of a pillar. Percentiles put indicators with different ranges on one scale "
+            "(higher is always better).", unsafe_allow_html=True)
+
+heatmap_indicators = {pillar: [c for c in frame.columns if c != 'County'] for pillar, frame in pcn_pillars_map.items()}
+heatmap_indicators["All pillars"] = list(dict.fromkeys(c for cols in heatmap_indicators.values() for c in cols))
+hm_col1, hm_col2, hm_col3, hm_col4 = st.columns([3, 2, 3, 2])
+with hm_col1:
+    heatmap_pillar = st.selectbox("Pillar", options=list(heatmap_indicators.keys()), key="heatmap_pillar")
+with hm_col2:
+    heatmap_scale = st.selectbox("Colour by", options=list(SCALES), key="heatmap_scale")
+with hm_col3:
+    heatmap_order = st.selectbox("Row order", options=list(ROW_ORDERS.keys()), key="heatmap_order")
+with hm_col4:
+    heatmap_rows = st.slider("Rows drawn at most", min_value=50, max_value=400, value=HEATMAP_MAX_ROWS, step=25,
+                             key="heatmap_rows")
 
-                st.plotly_chart(fig_map_pcn, use_container_width=True)
+if not heatmap_indicators[heatmap_pillar]:
+    st.info("No indicators in this pillar.")
+else:
+    fig_heatmap, full_shape, drawn_shape = build_pcn_heatmap(
+        pcn_lvl_df, tuple(heatmap_indicators[heatmap_pillar]), heatmap_scale, heatmap_order, heatmap_rows,
+        f"{heatmap_pillar} - {heatmap_scale.lower()}",
+    )
+    show_chart(fig_heatmap, "pcn heatmap")
+    if drawn_shape != full_shape:
+        st.caption(f"{full_shape[0]} PCNs x {full_shape[1]} indicators drawn as {drawn_shape[0]} x {drawn_shape[1]} cells: "
+                   "each cell is the mean of a run of neighbouring rows / columns (hover for how many).")
 
+rerun_timer.section("peers")
 # -------------------------
-# 7. Data Table Summary (optional) - show the filtered PCN data for transparency
+# 7c. PEER PCNs: the most similar indicator profiles
 # -------------------------
 st.markdown("---")
-st.header("PCN Data (Filtered)")
-try:
-    st.dataframe(pcn_filtered[[ 'County', 'Subcounty', selected_indicator_pcn ]].sort_values(by=selected_indicator_pcn, ascending=False), use_container_width=True)
-except Exception:
-    st.write("Select PCN Pillar/Indicator/County to view PCN table.")
+st.markdown("<h2 style='color:#1E90FF'>Peer PCNs</h2>", unsafe_allow_html=True)
+st.markdown("The PCNs whose indicator profile is closest to the selected one, and where each of them does better.",
+            unsafe_allow_html=True)
+
+peer_col1, peer_col2, peer_col3 = st.columns([4, 3, 2])
+with peer_col2:
+    peer_pillar = st.selectbox("Compare on", options=list(heatmap_indicators.keys())[::-1], key="peer_pillar")
+peer_index = get_peer_index(pcn_lvl_df, tuple(heatmap_indicators[peer_pillar]))
+with peer_col1:
+    peer_label = st.selectbox("Find peers of", options=sorted(peer_index.with_peers), key="peer_pcn")
+with peer_col3:
+    peer_k = st.slider("Peers", min_value=1, max_value=MAX_K, value=10, key="peer_k")
+
+if peer_label is None:
+    st.info("No PCN reports enough of these indicators to be compared with another.")
+else:
+    peer_table, peer_deltas = peer_index.peers(peer_index.position(peer_label), peer_k)
+    peer_colA, peer_colB = st.columns([3, 2])
+    with peer_colA:
+        st.dataframe(peer_table.round(2), use_container_width=True, hide_index=True)
+        st.caption("Distance is the typical difference per shared indicator, in standard deviations. "
+                   "Mean percentile is over every indicator compared (higher is better).")
+    with peer_colB:
+        selected_row = peer_index.names.iloc[peer_index.position(peer_label)]
+        peer_counties = tuple(sorted({standardize_name(selected_row['County'])}
+                                     | set(peer_table['County'].map(standardize_name))))
+        # just these counties' partition files; the national ADM2 file only when geo_partitions.py hasn't run
+        peer_geojson, peer_geo_source = counties_geometry(peer_counties)
+        if peer_geojson is None:
+            st.error("No subcounty shapefile/geojson loaded (SUBCOUNTY_SHAPE). Map rendering is optional.")
+        else:
+            show_chart(build_peer_map(standardize_name(selected_row['Sub county']),
+                                      tuple(sorted(set(peer_table['Sub county'].map(standardize_name)))),
+                                      peer_counties,
+                                      f"{selected_row['PCN']} and its {len(peer_table)} peers", peer_geojson,
+                                      peer_geo_source),
+                       "peer map")
+    with st.expander("Indicator by indicator: peer minus selected"):
+        st.dataframe(peer_deltas.round(1), use_container_width=True)
+
+rerun_timer.section("correlations")
+# ============================
+# 8. INDICATOR CORRELATIONS
+# ============================
+st.markdown("---")
+st.markdown("<h2 style='color:#1E90FF'>Indicator Correlations</h2>", unsafe_allow_html=True)
+st.markdown("Which indicators move together? Each pair only uses the rows where both indicators are reported.", unsafe_allow_html=True)
+
+corr_col1, corr_col2, corr_col3 = st.columns([2,2,2])
+with corr_col1:
+    corr_level = st.selectbox("Level", options=["PCN", "County"], key="corr_level")
+corr_source_df, corr_keywords = (pcn_lvl_df, PCN_PILLAR_KEYWORDS) if corr_level == "PCN" else (df_county_raw, PILLAR_KEYWORDS)
+with corr_col2:
+    corr_pillar = st.selectbox("Pillar filter", options=["All pillars"] + list(corr_keywords.keys()), key="corr_pillar")
+with corr_col3:
+    corr_method = st.selectbox("Method", options=["pearson", "spearman"], key="corr_method")
+
+corr_all, corr_counts_all = indicator_correlations(corr_source_df, corr_method)
+if corr_pillar == "All pillars":
+    corr_cols = list(corr_all.index)
+else:
+    # same substring matching as group_columns_by_pillar, applied to the cached matrix
+    corr_cols = [
+        col for col in corr_all.index
+        if any(keyword.lower() in col.lower() for keyword in corr_keywords[corr_pillar])
+    ]
+
+if len(corr_cols) < 2:
+    st.info("Not enough numeric indicators with data in this pillar to correlate.")
+else:
+    corr_view = corr_all.loc[corr_cols, corr_cols]
+    counts_view = corr_counts_all.loc[corr_cols, corr_cols]
+    if len(corr_cols) > MAX_HEATMAP_INDICATORS:
+        st.info(f"{len(corr_cols)} indicators is too many to draw as a heatmap; pick a pillar. The strongest pairs are listed below.")
+    else:
+        fig_corr = build_correlation_heatmap(corr_view, counts_view, f"{corr_method.title()} correlation - {corr_level} level, {corr_pillar}")
+        show_chart(fig_corr, "correlation heatmap")
+    st.subheader("Strongest pairs")
+    st.dataframe(strongest_pairs(corr_view, counts_view), use_container_width=True, hide_index=True)
+
+rerun_timer.section("whatif")
+# ============================
+# 9. WHAT-IF PILLAR WEIGHTS
+# ============================
+st.markdown("---")
+st.markdown("<h2 style='color:#1E90FF'>What-if Scoring</h2>", unsafe_allow_html=True)
+st.markdown("Change the pillar weights to see how totals and rankings move against the published ranking.", unsafe_allow_html=True)
+
+WHATIF_SOURCES = {"Reported pillar scores": "reported", "Recomputed from indicators": "indicators"}
+whatif_col1, whatif_col2 = st.columns([2,2])
+with whatif_col1:
+    whatif_level = st.selectbox("Level", options=["County", "PCN"], key="whatif_level")
+with whatif_col2:
+    whatif_source_label = st.selectbox("Pillar scores", options=list(WHATIF_SOURCES.keys()), key="whatif_source")
+
+whatif_df = df_county_raw if whatif_level == "County" else pcn_lvl_df
+scoring_engine = get_scoring_engine(whatif_df, whatif_level, WHATIF_SOURCES[whatif_source_label])
+if not scoring_engine.pillars:
+    st.info("No pillar scores found for this level.")
+else:
+    pillar_weights = {}
+    with st.expander("Pillar weights", expanded=True):
+        slider_cols = st.columns(3)
+        for i, pillar in enumerate(scoring_engine.pillars):
+            with slider_cols[i % 3]:
+                pillar_weights[pillar] = st.slider(
+                    pillar, min_value=0.0, max_value=3.0, value=1.0, step=0.25,
+                    key=f"whatif_{whatif_level}_{pillar}"
+                )
+    # baseline: the table's own published total and rank; equal pillar weights only when it has none
+    whatif_baseline, whatif_label = scoring_engine.published_scores(), "Published"
+    if whatif_baseline is None:
+        whatif_baseline, whatif_label = scoring_engine.score(), "Baseline"
+    whatif_table = compare_rankings(whatif_baseline, scoring_engine.score(pillar_weights), scoring_engine.key_columns,
+                                    label=whatif_label)
+    if whatif_table.empty:
+        st.info("No rows have pillar scores to rank.")
+    else:
+        if scoring_engine.total_column:
+            st.caption(f"Total is the weighted mean of the pillar scores. Published Total / Rank are the table's "
+                       f"'{scoring_engine.total_column}'; Rank Shift compares the two rankings over the "
+                       f"{int(whatif_table['Rank Shift'].notna().sum())} rows that have both (positive = moved up).")
+        st.dataframe(whatif_table.round(1), use_container_width=True, hide_index=True)
+
+rerun_timer.section("rollup")
+# ============================
+# 10. COUNTY vs PCN ROLL-UP
+# ============================
+st.markdown("---")
+st.markdown("<h2 style='color:#1E90FF'>County vs PCN Roll-up</h2>", unsafe_allow_html=True)
+st.markdown("Compare a county-level indicator with the same county's PCN rows rolled up.", unsafe_allow_html=True)
+
+county_rollup = get_county_rollup(df_county_raw, pcn_lvl_df)
+rollup_report = county_rollup.report()
+if rollup_report:
+    with st.expander("County names that did not match between the two tables"):
+        for line in rollup_report:
+            st.write(line)
+
+rollup_county_options = [c for c in df_county_raw.columns if c != 'County']
+rollup_col1, rollup_col2, rollup_col3 = st.columns([3, 3, 1])
+with rollup_col1:
+    rollup_county_indicator = st.selectbox(
+        "County indicator", options=rollup_county_options, key="rollup_county_indicator",
+        index=rollup_county_options.index('Proportion of PCNs Established') if 'Proportion of PCNs Established' in rollup_county_options else 0,
+    )
+with rollup_col2:
+    rollup_pcn_indicator = st.selectbox("PCN indicator", options=county_rollup.pcn_indicators, key="rollup_pcn_indicator")
+with rollup_col3:
+    rollup_stat = st.selectbox("PCN roll-up", options=[s for s in ROLLUP_STATS if s != 'count'], key="rollup_stat")
+
+rollup_table = county_rollup.compare(rollup_county_indicator, rollup_pcn_indicator, rollup_stat)
+st.dataframe(rollup_table.round(1), use_container_width=True, hide_index=True)
+
+rerun_timer.section("rounds")
+# ============================
+# 11. ROUND-OVER-ROUND CHANGE (needs a rounds file with two or more rounds, see rounds.py)
+# ============================
+assessment_rounds = load_rounds()
+if len(assessment_rounds) >= 2:
+    st.markdown("---")
+    st.markdown("<h2 style='color:#1E90FF'>Round-over-round Change</h2>", unsafe_allow_html=True)
+    st.markdown("Which counties and PCNs improved between two assessment rounds.", unsafe_allow_html=True)
+
+    round_labels = list(assessment_rounds.keys())
+    rounds_col1, rounds_col2, rounds_col3 = st.columns([1, 2, 2])
+    with rounds_col1:
+        rounds_level = st.selectbox("Level", options=["County", "PCN"], key="rounds_level")
+    with rounds_col2:
+        round_before = st.selectbox("Earlier round", options=round_labels, index=len(round_labels) - 2, key="round_before")
+    with rounds_col3:
+        round_after = st.selectbox("Later round", options=round_labels, index=len(round_labels) - 1, key="round_after")
+
+    file_key = rounds_level.lower()
+    before_path = assessment_rounds[round_before].get(file_key)
+    after_path = assessment_rounds[round_after].get(file_key)
+    if round_before == round_after:
+        st.info("Pick two different rounds.")
+    elif not before_path or not after_path:
+        st.info(f"One of the rounds has no {rounds_level} file.")
+    else:
+        comparison = get_round_comparison(rounds_level, before_path, after_path, data_version(before_path, after_path))
+        round_report = comparison.report()
+        if round_report:
+            with st.expander("Rows and indicators that could not be paired"):
+                for line in round_report:
+                    st.write(line)
+
+        round_keywords = PILLAR_KEYWORDS if rounds_level == "County" else PCN_PILLAR_KEYWORDS
+        round_pillars = {}
+        for _, pillar, indicator in catalog_entries(rounds_level, comparison.indicators, round_keywords):
+            round_pillars.setdefault(pillar, []).append(indicator)
+
+        if not round_pillars:
+            st.info("The two rounds share no indicators.")
+        else:
+            pick_col1, pick_col2, pick_col3 = st.columns([2, 3, 1])
+            with pick_col1:
+                round_pillar = st.selectbox("Pillar", options=list(round_pillars.keys()), key="round_pillar")
+            with pick_col2:
+                round_indicator = st.selectbox("Indicator", options=round_pillars[round_pillar], key="round_indicator")
+            with pick_col3:
+                round_metric = st.selectbox("Show", options=list(CHANGE_METRICS.keys()), key="round_metric")
+
+            st.dataframe(comparison.summary(round_pillars[round_pillar]).round(2),
+                         use_container_width=True, hide_index=True)
+
+            change_frame = comparison.indicator_frame(round_indicator)
+            # a rank shift is always "up is better"; raw and % change follow the indicator's direction
+            lower_better = bool(comparison.flip[round_indicator]) and round_metric != "Rank shift"
+            round_colA, round_colB = st.columns([2, 2])
+            with round_colA:
+                show_chart(build_round_bar(change_frame, round_indicator, round_metric, rounds_level, lower_better),
+                           "round change bar")
+            with round_colB:
+                round_geojson, geo_source = ((geojson_data, COUNTY_SHAPE) if rounds_level == "County"
+                                             else national_subcounty_geometry())
+                if round_geojson is None:
+                    st.error("No boundaries loaded for this level. Map rendering is optional.")
+                else:
+                    show_chart(build_round_map(change_frame, round_indicator, round_metric, rounds_level,
+                                               lower_better, round_geojson, geo_source),
+                               "round change map")
+            st.dataframe(change_frame.round(2), use_container_width=True, hide_index=True)
+
+rerun_timer.finish()
@@ -0,0 +1,240 @@
+"""
+Precompiled data bundle: everything dashboard3.0.py otherwise rebuilds from the
+CSVs and shapefiles at startup, in one file that is memory-mapped instead of parsed.
+
+    python data_bundle.py [out]            (default: pcn_dashboard.bundle)
+
+builds it from the same sources and cleaning rules as the dashboard (pcn_data.py);
+PCN_DATA_BUNDLE=<path> makes the dashboard open it. Layout:
+
+    b"PCNBNDL1" | header length (uint64) | JSON header | arrays, each 64-byte aligned
+
+The header holds the source versions (disk_cache.data_version, so a changed CSV or
+shapefile marks the bundle stale), the column catalog, pillar index and schema drift
+report of each table, the name categories, the County -> Subcounty -> PCN index
+(hierarchy.py) and the offset/dtype/shape of every array. Each table's scores are one
+float64 matrix stored indicator-major, so every indicator column is a contiguous
+row; name columns are int32 codes into the categories. Opening the bundle reads the
+header only: frames are built on numpy views of the read-only mapping (no copy,
+pages shared between every process through the OS page cache), and the pre-keyed
+geometry is kept as geojson bytes that are decoded the first time a map needs them.
+"""
+import json
+import mmap
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from disk_cache import data_version
+from hierarchy import PCNHierarchy
+from pcn_data import (PCN_PILLAR_KEYWORDS, PILLAR_KEYWORDS, county_geojson, read_county_csv, read_pcn_csv,
+                      subcounty_geojson)
+
+BUNDLE_ENV_VAR = "PCN_DATA_BUNDLE"
+DEFAULT_BUNDLE = "pcn_dashboard.bundle"
+MAGIC = b"PCNBNDL1"
+ALIGN = 64
+
+TABLES = ('county', 'pcn')
+GEOMETRY = ('county', 'subcounty')
+
+
+def bundle_path():
+    # "" when the dashboard should read the CSVs as before
+    return os.environ.get(BUNDLE_ENV_VAR, "").strip()
+
+
+def source_versions(county_csv, pcn_csv, county_shape, subcounty_shape):
+    return {
+        'county_csv': data_version(county_csv),
+        'pcn_csv': data_version(pcn_csv),
+        'county_shape': data_version(county_shape),
+        'subcounty_shape': data_version(subcounty_shape),
+    }
+
+
+def _pillar_index(df, pillar_keywords):
+    # same rule as group_columns_by_pillar, kept as column lists
+    index = {}
+    for pillar, keywords in pillar_keywords.items():
+        cols = ['County'] + [col for col in df.columns if any(kw.lower() in col.lower() for kw in keywords)]
+        if len(cols) > 1:
+            index[pillar] = cols
+    return index
+
+
+class _Writer:
+    def __init__(self):
+        self.blobs, self.arrays, self.size = [], {}, 0
+
+    def add(self, name, array):
+        array = np.ascontiguousarray(array)
+        self.arrays[name] = {'offset': self.size, 'dtype': array.dtype.str, 'shape': list(array.shape)}
+        self.add_bytes(array.tobytes())
+
+    def add_bytes(self, data, name=None):
+        if name is not None:
+            self.arrays[name] = {'offset': self.size, 'dtype': '|u1', 'shape': [len(data)]}
+        pad = -len(data) % ALIGN
+        self.blobs.append(data + b"\0" * pad)
+        self.size += len(data) + pad
+
+
+def _add_table(writer, level, df, text_columns, pillar_keywords, report):
+    text = [c for c in df.columns if c in text_columns]
+    scores = [c for c in df.columns if c not in text_columns]
+    names = {}
+    for col in text:
+        values = df[col].astype(object).where(df[col].notna())
+        codes, categories = pd.factorize(values, sort=True)
+        writer.add(f"{level}/names/{col}", codes.astype(np.int32))
+        names[col] = [str(c) for c in categories]
+    # indicator-major: row i of the matrix is indicator i over every county / PCN
+    writer.add(f"{level}/scores", df[scores].to_numpy(dtype=np.float64).T)
+    writer.add(f"{level}/index", df.index.to_numpy(dtype=np.int64))
+    return {
+        'columns': list(df.columns),
+        'text_columns': text,
+        'score_columns': scores,
+        'names': names,
+        'pillars': _pillar_index(df, pillar_keywords),
+        'schema_report': report,
+    }
+
+
+def build_bundle(out_path, county_csv, pcn_csv, county_shape, subcounty_shape):
+    """Write the bundle for these sources (atomically); returns the header."""
+    writer = _Writer()
+    county_df, county_report = read_county_csv(county_csv)
+    pcn_df, pcn_report = read_pcn_csv(pcn_csv)
+    header = {
+        'sources': source_versions(county_csv, pcn_csv, county_shape, subcounty_shape),
+        'tables': {
+            'county': _add_table(writer, 'county', county_df, {'County'}, PILLAR_KEYWORDS, county_report),
+            'pcn': _add_table(writer, 'pcn', pcn_df, {'County', 'Sub county', 'PCN', 'pcn_location'},
+                              PCN_PILLAR_KEYWORDS, pcn_report),
+        },
+    }
+
+    hierarchy = PCNHierarchy(pcn_df)
+    nodes, positions = hierarchy.to_arrays()
+    writer.add("hierarchy/positions", positions)
+    header['hierarchy'] = {'levels': hierarchy.levels, 'nodes': nodes}
+
+    # geometry that fails to load is left out; the dashboard then shows its usual "no map" message
+    header['geometry'] = {}
+    for name, loader, path in (('county', county_geojson, county_shape), ('subcounty', subcounty_geojson, subcounty_shape)):
+        try:
+            geojson = loader(path)
+        except Exception as e:
+            header['geometry'][name] = {'error': str(e)}
+            continue
+        writer.add_bytes(json.dumps(geojson, separators=(',', ':')).encode(), f"geometry/{name}")
+    header['arrays'] = writer.arrays
+
+    head = json.dumps(header).encode()
+    start = len(MAGIC) + 8 + len(head)
+    pad = -start % ALIGN
+    tmp_path = f"{out_path}.tmp"
+    with open(tmp_path, "wb") as fh:
+        fh.write(MAGIC)
+        fh.write(np.uint64(len(head) + pad).tobytes())
+        fh.write(head + b" " * pad)
+        for blob in writer.blobs:
+            fh.write(blob)
+    os.replace(tmp_path, out_path)
+    return header
+
+
+class DataBundle:
+    """Read-only view of a bundle file; every array is a slice of one shared mapping."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as fh:
+            self._map = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a PCN data bundle")
+        head_len = int(np.frombuffer(self._map, dtype=np.uint64, count=1, offset=len(MAGIC))[0])
+        self._data_start = len(MAGIC) + 8 + head_len
+        self.header = json.loads(self._map[len(MAGIC) + 8:self._data_start])
+        self._frames, self._pillar_frames, self._columns_by_level = {}, {}, {}
+        self._geojson, self._hierarchy = {}, None
+
+    def array(self, name):
+        spec = self.header['arrays'][name]
+        dtype = np.dtype(spec['dtype'])
+        count = int(np.prod(spec['shape']))
+        flat = np.frombuffer(self._map, dtype=dtype, count=count, offset=self._data_start + spec['offset'])
+        return flat.reshape(spec['shape'])
+
+    def matches(self, county_csv, pcn_csv, county_shape, subcounty_shape):
+        # False once any source file has changed since the bundle was built
+        return self.header['sources'] == source_versions(county_csv, pcn_csv, county_shape, subcounty_shape)
+
+    def _columns(self, level):
+        # {column: Categorical over mapped codes, or a mapped row of the score matrix}, built once per level
+        if level not in self._columns_by_level:
+            table = self.header['tables'][level]
+            scores = self.array(f"{level}/scores")
+            columns = {}
+            for col in table['text_columns']:
+                columns[col] = pd.Categorical.from_codes(self.array(f"{level}/names/{col}"), table['names'][col])
+            for i, col in enumerate(table['score_columns']):
+                columns[col] = scores[i]
+            self._columns_by_level[level] = (columns, pd.Index(self.array(f"{level}/index")))
+        return self._columns_by_level[level]
+
+    def _view(self, level, cols):
+        # copy=False keeps one block per column, each a view of the mapping; df[cols] would copy them
+        columns, index = self._columns(level)
+        return pd.DataFrame({col: columns[col] for col in cols}, index=index, copy=False)
+
+    def frame(self, level):
+        if level not in self._frames:
+            self._frames[level] = self._view(level, self.header['tables'][level]['columns'])
+        return self._frames[level]
+
+    def pillar_frames(self, level):
+        # built once per bundle, on views of the same mapped columns as frame()
+        if level not in self._pillar_frames:
+            self._pillar_frames[level] = {pillar: self._view(level, cols)
+                                          for pillar, cols in self.header['tables'][level]['pillars'].items()}
+        return self._pillar_frames[level]
+
+    def schema_report(self, level):
+        return self.header['tables'][level]['schema_report']
+
+    def hierarchy(self):
+        if self._hierarchy is None:
+            spec = self.header['hierarchy']
+            self._hierarchy = PCNHierarchy.from_arrays(spec['levels'], spec['nodes'], self.array("hierarchy/positions"))
+        return self._hierarchy
+
+    def geojson(self, name):
+        # decoded once per process, on first use; None when the build couldn't load that shapefile
+        if name not in self._geojson:
+            key = f"geometry/{name}"
+            self._geojson[name] = json.loads(self.array(key).tobytes()) if key in self.header['arrays'] else None
+        return self._geojson[name]
+
+
+def main(argv):
+    out_path = argv[1] if len(argv) > 1 else DEFAULT_BUNDLE
+    county_csv = os.environ.get("PCN_COUNTY_CSV", "county_lvl_data.csv")
+    pcn_csv = os.environ.get("PCN_PCN_CSV", "pcn_lvl_data.csv")
+    header = build_bundle(out_path, county_csv, pcn_csv,
+                          "ken_admbnda_adm1_iebc_20191031.shp", "ken_admbnda_adm2_iebc_20191031.shp")
+    for level in TABLES:
+        table = header['tables'][level]
+        print(f"{level}: {len(table['score_columns'])} indicators, {len(table['pillars'])} pillars")
+    for name in GEOMETRY:
+        error = header['geometry'].get(name, {}).get('error')
+        print(f"{name} geometry: {'error: ' + error if error else 'ok'}")
+    print(f"wrote {out_path} ({os.path.getsize(out_path) / 1e6:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main(sys.argv)
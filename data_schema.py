@@ -0,0 +1,304 @@
+"""
+Declared schemas for county_lvl_data.csv and pcn_lvl_data.csv.
+
+Each schema lists the canonical column names and their dtypes, the NA tokens the
+assessment templates use, the empty section-header columns to skip, and aliases
+for header spellings seen in other rounds. read_with_schema() turns that into a
+single typed pd.read_csv call (usecols/dtype/na_values), so the loaders no longer
+need a frame-wide replace() followed by a pd.to_numeric loop, and returns a drift
+report describing anything in the file that did not match the declaration.
+"""
+import re
+
+import pandas as pd
+
+# every token the templates use for "no value"
+NA_TOKENS = ['N/A', 'N\\A', '#DIV/0!', '#N/A', '#VALUE!', '', ' ', '-']
+
+TEXT_DTYPE = str
+SCORE_DTYPE = 'float64'
+
+COUNTY_SCHEMA = {
+    'encoding': 'ISO-8859-1',
+    # row 48 of the county sheet is the "National" aggregate, not a county
+    'nrows': 47,
+    'text_columns': ['County'],
+    'numeric_columns': [
+        'Proportion of functional PHC advisory Committees in Place',
+        'Proportion of PCNs Established',
+        'Proportion of PCNs Gazetted',
+        'Availability of a Functional PCN management committee',
+        'Proportion of Hospital management boards appointed/gazetted:',
+        'Proportion of Health Facilities (level 2&3) with Health Facility Management Committee Appointed/Gazetted',
+        'Availability of a functional PHC TWG Score',
+        'Proportion of PCNs with an operational budget for the MDT activities:',
+        'Perfomance Review Score',
+        'CHMT Support Supervision Score',
+        'Governance Score',
+        'Governance Weighted Score',
+        'Does the County have a mechanism to enhance health workers skills',
+        'HRH Score',
+        'HRH Weighted Score',
+        'Proportion of county health budget allocated to drugs and supplies',
+        'Proportion of county HPT budget allocated to levels 2&3 :',
+        'HPT Score',
+        'HPT Weighted Score',
+        'PCNs with functional refferal mechanisms',
+        'Service Delivery Systems Score',
+        'Service Delivery Systems Weighted Score',
+        'Proportion of households registered on SHA within the County',
+        'Healthcare Financing Score',
+        'Healthcare Financing Weighted Score',
+        'Proportion of SMART PCNs in the County',
+        'HMIS Score',
+        'HMIS Weighted Score',
+        'Mechanism to Coordinate Quality Improvement Score',
+        'Mechanism for Implementation of Support Supervision in Health Facilities Score',
+        'Presence of an Infection Prevention Control (IPC) committee Score',
+        'QoC Management Systems Score',
+        'QoC Management Systems Weighted Score',
+        'Number of bi-annual multisectoral stakeholder forums Score',
+        'Proportion of MOUs and partnership agreements aligned to PHC signed',
+        'Research studies done on PCN implementation Score',
+        'Multisectoral Partnerships and Coordination Score',
+        'Multisectoral Partnerships and Coordination Weighted Score',
+        'Number of knowledge management and learning forums conducted Score:',
+        'No. of research studies done on PCN implementation Score',
+        'Innovations and Learning Score',
+        'Innovations and Learning Weighted Score',
+        'Total County Score (Total Weighted Score)',
+    ],
+    # section headers in the template: always empty, never plotted
+    'drop_columns': [
+        'Human Resource for Health',
+        'Health Product Technologies',
+        'SERVICE DELIVERY',
+        'HEALTH CARE FINANCING',
+        'HMIS/ DIGITAL HEALTH',
+        'QUALITY OF CARE -MANAGEMENT SYSTEMS',
+        'MULTISECTORAL PARTNERSHIPS AND COORDINATION',
+        'INNOVATIONS AND LEARNING',
+    ],
+    # header spelling (after clean_header) -> canonical column name
+    'aliases': {
+        'Counties': 'County',
+        'Performance Review Score': 'Perfomance Review Score',
+        'PCNs with functional referral mechanisms': 'PCNs with functional refferal mechanisms',
+        'Proportion of Hospital management boards appointed/gazetted': 'Proportion of Hospital management boards appointed/gazetted:',
+        'Proportion of PCNs with an operational budget for the MDT activities': 'Proportion of PCNs with an operational budget for the MDT activities:',
+        'Total County Score': 'Total County Score (Total Weighted Score)',
+    },
+}
+
+PCN_SCHEMA = {
+    'encoding': 'ISO-8859-1',
+    'nrows': None,
+    'text_columns': ['County', 'Sub county', 'PCN', 'pcn_location'],
+    'numeric_columns': [
+        'Proportion of functional Community Health Committees in the PCN',
+        'Proportion of Health facilities that have received supportive supervision in the PCN',
+        'Functional PCN Management committee',
+        'Functionallity of MDTs',
+        'Governance Score',
+        'Governance Weighted Score',
+        'Number of population profiling assessments conducted',
+        'Proportion of population health needs that have been addressed',
+        'Number of wellness activities conducted within the PCN',
+        'Population Needs Score',
+        'Population Needs Weighted Score',
+        'Proportion of facilities in the PCN that had all 22 tracer pharmaceuticals at the time of assessment',
+        'Proportion of facilities in the PCN that have all 23 tracer non-pharmaceuticals at the time of assessment',
+        'Availability of the whole blood and blood components in the hospitals',
+        'Percentage of Health facilities with stock out on any of the 22 tracer pharmaceuticals for 7 consecutive days in a month*',
+        'Percentage of Health facilities with stock out on any of the 22 tracer non-pharmaceuticals for 7 consecutive days in a month*',
+        'Proportion of hospitals with comprehensive lab services within the PCN',
+        'Proportion of spokes with basic lab services within the PCN',
+        'Proportion of Facilities within the PCN with all basic tracer equipment available and functional **List provided below the template',
+        'Capacity Readiness Score',
+        'Capacity Readiness Weighted Score',
+        'Proportion of clients accessing Health Services using SHIF',
+        'Proportion of the target Health Facilities empanneled on SHA within the PCN',
+        'Proportion of Health Facilities in the PCN making SHA claims',
+        'Proportion of claims reimbursed to HFs within the PCN',
+        'Proportion of FIF collected rolled back to the facilities within PCN',
+        'Number of people waived for user fees in Hospitals within the PCN',
+        'Total amount of user fees waived in Health care Facilities within the PCN',
+        'Healthcare Financing Score',
+        'Healthcare Financing Weighted Score',
+        'Proportion of health facilities with accessible road network',
+        'Proportion of facilities with the appropriate WASH facilities ***',
+        'Proportion of facilities with the tracer list of infrastructure as per KEPH standards',
+        'Proportion of facilties with a reliable power source',
+        'PCN access to adequate ambulance services',
+        'Ambulance request Score',
+        'Health infrastructure Score',
+        'Health infrastructure Weighted Score',
+        'Proprtion of facilties with reliable internet connection',
+        'Proportion of facilities in the PCN with the key OPD reporting tools (6)',
+        'No of performance and data quality review meetings held quarterly within the PCN',
+        'Proportion of facilities with ICT infrastructure',
+        'Proportion of facilities in a PCN with an integrated functional EMR',
+        'Proportion of CHUs within the PCN reporting monthly',
+        'HMIS Score',
+        'HMIS Weighted Score',
+        'Core HRH density',
+        'Doctor to population ratio',
+        'Clinical officer to population ratio',
+        'Nurse to population ratio',
+        'CHA/CHO to population ratio',
+        'Proportion of CHPs trained on basic modules',
+        'Health care workers sensitized on PHC /PCN',
+        'Does the PCN have a mechanism to enhance health workers skills?',
+        'Proportion of health workers who have undergone a skills/ competency buliding course within the last 2 years',
+        'HRH Score',
+        'HRH Weighted Score',
+        'Number of outreaches conducted by the MDT',
+        'Number of in-reaches conducted within the PCN',
+        'Service Delivery Score',
+        'Service Delivery Weighted Score',
+        'Proportion of hospitals with functional facility quality improvement teams (QIT)',
+        'Proportion of spokes with functional facility work improvement teams (WIT)',
+        'Average availability of selected IPC items *(items defined below)',
+        'QoC Management Systems Score',
+        'Adherence to clinical guidelines for Primary health care facilities',
+        'Provider Availability (absenteeism) for Primary health care facilities',
+        'QoC PHC Core Systems Score',
+        'Proportion of facilities conducting MPDSR',
+        'Fresh Stillbirth rate per 1,000 births in health facilities',
+        'Number of maternal deaths reported in Health facilities per 100,000 live births',
+        'Proportion of maternal deaths Audited',
+        'Number of neonatal deaths per 1,000 live births',
+        'Proportion of neonatal deaths audited',
+        'TB Treatment Success Rate',
+        'QoC Outcomes Score',
+        'QoC Outcomes Weighted Score',
+        'Proportion of facilities which have conducted a client satisfaction survey',
+        'No. of MDT engagements with the community',
+        'No. of health facilities with functional GRMs',
+        'Social Accountability Score',
+        'Social Accountability Weighted Score',
+        'Proportion of multi-sectoral actions implemented',
+        'Number of inter- PCN peer to peer learning sessions held',
+        'Multisectoral Partnerships and Coordination Score',
+        'Multisectoral Partnerships and Coordination Weighted Score',
+        'Number of PHC related innovations/ best practice implemented/adapted',
+        'Innovations and Learning Score',
+        'Innovations and Learning Weighted Score',
+        'Total PCN Score (Total Weighted Score)',
+    ],
+    'drop_columns': [
+        'POPULATION HEALTH NEEDS',
+        'CAPACITY READINESS',
+        '1.HPTS',
+        '2.EQUIPMENT',
+        'HEALTH CARE FINANCING',
+        'HEALTH INFRASTRUCTURE',
+        'HMIS/ DIGITAL HEALTH',
+        'HRH',
+        'SERVICE DELIVERY',
+        'SERVICE DELIVERY PROCESSES',
+        'QUALITY OF CARE -MANAGEMENT SYSTEMS',
+        'QUALITY OF CARE -PHC CORE SYSTEMS',
+        'QUALITY OF CARE OUTCOMES',
+        'SOCIAL ACCOUNTABILITY',
+        'MULTISECTORAL PARTNERSHIPS AND COORDINATION',
+        'INNOVATIONS AND LEARNING',
+    ],
+    'aliases': {
+        'Sub County': 'Sub county',
+        'Sub-county': 'Sub county',
+        'Subcounty': 'Sub county',
+        'PCN Name': 'PCN',
+        'PCN location': 'pcn_location',
+        'Functionality of MDTs': 'Functionallity of MDTs',
+        'Proportion of facilities with reliable internet connection': 'Proprtion of facilties with reliable internet connection',
+        'Proportion of facilities with a reliable power source': 'Proportion of facilties with a reliable power source',
+        'Proportion of the target Health Facilities empanelled on SHA within the PCN': 'Proportion of the target Health Facilities empanneled on SHA within the PCN',
+        'Total PCN Score': 'Total PCN Score (Total Weighted Score)',
+    },
+}
+
+# non-breaking spaces, C0/C1 control characters and U+FFFD replacement characters
+# show up in headers exported from Excel with the wrong code page
+_HEADER_JUNK = re.compile(r'[\x00-\x1f\x7f-\x9f\ufffd]')
+
+
+def clean_header(name):
+    name = str(name).replace('\xa0', ' ').replace('\n', ' ')
+    name = _HEADER_JUNK.sub('', name)
+    return re.sub(' +', ' ', name).strip()
+
+
+def empty_drift_report():
+    return {'missing': [], 'unexpected': [], 'aliased': {}, 'coerced': {}}
+
+
+def has_drift(report):
+    return bool(report['missing'] or report['unexpected'] or report['coerced'])
+
+
+def read_with_schema(path, schema):
+    """Read a CSV in one typed pass. Returns (df, drift_report)."""
+    encoding = schema['encoding']
+    text_columns = set(schema['text_columns'])
+    numeric_columns = set(schema['numeric_columns'])
+    drop_columns = set(schema['drop_columns'])
+    report = empty_drift_report()
+
+    # header only: decide what to keep, how to type it and what to call it
+    raw_header = pd.read_csv(path, encoding=encoding, nrows=0).columns
+    usecols, dtype, rename = [], {}, {}
+    for raw in raw_header:
+        name = clean_header(raw)
+        if name in schema['aliases']:
+            report['aliased'][name] = schema['aliases'][name]
+            name = schema['aliases'][name]
+        if name in drop_columns:
+            continue
+        if name not in text_columns and name not in numeric_columns:
+            # new indicator: keep it (as a score) so it still reaches the pillar grouping, but say so
+            report['unexpected'].append(name)
+        usecols.append(raw)
+        dtype[raw] = TEXT_DTYPE if name in text_columns else SCORE_DTYPE
+        rename[raw] = name
+    found = set(rename.values())
+    report['missing'] = [
+        col for col in schema['text_columns'] + schema['numeric_columns'] if col not in found
+    ]
+
+    read_kwargs = dict(
+        encoding=encoding, usecols=usecols, na_values=NA_TOKENS, nrows=schema['nrows'],
+    )
+    try:
+        df = pd.read_csv(path, dtype=dtype, **read_kwargs)
+    except ValueError:
+        # a score column holds something that isn't a number or a known NA token:
+        # fall back to reading as text and coercing just those columns, recording what was dropped
+        df = pd.read_csv(path, dtype=TEXT_DTYPE, **read_kwargs)
+        for raw, kind in dtype.items():
+            if kind != SCORE_DTYPE:
+                continue
+            converted = pd.to_numeric(df[raw], errors='coerce')
+            bad = converted.isna() & df[raw].notna()
+            if bad.any():
+                report['coerced'][rename[raw]] = sorted(df.loc[bad, raw].unique())[:5]
+            df[raw] = converted
+
+    df = df.rename(columns=rename)
+    for col in schema['text_columns']:
+        if col in df.columns:
+            df[col] = df[col].str.strip()
+    return df, report
+
+
+def format_drift_report(report):
+    lines = []
+    if report['missing']:
+        lines.append("Missing columns: " + "; ".join(report['missing']))
+    if report['unexpected']:
+        lines.append("New columns (kept as scores): " + "; ".join(report['unexpected']))
+    for col, examples in report['coerced'].items():
+        lines.append(f"Non-numeric values blanked in '{col}': " + ", ".join(map(repr, examples)))
+    for alias, canonical in report['aliased'].items():
+        lines.append(f"Renamed '{alias}' to '{canonical}'")
+    return lines
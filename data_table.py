@@ -0,0 +1,56 @@
+"""
+Server-side filtering, sorting and paging for the PCN data table.
+
+st.dataframe ships every row and column it is given to the browser, so a national
+or multi-round selection used to be sorted in full and sent whole. Here the table
+is reduced to row positions first (search filter, then a stable sort on one
+column), and only the rows of the visible page, with only the displayed columns,
+are turned into a frame for st.dataframe.
+"""
+import math
+
+import numpy as np
+import pandas as pd
+
+PAGE_SIZES = [25, 50, 100, 250]
+
+
+def search_positions(df, text, columns):
+    # rows where any of `columns` contains text (case-insensitive); all rows when text is empty
+    if not text or not text.strip():
+        return np.arange(len(df))
+    needle = text.strip().lower()
+    hit = np.zeros(len(df), dtype=bool)
+    for col in columns:
+        if col in df.columns:
+            hit |= df[col].astype(str).str.lower().str.contains(needle, regex=False).to_numpy()
+    return np.flatnonzero(hit)
+
+
+def sort_positions(df, positions, sort_by, ascending=False):
+    # stable sort of the given row positions on one column, missing values last either way
+    if sort_by is None or sort_by not in df.columns:
+        return positions
+    values = df[sort_by].iloc[positions].reset_index(drop=True)
+    order = values.sort_values(ascending=ascending, kind='stable', na_position='last').index.to_numpy()
+    return positions[order]
+
+
+def table_positions(df, columns, search="", sort_by=None, ascending=False, search_columns=None):
+    """Positions (iloc) of the rows to show, filtered and in display order."""
+    positions = search_positions(df, search, search_columns or columns)
+    return sort_positions(df, positions, sort_by, ascending)
+
+
+def page_count(n_rows, page_size):
+    return max(1, math.ceil(n_rows / page_size))
+
+
+def page_frame(df, positions, columns, page, page_size):
+    """Only the visible page (1-based) and only `columns`; the index restarts at the page's first row number."""
+    page = min(max(1, page), page_count(len(positions), page_size))
+    start = (page - 1) * page_size
+    rows = positions[start:start + page_size]
+    out = df[columns].iloc[rows].reset_index(drop=True)
+    out.index = pd.RangeIndex(start + 1, start + 1 + len(out))
+    return out
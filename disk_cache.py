@@ -0,0 +1,361 @@
+"""
+Shared on-disk cache for the dashboard's loaders and figure builders.
+
+st.cache_data only lives inside one Streamlit process. When several workers run
+behind a load balancer each of them re-cleans the CSVs, re-reads the shapefiles
+and rebuilds the same figures. disk_cached() puts a second cache level on local
+disk underneath st.cache_data so an artifact computed by one worker is picked up
+by the others, and survives restarts.
+
+Backends are picked with PCN_CACHE_BACKEND:
+    none    (default) - no disk cache, st.cache_data behaves exactly as before
+    sqlite  - one SQLite file (WAL mode), safe for concurrent readers/writers
+    files   - one pickle per key, written to a temp file and os.replace()d in
+PCN_CACHE_DIR sets the cache folder (default .pcn_cache) and PCN_CACHE_MAX_MB the
+size bound (default 512); least recently used entries are evicted past it. The
+"last used" stamp is only refreshed when it is more than TOUCH_SECONDS old, so a
+cache hit is a plain read and concurrent sessions don't queue on the SQLite write
+lock. An entry that can't be unpickled (truncated, or written by other code) is
+a miss.
+
+Keys are built from the function's module, name and source, its arguments
+(parameters starting with "_" are skipped, same convention as st.cache_data),
+the size/mtime of any argument that is an existing file path, and the code
+version: CACHE_VERSION plus a hash of every .py module next to this one. So
+editing a CSV, a shapefile, the function itself or anything it calls into
+(pcn_data's readers, data_schema, figures, ...) invalidates the entry; bump
+CACHE_VERSION for anything else that changes what gets stored, such as a
+pandas or plotly upgrade.
+"""
+import functools
+import glob
+import hashlib
+import inspect
+import os
+import pickle
+import sqlite3
+import tempfile
+import threading
+import time
+
+import pandas as pd
+
+from metrics import record_cache
+
+BACKEND_ENV_VAR = "PCN_CACHE_BACKEND"
+DIR_ENV_VAR = "PCN_CACHE_DIR"
+MAX_MB_ENV_VAR = "PCN_CACHE_MAX_MB"
+DEFAULT_CACHE_DIR = ".pcn_cache"
+DEFAULT_MAX_MB = 512
+CACHE_VERSION = 1
+# eviction only needs a rough LRU order; refresh an entry's stamp at most this often
+TOUCH_SECONDS = 300
+CODE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_MISSING = object()
+
+
+class NullCache:
+    name = "none"
+
+    def get(self, key):
+        return _MISSING
+
+    def set(self, key, value):
+        pass
+
+    def clear(self):
+        pass
+
+    def stats(self):
+        return {"backend": self.name, "entries": 0, "bytes": 0}
+
+
+class SQLiteCache:
+    name = "sqlite"
+
+    def __init__(self, folder, max_bytes):
+        os.makedirs(folder, exist_ok=True)
+        self.path = os.path.join(folder, "artifacts.sqlite")
+        self.max_bytes = max_bytes
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS artifacts ("
+                " key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL,"
+                " created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS artifacts_accessed ON artifacts(accessed)")
+        finally:
+            conn.close()
+
+    def _connect(self):
+        # a fresh connection per call keeps this safe across the warm-up thread and script threads
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def get(self, key):
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT value, accessed FROM artifacts WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return _MISSING
+            now = time.time()
+            if now - row[1] > TOUCH_SECONDS:
+                try:
+                    conn.execute("UPDATE artifacts SET accessed = ? WHERE key = ?", (now, key))
+                except sqlite3.Error:
+                    # a busy writer just means the stamp is refreshed on a later hit
+                    pass
+        finally:
+            conn.close()
+        try:
+            return pickle.loads(row[0])
+        except Exception:
+            return _MISSING
+
+    def set(self, key, value):
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(blob) > self.max_bytes:
+            return
+        now = time.time()
+        conn = self._connect()
+        try:
+            # one transaction per write: readers in other workers see the old row or the new one, never half
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT OR REPLACE INTO artifacts (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, sqlite3.Binary(blob), len(blob), now, now),
+            )
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM artifacts").fetchone()[0]
+            if total > self.max_bytes:
+                for old_key, size in conn.execute(
+                    "SELECT key, size FROM artifacts WHERE key != ? ORDER BY accessed", (key,)
+                ).fetchall():
+                    conn.execute("DELETE FROM artifacts WHERE key = ?", (old_key,))
+                    total -= size
+                    if total <= self.max_bytes:
+                        break
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            # cache writes are best effort; a locked or full database just means a recompute later
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+        finally:
+            conn.close()
+
+    def clear(self):
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM artifacts")
+        finally:
+            conn.close()
+
+    def stats(self):
+        conn = self._connect()
+        try:
+            entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM artifacts").fetchone()
+        finally:
+            conn.close()
+        return {"backend": self.name, "entries": entries, "bytes": size}
+
+
+class FileCache:
+    name = "files"
+
+    def __init__(self, folder, max_bytes):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        os.makedirs(folder, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.folder, key + ".pkl")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as fh:
+                value = pickle.load(fh)
+                accessed = os.fstat(fh.fileno()).st_mtime
+        except Exception:
+            # missing, truncated, or pickled by code that no longer exists: recompute
+            return _MISSING
+        # mtime doubles as the "last used" stamp for eviction
+        if time.time() - accessed > TOUCH_SECONDS:
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+        return value
+
+    def set(self, key, value):
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(blob) > self.max_bytes:
+            return
+        fd, tmp_path = tempfile.mkstemp(dir=self.folder, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(blob)
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        self._evict()
+
+    def _entries(self):
+        entries = []
+        for path in glob.glob(os.path.join(self.folder, "*.pkl")):
+            try:
+                info = os.stat(path)
+            except OSError:
+                continue
+            entries.append((info.st_mtime, info.st_size, path))
+        return entries
+
+    def _evict(self):
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+
+    def clear(self):
+        for _, _, path in self._entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def stats(self):
+        entries = self._entries()
+        return {"backend": self.name, "entries": len(entries), "bytes": sum(size for _, size, _ in entries)}
+
+
+BACKENDS = {"none": NullCache, "sqlite": SQLiteCache, "files": FileCache}
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            name = os.environ.get(BACKEND_ENV_VAR, "none").lower()
+            if name not in BACKENDS:
+                raise ValueError(f"Unknown {BACKEND_ENV_VAR} '{name}'. Expected one of {sorted(BACKENDS)}.")
+            if name == "none":
+                _backend = NullCache()
+            else:
+                folder = os.environ.get(DIR_ENV_VAR, DEFAULT_CACHE_DIR)
+                max_bytes = int(float(os.environ.get(MAX_MB_ENV_VAR, DEFAULT_MAX_MB)) * 1024 * 1024)
+                _backend = BACKENDS[name](folder, max_bytes)
+        return _backend
+
+
+def set_backend(backend):
+    # used by scripts/tests that want an explicit backend instead of the env vars
+    global _backend
+    with _backend_lock:
+        _backend = backend
+
+
+def _file_fingerprint(path):
+    # a shapefile is several files; any sidecar (.dbf, .shx, ...) changing must invalidate the entry
+    stem, _ = os.path.splitext(path)
+    parts = []
+    for member in sorted(glob.glob(glob.escape(stem) + ".*")) or [path]:
+        info = os.stat(member)
+        parts.append(f"{os.path.basename(member)}:{info.st_size}:{info.st_mtime_ns}")
+    return "|".join(parts)
+
+
+def data_version(*paths):
+    # short hash of the data files' size/mtime (and sidecars); changes whenever one of them is replaced
+    h = hashlib.sha256()
+    for path in paths:
+        h.update(path.encode())
+        h.update((_file_fingerprint(path) if os.path.exists(path) else "missing").encode())
+    return h.hexdigest()[:16]
+
+
+def _update_hash(h, value):
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        h.update(pd.util.hash_pandas_object(value, index=True).values.tobytes())
+        h.update(repr(list(value.columns) if isinstance(value, pd.DataFrame) else value.name).encode())
+        h.update(repr(list(value.dtypes.astype(str)) if isinstance(value, pd.DataFrame) else str(value.dtype)).encode())
+    elif isinstance(value, str) and os.path.isfile(value):
+        h.update(value.encode())
+        h.update(_file_fingerprint(value).encode())
+    elif isinstance(value, (list, tuple)):
+        h.update(b"(")
+        for item in value:
+            _update_hash(h, item)
+            h.update(b",")
+        h.update(b")")
+    elif isinstance(value, dict):
+        h.update(b"{")
+        for k in sorted(value, key=repr):
+            _update_hash(h, k)
+            h.update(b":")
+            _update_hash(h, value[k])
+        h.update(b"}")
+    else:
+        h.update(repr(value).encode())
+
+
+@functools.lru_cache(maxsize=None)
+def code_version(folder=CODE_DIR):
+    # CACHE_VERSION + the source of every module in the dashboard's folder, read once per process
+    h = hashlib.sha256(f"v{CACHE_VERSION}".encode())
+    for path in sorted(glob.glob(os.path.join(glob.escape(folder), "*.py"))):
+        h.update(os.path.basename(path).encode())
+        with open(path, "rb") as fh:
+            h.update(hashlib.sha256(fh.read()).digest())
+    return h.hexdigest()[:16]
+
+
+def make_key(func, bound_args):
+    h = hashlib.sha256()
+    h.update(code_version().encode())
+    h.update(f"{func.__module__}.{func.__qualname__}".encode())
+    try:
+        h.update(inspect.getsource(func).encode())
+    except (OSError, TypeError):
+        pass
+    for name, value in bound_args.items():
+        if name.startswith("_"):
+            continue
+        h.update(name.encode())
+        _update_hash(h, value)
+    return h.hexdigest()
+
+
+def disk_cached(func):
+    """Second-level, cross-process cache. Stack it under @st.cache_data. None results are not stored."""
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        backend = get_backend()
+        if isinstance(backend, NullCache):
+            return func(*args, **kwargs)
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        key = make_key(func, bound.arguments)
+        value = backend.get(key)
+        record_cache(func.__name__, 'disk', value is not _MISSING)
+        if value is not _MISSING:
+            return value
+        value = func(*args, **kwargs)
+        if value is not None:
+            backend.set(key, value)
+        return value
+
+    return wrapper
@@ -0,0 +1,161 @@
+"""
+Download files (CSV, Parquet, XLSX) for the current county / PCN selection.
+
+Nothing is built on a rerun: the dashboard hands st.download_button a callable
+(export_callable) that only runs when the button is clicked. The file is then
+written to disk chunk by chunk (CSV in blocks of rows, Parquet one row group per
+chunk, XLSX through openpyxl's write-only sheet), so the whole export never sits
+in memory as a second copy of the frame. Finished files are kept under
+<PCN_CACHE_DIR>/exports, named by a hash of the selection, the format and the
+data version, so the same slice downloaded again is served straight from disk.
+
+The download itself is not streamed: Streamlit turns whatever the callable returns
+into bytes and keeps them in its in-memory media store until the session lets go
+of the button, and it has no generator or chunked-reader path. So every click holds
+one full copy of the file in server memory. PCN_EXPORT_MAX_MB (default 100) caps
+that: a selection whose frame is bigger gets a disabled button, and a finished
+file over the cap is refused rather than loaded.
+"""
+import glob
+import hashlib
+import importlib.util
+import io
+import os
+import tempfile
+
+from disk_cache import DEFAULT_CACHE_DIR, DIR_ENV_VAR
+
+CHUNK_ROWS = 5000
+EXPORT_MAX_FILES = 50
+MAX_MB_ENV_VAR = "PCN_EXPORT_MAX_MB"
+DEFAULT_MAX_MB = 100
+
+# label: (extension, mime type, module it needs)
+EXPORT_FORMATS = {
+    'CSV': ('csv', 'text/csv', None),
+    'Parquet': ('parquet', 'application/vnd.apache.parquet', 'pyarrow'),
+    'Excel': ('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'openpyxl'),
+}
+
+
+def available_formats():
+    return [label for label, (_, _, module) in EXPORT_FORMATS.items()
+            if module is None or importlib.util.find_spec(module) is not None]
+
+
+def export_dir():
+    return os.path.join(os.environ.get(DIR_ENV_VAR, DEFAULT_CACHE_DIR), "exports")
+
+
+def export_max_bytes():
+    return int(float(os.environ.get(MAX_MB_ENV_VAR, DEFAULT_MAX_MB)) * 1024 * 1024)
+
+
+def too_large(df):
+    # the frame's own size is a cheap stand-in for the file's; CSV text of float scores is about as big
+    return int(df.memory_usage(index=False, deep=True).sum()) > export_max_bytes()
+
+
+def export_key(selection, fmt, version):
+    h = hashlib.sha256(repr((sorted(selection.items()), fmt, version)).encode())
+    return h.hexdigest()[:24]
+
+
+def _chunks(df, chunk_rows):
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+
+def write_csv(df, fh, chunk_rows=CHUNK_ROWS):
+    text = io.TextIOWrapper(fh, encoding="utf-8", newline="")
+    if df.empty:
+        df.to_csv(text, index=False)
+    for i, chunk in enumerate(_chunks(df, chunk_rows)):
+        chunk.to_csv(text, index=False, header=(i == 0))
+    text.flush()
+    text.detach()
+
+
+def write_parquet(df, fh, chunk_rows=CHUNK_ROWS):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    with pq.ParquetWriter(fh, schema) as writer:
+        for chunk in _chunks(df, chunk_rows):
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+        if df.empty:
+            writer.write_table(schema.empty_table())
+
+
+def write_xlsx(df, fh, chunk_rows=CHUNK_ROWS):
+    from openpyxl import Workbook
+
+    # write-only sheets stream rows to the file instead of holding every cell
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("data")
+    ws.append([str(c) for c in df.columns])
+    for chunk in _chunks(df, chunk_rows):
+        # plain Python values; NaN and missing categories become empty cells
+        for row in chunk.astype(object).where(chunk.notna(), None).itertuples(index=False, name=None):
+            ws.append(row)
+    wb.save(fh)
+
+
+WRITERS = {'CSV': write_csv, 'Parquet': write_parquet, 'Excel': write_xlsx}
+
+
+def _evict(folder, keep):
+    # finished exports only; .tmp files belong to writes still in progress
+    files = [path for path in glob.glob(os.path.join(folder, "*.*")) if not path.endswith(".tmp")]
+    files.sort(key=os.path.getmtime, reverse=True)
+    for path in files[keep:]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def export_file(df, selection, fmt, version, folder=None):
+    """Path of the export for this selection/format/data version, writing it only if it isn't on disk yet."""
+    folder = folder or export_dir()
+    ext = EXPORT_FORMATS[fmt][0]
+    path = os.path.join(folder, f"{export_key(selection, fmt, version)}.{ext}")
+    if os.path.exists(path):
+        os.utime(path)
+        return path
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=folder, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            WRITERS[fmt](df, fh)
+        # other sessions asking for the same file see the old state or the complete file, never half
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    _evict(folder, EXPORT_MAX_FILES)
+    return path
+
+
+def export_callable(df, selection, fmt, version):
+    # for st.download_button(data=...): runs on click, returns the file's bytes (Streamlit buffers them anyway)
+    def build():
+        path = export_file(df, selection, fmt, version)
+        size, limit = os.path.getsize(path), export_max_bytes()
+        if size > limit:
+            raise ValueError(f"Export is {size / 2**20:.0f} MB, over the {limit / 2**20:.0f} MB limit ({MAX_MB_ENV_VAR})")
+        with open(path, "rb") as fh:
+            return fh.read()
+    return build
+
+
+def export_name(selection, fmt):
+    stem = "_".join(str(v) for v in selection.values() if v not in (None, "", "All"))
+    stem = "".join(ch if ch.isalnum() or ch in "-_" else "_" for ch in stem)[:100] or "export"
+    return f"{stem}.{EXPORT_FORMATS[fmt][0]}"
+
+
+def selection_frame(df, columns):
+    # the columns the view shows, in order, without duplicates
+    return df[list(dict.fromkeys(c for c in columns if c in df.columns))]
@@ -0,0 +1,313 @@
+"""
+Figure builders that avoid one-trace-per-category output and plotly.express overhead.
+
+px.bar(color='County') makes a separate trace, legend entry and JSON block for
+every county or subcounty. single_trace_bar() draws the same chart as one go.Bar
+trace with a per-bar colour array (same palette, same order as plotly express),
+so figure size and browser layout time grow with the number of bars only, not
+with bars x trace overhead. Long bar lists can be cut to the top-N and bottom-N
+with the rest folded into one grey "Others" bar.
+
+choropleth_map() builds the county / subcounty maps straight from arrays instead
+of px.choropleth_mapbox + update_traces/update_layout/add_annotation. Everything
+in the layout that doesn't depend on the data (colour axis, colorbar, title box,
+mapbox settings) is validated once per map style and zoom by map_layout_template()
+and reused. The geojson is attached after the figure is built: go.Figure()
+deep-copies every trace property it is given, and for a boundary file that copy is
+nearly all of the build time. `python bench_figures.py` compares both paths.
+On the county map a score of 0 (a county with no data) is drawn white, by putting
+white at the bottom of a colour scale that starts at 0.
+
+delta_bar() and the 'change' map scales draw round-over-round changes the same
+way, on a diverging scale centred on zero; the 'peers' scale colours the peer
+finder's selected PCN and its peers. add_outlines() draws spatial hotspots /
+coldspots as coloured borders over any of these maps.
+"""
+import functools
+
+import numpy as np
+import plotly.graph_objects as go
+from plotly.colors import get_colorscale, qualitative
+
+BAR_PALETTE = qualitative.Plotly
+OTHERS_COLOR = "#B0B0B0"
+
+
+def sort_bars(labels, values):
+    # highest first, NaN last, ties keep input order (like sort_values(ascending=False))
+    labels = np.asarray(labels, dtype=object)
+    values = np.asarray(values, dtype=np.float64)
+    order = np.argsort(np.where(np.isnan(values), np.inf, -values), kind='stable')
+    return labels[order], values[order]
+
+
+def truncate_bars(labels, values, top_n=None, bottom_n=None):
+    """Keep top_n + bottom_n bars of a sorted list; returns (labels, values, others) where
+    others is None or a dict with the count/mean/min/max of the bars that were folded."""
+    top_n, bottom_n = top_n or 0, bottom_n or 0
+    n = len(values)
+    if not (top_n or bottom_n) or n <= top_n + bottom_n + 1:
+        return labels, values, None
+    middle = values[top_n:n - bottom_n]
+    observed = middle[~np.isnan(middle)]
+    others = {
+        'count': len(middle),
+        'mean': float(observed.mean()) if len(observed) else np.nan,
+        'min': float(observed.min()) if len(observed) else np.nan,
+        'max': float(observed.max()) if len(observed) else np.nan,
+    }
+    keep = np.r_[0:top_n, n - bottom_n:n]
+    return labels[keep], values[keep], others
+
+
+def unique_labels(labels, fallback):
+    # bars share one trace, so repeated x labels would stack; fall back to a second name where they repeat
+    labels = np.asarray(labels, dtype=object)
+    fallback = np.asarray(fallback, dtype=object)
+    _, inverse, counts = np.unique(labels.astype(str), return_inverse=True, return_counts=True)
+    repeated = counts[inverse] > 1
+    return np.where(repeated, fallback, labels)
+
+
+def single_trace_bar(labels, values, title, x_title, y_title="Score (%)", top_n=None, bottom_n=None):
+    """One go.Bar trace, coloured per bar. Bars are sorted highest first."""
+    labels, values = sort_bars(labels, values)
+    labels, values, others = truncate_bars(labels, values, top_n, bottom_n)
+    colors = [BAR_PALETTE[i % len(BAR_PALETTE)] for i in range(len(labels))]
+    hovertemplate = f"{x_title}=%{{x}}<br>{y_title}=%{{y}}<extra></extra>"
+    customdata = None
+
+    if others is not None:
+        # the folded bars go between the top and bottom groups
+        split = top_n or 0
+        labels = np.insert(labels, split, f"Others ({others['count']})")
+        values = np.insert(values, split, others['mean'])
+        colors.insert(split, OTHERS_COLOR)
+        customdata = [""] * len(labels)
+        customdata[split] = (
+            f"<br>mean of {others['count']} bars, range {others['min']:.1f} - {others['max']:.1f}"
+        )
+        hovertemplate = f"{x_title}=%{{x}}<br>{y_title}=%{{y}}%{{customdata}}<extra></extra>"
+
+    fig = go.Figure(
+        data=[go.Bar(
+            x=list(labels),
+            y=values,
+            text=values,
+            texttemplate='%{text:.1f}',
+            textposition='outside',
+            marker=dict(color=colors),
+            customdata=customdata,
+            hovertemplate=hovertemplate,
+            showlegend=False,
+        )],
+    )
+    fig.update_layout(
+        title=title,
+        xaxis=dict(title=x_title, categoryorder='array', categoryarray=list(labels)),
+        yaxis=dict(title=y_title),
+    )
+    return fig
+
+
+def delta_bar(labels, values, title, x_title, y_title="Change", lower_is_better=False, top_n=None, bottom_n=None):
+    """Change between two rounds as one go.Bar trace: improvements green, declines red, best first."""
+    labels = np.asarray(labels, dtype=object)
+    values = np.asarray(values, dtype=np.float64)
+    sign = -1.0 if lower_is_better else 1.0
+    labels, improvement = sort_bars(labels, values * sign)
+    labels, improvement, others = truncate_bars(labels, improvement, top_n, bottom_n)
+    values = improvement * sign
+    colors = np.where(improvement > 0, IMPROVED_COLOR, np.where(improvement < 0, DECLINED_COLOR, OTHERS_COLOR))
+    if others is not None:
+        labels = np.insert(labels, top_n or 0, f"Others ({others['count']})")
+        values = np.insert(values, top_n or 0, others['mean'] * sign)
+        colors = np.insert(colors.astype(object), top_n or 0, OTHERS_COLOR)
+    fig = go.Figure(
+        data=[go.Bar(
+            x=list(labels),
+            y=values,
+            text=values,
+            texttemplate='%{text:+.1f}',
+            textposition='outside',
+            marker=dict(color=list(colors)),
+            hovertemplate=f"{x_title}=%{{x}}<br>{y_title}=%{{y:+.2f}}<extra></extra>",
+            showlegend=False,
+        )],
+    )
+    fig.update_layout(
+        title=title,
+        xaxis=dict(title=x_title, categoryorder='array', categoryarray=list(labels)),
+        yaxis=dict(title=y_title, zeroline=True, zerolinecolor="black"),
+    )
+    return fig
+
+
+# ---- choropleth maps ----
+MAP_COLORSCALE = "RdYlGn"
+IMPROVED_COLOR = "#1a9850"
+DECLINED_COLOR = "#d73027"
+HOTSPOT_COLOR = "#b2182b"
+COLDSPOT_COLOR = "#2166ac"
+
+# colour axis per kind of value: scores on the usual scale, round-over-round changes
+# on a diverging scale centred on 0 (reversed for lower-is-better indicators)
+MAP_SCALES = {
+    'score': dict(colorscale=MAP_COLORSCALE, title="Score (%)", tickformat=".0f"),
+    'change': dict(colorscale="RdBu", cmid=0, title="Change", tickformat="+.0f"),
+    'change_lower_better': dict(colorscale="RdBu_r", cmid=0, title="Change", tickformat="+.0f"),
+    # categories for peer highlighting: 0 other, 1 peer, 2 selected
+    'peers': dict(colorscale=[[0, "#EEEEEE"], [0.33, "#EEEEEE"], [0.33, "#FDAE61"], [0.67, "#FDAE61"],
+                              [0.67, "#2C7BB6"], [1, "#2C7BB6"]],
+                  cmin=0, cmax=2, title="Peer", tickformat="", tickvals=[0, 1, 2], ticktext=["Other", "Peer", "Selected"]),
+}
+
+# per-map styling that used to be applied with update_traces / update_layout / add_annotation
+MAP_STYLES = {
+    'county': {
+        # counties with a score of 0 (no data, filled before plotting) are drawn white, as the dashboard always did
+        'zero_color': "white",
+        'opacity': 0.8,
+        'line_width': 0.8,
+        'colorbar': dict(tickfont=dict(color="black", size=11),
+                         outlinecolor="rgba(0,0,0,0.2)", outlinewidth=1),
+        'annotation_font': dict(size=12, color="black", family="Arial Black"),
+        'mapbox': dict(bearing=0, pitch=0),
+    },
+    'subcounty': {
+        'opacity': 0.85,
+        'line_width': 0.5,
+        'colorbar': dict(tickfont=dict(color="black")),
+        'annotation_font': dict(size=11, color="black"),
+        'mapbox': {},
+    },
+}
+
+
+def feature_keys(geojson, featureidkey):
+    # featureidkey is "properties.<name>", same as plotly's
+    prop = featureidkey.split('.', 1)[1]
+    return np.array([f['properties'].get(prop) for f in geojson['features']], dtype=object)
+
+
+def align_to_features(features, keys, values, fill=0.0):
+    """(locations, z) with every geojson feature present, like a left merge of the features on keys.
+
+    Features with no row get `fill`, so their borders still render; a feature matched by
+    several rows (e.g. a subcounty with more than one PCN) appears once per row. Missing
+    values are filled too, as the dashboard always did before plotting.
+    """
+    features = np.asarray(features, dtype=object)
+    keys = np.asarray(keys, dtype=object)
+    values = np.asarray(values, dtype=np.float64)
+    valid = np.array([isinstance(k, str) for k in keys], dtype=bool)
+    keys, values = keys[valid], values[valid]
+
+    order = np.argsort(keys, kind='stable')
+    sorted_keys, sorted_values = keys[order], values[order]
+    lookup = np.array(['' if f is None else str(f) for f in features], dtype=object)
+    lo = np.searchsorted(sorted_keys, lookup, side='left')
+    hi = np.searchsorted(sorted_keys, lookup, side='right')
+    matched = np.where([f is None for f in features], 0, hi - lo)
+
+    out_counts = np.maximum(matched, 1)
+    locations = np.repeat(features, out_counts)
+    z = np.full(int(out_counts.sum()), fill, dtype=np.float64)
+    # output slot of every matched row: start of its feature's block + its position inside it
+    within = np.arange(matched.sum()) - np.repeat(np.cumsum(matched) - matched, matched)
+    slots = np.repeat(np.cumsum(out_counts) - out_counts, matched) + within
+    z[slots] = sorted_values[np.repeat(lo, matched) + within]
+    z[np.isnan(z)] = fill
+    return locations, z
+
+
+# width of the zero colour at the bottom of the scale, as a fraction of the colour range
+ZERO_BAND = 1e-6
+
+
+def zero_colorscale(colorscale, zero_color):
+    # exactly 0 (the scale's cmin) gets zero_color, everything above it the named scale
+    stops = get_colorscale(colorscale)
+    return [[0.0, zero_color], [ZERO_BAND, zero_color]] + [
+        [ZERO_BAND + (1 - ZERO_BAND) * position, color] for position, color in stops
+    ]
+
+
+@functools.lru_cache(maxsize=None)
+def map_layout_template(style, zoom, center_lat, center_lon, scale='score'):
+    """Validated layout shared by every map of one style / zoom / centre / scale. Don't mutate it."""
+    s = MAP_STYLES[style]
+    c = MAP_SCALES[scale]
+    colorscale, cmin = c['colorscale'], c.get('cmin')
+    if scale == 'score' and s.get('zero_color'):
+        # the scale starts at 0 so only zeros, not the lowest score, get the zero colour
+        colorscale, cmin = zero_colorscale(colorscale, s['zero_color']), 0
+    return go.Layout(
+        coloraxis=dict(
+            colorscale=colorscale,
+            cmid=c.get('cmid'),
+            cmin=cmin,
+            cmax=c.get('cmax'),
+            colorbar=dict(
+                title=dict(text=c['title'], font=dict(color="black", size=12)),
+                tickformat=c['tickformat'],
+                tickvals=c.get('tickvals'),
+                ticktext=c.get('ticktext'),
+                x=0.97, xanchor="right", y=0.5, yanchor="middle", len=0.6, thickness=12,
+                bgcolor="rgba(255,255,255,0.6)",
+                **s['colorbar'],
+            ),
+        ),
+        mapbox=dict(style="white-bg", zoom=zoom, center=dict(lat=center_lat, lon=center_lon), **s['mapbox']),
+        margin={"r": 0, "t": 30, "l": 0, "b": 0},
+        annotations=[dict(
+            text="", xref="paper", yref="paper", x=0.5, y=0.98, showarrow=False,
+            font=s['annotation_font'], bgcolor="rgba(255,255,255,0.7)",
+            bordercolor="black", borderwidth=1, borderpad=6,
+        )],
+    )
+
+
+def choropleth_map(geojson, featureidkey, locations, values, title, style, zoom, center, location_title,
+                   scale='score'):
+    """One go.Choroplethmapbox on the cached layout for `style` ('county' or 'subcounty') and `scale`."""
+    s = MAP_STYLES[style]
+    value_title = MAP_SCALES[scale]['title']
+    trace = go.Choroplethmapbox(
+        locations=list(locations),
+        z=np.asarray(values, dtype=np.float64),
+        featureidkey=featureidkey,
+        coloraxis='coloraxis',
+        marker=dict(opacity=s['opacity'], line=dict(width=s['line_width'], color='grey')),
+        hovertemplate=f"<b>%{{location}}</b><br><br>{location_title}=%{{location}}<br>{value_title}=%{{z}}<extra></extra>",
+    )
+    fig = go.Figure(data=[trace], layout=map_layout_template(style, zoom, center['lat'], center['lon'], scale))
+    fig.layout.annotations[0].text = title
+    # assigned afterwards so the figure keeps a reference instead of deep-copying every coordinate
+    fig.data[0].geojson = geojson
+    return fig
+
+
+def add_outlines(fig, geojson, featureidkey, keys, color, name):
+    """Outline these features on top of a choropleth: transparent fill, thick border, a legend entry."""
+    prop = featureidkey.split('.', 1)[1]
+    wanted = set(keys)
+    features = [f for f in geojson['features'] if f['properties'].get(prop) in wanted]
+    if not features:
+        return fig
+    locations = [f['properties'][prop] for f in features]
+    fig.add_trace(go.Choroplethmapbox(
+        locations=locations,
+        z=np.zeros(len(locations)),
+        featureidkey=featureidkey,
+        colorscale=[[0, "rgba(0,0,0,0)"], [1, "rgba(0,0,0,0)"]],
+        showscale=False,
+        showlegend=True,
+        name=name,
+        marker=dict(line=dict(width=3, color=color)),
+        hovertemplate=f"<b>%{{location}}</b><br>{name}<extra></extra>",
+    ))
+    # only the outlined features, not a second copy of the whole boundary file
+    fig.data[-1].geojson = {"type": "FeatureCollection", "features": features}
+    fig.update_layout(legend=dict(x=0.01, y=0.01, xanchor="left", yanchor="bottom", bgcolor="rgba(255,255,255,0.7)"))
+    return fig
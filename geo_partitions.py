@@ -0,0 +1,227 @@
+"""
+Per-county, simplified boundary files for the subcounty (ADM2) map, and ward (ADM3) files.
+
+    python geo_partitions.py [--levels adm2 adm3] [--out geometry] [--workers N]
+
+reads each level's shapefile once, splits it by county and hands every county to a
+process pool, where the features are reprojected to EPSG:4326, their names run
+through standardize_name (County_Name_Key / Subcounty_Name_Key / Ward_Name_Key),
+simplified (topology preserved, tolerance per level) and written with coordinates
+rounded to 5 decimals (about 1 m) as <out>/<level>/<county>.geojson. index.json
+in each level folder lists the county files with their feature count and bounding
+box (for wards also each subcounty's box), plus the source shapefile's data_version
+so the dashboard ignores partitions built from an older file. For ADM2 the county
+files are also merged into one simplified national file (_national.geojson, listed
+as "national" in the index) for the County = All map. A level whose shapefile
+isn't there is skipped.
+
+The dashboard then loads only the selected county's subcounties instead of
+filtering the full national ADM2 file on every draw. ADM3 is build-only for now:
+the PCN table has no ward column, so there is nothing to colour wards by and the
+dashboard doesn't draw them. The files (with each subcounty's box, since ~1,450
+wards are only drawable one subcounty at a time) are there for when the data
+gains ward-level values.
+"""
+import argparse
+import json
+import math
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from disk_cache import data_version
+from pcn_data import standardize_name
+
+PARTITION_DIR_ENV_VAR = "PCN_GEOMETRY_DIR"
+DEFAULT_PARTITION_DIR = "geometry"
+PRECISION = 5
+
+# shapefile, name columns -> keys the maps match on, simplification tolerance (degrees)
+PARTITION_LEVELS = {
+    'adm2': {
+        'shape': "ken_admbnda_adm2_iebc_20191031.shp",
+        'names': {'ADM1_EN': 'County_Name_Key', 'ADM2_EN': 'Subcounty_Name_Key'},
+        'tolerance': 0.001,
+        'national': True,
+    },
+    'adm3': {
+        'shape': "ken_admbnda_adm3_iebc_20191031.shp",
+        'names': {'ADM1_EN': 'County_Name_Key', 'ADM2_EN': 'Subcounty_Name_Key', 'ADM3_EN': 'Ward_Name_Key'},
+        'tolerance': 0.0005,
+        'national': False,
+    },
+}
+# county stems never start with "_", so this can't collide with a county's file
+NATIONAL_FILE = "_national.geojson"
+
+
+def partition_dir():
+    return os.environ.get(PARTITION_DIR_ENV_VAR, DEFAULT_PARTITION_DIR)
+
+
+def file_stem(county):
+    return "".join(ch if ch.isalnum() else "_" for ch in str(county).lower()).strip("_") or "unknown"
+
+
+def _write_partition(job):
+    # runs in a worker process: one county's features in, one geojson file out
+    import shapely
+
+    county, gdf, names, tolerance, path = job
+    if gdf.crs is not None and gdf.crs != "EPSG:4326":
+        gdf = gdf.to_crs(epsg=4326)
+    geoms = shapely.simplify(gdf.geometry.to_numpy(), tolerance, preserve_topology=True)
+    geoms = shapely.transform(geoms, lambda coords: np.round(coords, PRECISION))
+    keys = {key: [standardize_name(v) for v in gdf[col]] for col, key in names.items()}
+    features = [
+        {"type": "Feature", "id": str(i),
+         "properties": {key: values[i] for key, values in keys.items()},
+         "geometry": json.loads(shapely.to_geojson(geom))}
+        for i, geom in enumerate(geoms)
+    ]
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as fh:
+        json.dump({"type": "FeatureCollection", "features": features}, fh, separators=(',', ':'))
+    os.replace(tmp_path, path)
+    entry = {"file": os.path.basename(path), "features": len(features), "bbox": _bbox(geoms)}
+    if 'Ward_Name_Key' in keys:
+        # wards are drawn one subcounty at a time, so keep each subcounty's extent for the map view
+        subcounties = np.array(keys['Subcounty_Name_Key'], dtype=object)
+        entry["subcounties"] = {name: _bbox(geoms[subcounties == name]) for name in sorted(set(keys['Subcounty_Name_Key']))}
+    return county, entry
+
+
+def _bbox(geoms):
+    import shapely
+
+    return [round(float(v), PRECISION) for v in shapely.total_bounds(geoms)]
+
+
+def _write_national(folder, counties):
+    # the county files (already simplified and rounded) merged into one, in county order
+    features = []
+    for county in sorted(counties):
+        with open(os.path.join(folder, counties[county]["file"]), encoding="utf-8") as fh:
+            features.extend(json.load(fh)["features"])
+    for i, feature in enumerate(features):
+        feature["id"] = str(i)
+    path = os.path.join(folder, NATIONAL_FILE)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as fh:
+        json.dump({"type": "FeatureCollection", "features": features}, fh, separators=(',', ':'))
+    os.replace(f"{path}.tmp", path)
+    boxes = np.array([entry["bbox"] for entry in counties.values()], dtype=np.float64)
+    bbox = [*boxes[:, :2].min(axis=0), *boxes[:, 2:].max(axis=0)] if len(boxes) else None
+    return {"file": NATIONAL_FILE, "features": len(features), "bbox": bbox and [round(float(v), PRECISION) for v in bbox]}
+
+
+def build_level(level, out_dir, workers=None, shape=None):
+    """Write every county's file for one level plus its index.json; returns the index (None if no shapefile)."""
+    import geopandas as gpd
+
+    spec = PARTITION_LEVELS[level]
+    shape = shape or spec['shape']
+    if not os.path.exists(shape):
+        return None
+    gdf = gpd.read_file(shape)
+    missing = [col for col in spec['names'] if col not in gdf.columns]
+    if missing:
+        raise ValueError(f"{shape} is missing {', '.join(missing)}")
+
+    folder = os.path.join(out_dir, level)
+    os.makedirs(folder, exist_ok=True)
+    county_names = gdf['ADM1_EN'].map(standardize_name)
+    jobs = [
+        (county, part[list(spec['names']) + ['geometry']], spec['names'], spec['tolerance'],
+         os.path.join(folder, f"{file_stem(county)}.geojson"))
+        for county, part in gdf.groupby(county_names, sort=True)
+    ]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        counties = dict(pool.map(_write_partition, jobs))
+
+    index = {"source": data_version(shape), "tolerance": spec['tolerance'], "counties": counties}
+    if spec['national']:
+        index["national"] = _write_national(folder, counties)
+    with open(os.path.join(folder, "index.json"), "w", encoding="utf-8") as fh:
+        json.dump(index, fh, indent=1)
+    return index
+
+
+def partition_index(level, out_dir=None, shape=None):
+    """The level's index, or None when it wasn't built or its shapefile has changed since."""
+    path = os.path.join(out_dir or partition_dir(), level, "index.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as fh:
+        index = json.load(fh)
+    shape = shape or PARTITION_LEVELS[level]['shape']
+    if os.path.exists(shape) and index.get("source") != data_version(shape):
+        return None
+    return index
+
+
+def load_partition(index, level, county, out_dir=None):
+    """geojson of one county's features at this level, or None if the county has no file."""
+    entry = index["counties"].get(county) if index else None
+    if entry is None:
+        return None
+    with open(os.path.join(out_dir or partition_dir(), level, entry["file"]), encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+def load_national(index, level, out_dir=None):
+    """geojson of the whole country at this level, simplified, or None if the level has no national file."""
+    entry = index.get("national") if index else None
+    if entry is None:
+        return None
+    with open(os.path.join(out_dir or partition_dir(), level, entry["file"]), encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+def features_bbox(features):
+    """[minx, miny, maxx, maxy] of a list of geojson features, or None when they have no coordinates."""
+    coords = []
+
+    def collect(part):
+        if part and isinstance(part[0], (int, float)):
+            coords.append(part[:2])
+        else:
+            for sub in part:
+                collect(sub)
+
+    for feature in features:
+        collect((feature.get('geometry') or {}).get('coordinates') or [])
+    if not coords:
+        return None
+    xy = np.asarray(coords, dtype=np.float64)
+    return [float(v) for v in (*xy.min(axis=0), *xy.max(axis=0))]
+
+
+def bbox_view(bbox, min_zoom=4.5, max_zoom=11.0):
+    """(center, zoom) that fits a [minx, miny, maxx, maxy] box in a dashboard-sized map."""
+    minx, miny, maxx, maxy = bbox
+    span = max(maxx - minx, maxy - miny, 1e-3)
+    zoom = min(max_zoom, max(min_zoom, math.log2(400 / span) - 0.3))
+    return {"lat": round((miny + maxy) / 2, PRECISION), "lon": round((minx + maxx) / 2, PRECISION)}, round(zoom, 2)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--levels", nargs="+", default=list(PARTITION_LEVELS), choices=list(PARTITION_LEVELS))
+    parser.add_argument("--out", default=partition_dir(), help="output folder (default: geometry)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per CPU)")
+    args = parser.parse_args(argv[1:])
+
+    for level in args.levels:
+        index = build_level(level, args.out, args.workers)
+        if index is None:
+            print(f"{level}: {PARTITION_LEVELS[level]['shape']} not found, skipped")
+            continue
+        features = sum(entry["features"] for entry in index["counties"].values())
+        national = " plus a national file" if "national" in index else ""
+        print(f"{level}: {features} features in {len(index['counties'])} county files{national}")
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,123 @@
+"""
+County -> Subcounty -> PCN index over the PCN table.
+
+Built once from the loaded frame: every node of the hierarchy maps to the sorted
+names of its children and to the integer row positions (iloc) under it. The
+filter row then gets its options and its rows with dictionary lookups instead of
+a boolean mask plus sorted(unique()) over the whole frame on every rerun.
+"All" at any level means "everything under the level above"; a national view has
+no subcounty or PCN options of its own, since those names only mean something
+inside a county.
+"""
+import numpy as np
+import pandas as pd
+
+ALL = "All"
+LEVELS = ['County', 'Sub county', 'PCN']
+
+
+class PCNHierarchy:
+    def __init__(self, df, levels=LEVELS):
+        self.levels = [col for col in levels if col in df.columns]
+        names = pd.DataFrame({col: df[col].astype(object).where(df[col].notna()) for col in self.levels})
+        # (): every row, (county,): the county's rows, (county, subcounty), (county, subcounty, pcn)
+        self.rows = {(): np.arange(len(df), dtype=np.int64)}
+        self.children = {}
+        for depth in range(1, len(self.levels) + 1):
+            groups = names.groupby(self.levels[:depth], sort=True, dropna=True).indices
+            for key, positions in groups.items():
+                key = key if isinstance(key, tuple) else (key,)
+                key = tuple(str(k) for k in key)
+                self.rows[key] = np.asarray(positions, dtype=np.int64)
+                self.children.setdefault(key[:-1], []).append(key[-1])
+        for key in self.children:
+            self.children[key] = sorted(set(self.children[key]))
+
+        # PCNs straight under a county (subcounty "All"), so that drill-down is a lookup too
+        self.county_pcn_rows = {}
+        self.county_pcns = {}
+        if 'PCN' in self.levels:
+            groups = names.groupby(['County', 'PCN'], sort=True, dropna=True).indices
+            for (county, pcn), positions in groups.items():
+                self.county_pcn_rows[(str(county), str(pcn))] = np.asarray(positions, dtype=np.int64)
+                self.county_pcns.setdefault(str(county), []).append(str(pcn))
+
+    def _node(self, county=ALL, subcounty=ALL, pcn=ALL):
+        # the deepest key the selection pins down; "All" stops the descent
+        key = ()
+        for value in (county, subcounty, pcn)[:len(self.levels)]:
+            if value is None or value == ALL:
+                break
+            key = key + (str(value),)
+        return key
+
+    def counties(self):
+        return self.children.get((), [])
+
+    def subcounties(self, county):
+        if county == ALL:
+            return []
+        return self.children.get((str(county),), [])
+
+    def pcns(self, county, subcounty=ALL):
+        # PCNs of the subcounty, or of the whole county when the subcounty is "All"
+        if county == ALL:
+            return []
+        if subcounty == ALL:
+            return self.county_pcns.get(str(county), [])
+        return self.children.get((str(county), str(subcounty)), [])
+
+    def valid(self, county=ALL, subcounty=ALL, pcn=ALL):
+        """The selection with every level that isn't an option under the level above reset to "All"."""
+        county = county if county in self.counties() else ALL
+        subcounty = subcounty if subcounty in self.subcounties(county) else ALL
+        pcn = pcn if pcn in self.pcns(county, subcounty) else ALL
+        return county, subcounty, pcn
+
+    def paths(self):
+        # every (county, subcounty, pcn) selection in tree order: national, then each county and what's under it
+        out = [(ALL, ALL, ALL)]
+        for county in self.counties():
+            out.append((county, ALL, ALL))
+            for subcounty in self.subcounties(county):
+                out.append((county, subcounty, ALL))
+                out.extend((county, subcounty, pcn) for pcn in self.pcns(county, subcounty))
+        return out
+
+    def positions(self, county=ALL, subcounty=ALL, pcn=ALL):
+        """Row positions for the selection; an unknown name gives no rows."""
+        if county != ALL and subcounty == ALL and pcn != ALL:
+            # PCN picked straight under a county, whichever subcounty it sits in
+            return self.county_pcn_rows.get((str(county), str(pcn)), np.empty(0, dtype=np.int64))
+        return self.rows.get(self._node(county, subcounty, pcn), np.empty(0, dtype=np.int64))
+
+    def to_arrays(self):
+        """(nodes, positions): every node's key and [start, stop) into one int64 positions array."""
+        nodes, parts, start = [], [], 0
+        for kind, table in (('node', self.rows), ('county_pcn', self.county_pcn_rows)):
+            for key, rows in table.items():
+                nodes.append([kind, list(key), start, start + len(rows)])
+                parts.append(rows)
+                start += len(rows)
+        positions = np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+        return nodes, positions.astype(np.int64)
+
+    @classmethod
+    def from_arrays(cls, levels, nodes, positions):
+        # rebuilds the index around slices of `positions` (no copies, so a memory-mapped array stays mapped)
+        self = cls.__new__(cls)
+        self.levels = list(levels)
+        self.rows, self.children, self.county_pcn_rows, self.county_pcns = {}, {}, {}, {}
+        for kind, key, start, stop in nodes:
+            key = tuple(key)
+            if kind == 'node':
+                self.rows[key] = positions[start:stop]
+                if key:
+                    self.children.setdefault(key[:-1], []).append(key[-1])
+            else:
+                self.county_pcn_rows[key] = positions[start:stop]
+                self.county_pcns.setdefault(key[0], []).append(key[1])
+        for table in (self.children, self.county_pcns):
+            for key in table:
+                table[key] = sorted(set(table[key]))
+        return self
@@ -0,0 +1,204 @@
+"""
+Every PCN against every indicator of a pillar, as one heatmap.
+
+IndicatorMatrix holds the cleaned numeric indicators of the PCN table as one
+(PCNs x indicators) float matrix. Cells are coloured by the raw value or by each
+indicator's percentile among the PCNs that report it (reversed for the
+LOWER_IS_BETTER indicators, so high is always good), which puts indicators with
+different ranges on one scale. Rows are grouped by county or not, and ordered by
+name, by mean percentile or by similarity of profile: average-linkage clustering
+on a NaN-aware distance (mean squared difference over the indicators both rows
+report), in numpy.
+
+A heatmap costs the browser per cell, so a matrix bigger than max_rows x max_cols
+is aggregated here before it is sent: runs of consecutive rows (never across a
+county boundary while there are enough rows for that) and of consecutive columns
+are averaged into one cell each, NaN-aware, and every cell carries how many PCNs /
+indicators it stands for.
+"""
+import math
+
+import numpy as np
+import pandas as pd
+
+from rounds import lower_is_better
+
+KEY_COLUMNS = ('County', 'Sub county', 'PCN')
+CLUSTER_MAX_ROWS = 500
+SCALES = ('Percentile within indicator', 'Raw value')
+# label -> (group rows by county, row order)
+ROW_ORDERS = {
+    'County, then name': (True, 'name'),
+    'County, then mean percentile': (True, 'mean'),
+    'County, then similar profiles': (True, 'cluster'),
+    'All PCNs by mean percentile': (False, 'mean'),
+    'All PCNs by similar profiles': (False, 'cluster'),
+}
+
+
+def percentile_scores(X, flip):
+    """Per column: percentile (0-100] of each value among the column's observed values, NaN stays NaN."""
+    X = np.where(flip, -X, X)
+    return pd.DataFrame(X).rank(method='average', pct=True).to_numpy() * 100.0
+
+
+def nan_sq_distances(X, Y=None):
+    # mean squared difference between rows of X and rows of Y (default X) over the columns both report;
+    # NaN where two rows share none. Also returns the shared-column counts.
+    Y = X if Y is None else Y
+    px, py = ~np.isnan(X), ~np.isnan(Y)
+    Px, Py = px.astype(np.float64), py.astype(np.float64)
+    Zx, Zy = np.where(px, X, 0.0), np.where(py, Y, 0.0)
+    shared = Px @ Py.T
+    sq = (Zx * Zx) @ Py.T + Px @ (Zy * Zy).T - 2.0 * (Zx @ Zy.T)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(shared > 0, np.maximum(sq, 0.0) / shared, np.nan), shared
+
+
+def cluster_order(X, max_rows=None):
+    """Leaf order of an average-linkage clustering of the rows of X (rows with no data go last).
+
+    The clustering is cubic in the number of rows, so past max_rows (CLUSTER_MAX_ROWS) rows
+    are first sorted by their mean and cut into max_rows runs; the runs' mean profiles are
+    clustered and every run keeps its rows together.
+    """
+    n = X.shape[0]
+    if n <= 2:
+        return np.arange(n)
+    max_rows = max_rows or CLUSTER_MAX_ROWS
+    if n > max_rows:
+        present = ~np.isnan(X)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = np.where(present, X, 0.0).sum(axis=1) / present.sum(axis=1)
+        by_mean = np.argsort(np.where(np.isnan(means), np.inf, means), kind='stable')
+        starts = bin_starts(n, max_rows)
+        runs = np.split(by_mean, starts[1:])
+        centroids = bin_means(X[by_mean], starts, axis=0)
+        return np.concatenate([runs[i] for i in cluster_order(centroids, max_rows)])
+    D, _ = nan_sq_distances(X)
+    # pairs with nothing in common count as far apart as anything observed
+    fill = np.nanmax(D) if np.isfinite(D).any() else 0.0
+    D = np.where(np.isnan(D), fill, D)
+    np.fill_diagonal(D, np.inf)
+    sizes = np.ones(n)
+    leaves = [[i] for i in range(n)]
+    active = np.ones(n, dtype=bool)
+    for _ in range(n - 1):
+        i, j = divmod(int(np.argmin(D)), n)
+        if i > j:
+            i, j = j, i
+        # Lance-Williams update for average linkage: cluster i absorbs j
+        merged = (sizes[i] * D[i] + sizes[j] * D[j]) / (sizes[i] + sizes[j])
+        D[i, :], D[:, i] = merged, merged
+        D[i, i] = np.inf
+        D[j, :], D[:, j] = np.inf, np.inf
+        sizes[i] += sizes[j]
+        leaves[i] = leaves[i] + leaves[j]
+        active[j] = False
+    order = np.array(leaves[int(np.flatnonzero(active)[0])])
+    empty = np.isnan(X).all(axis=1)
+    return np.concatenate([order[~empty[order]], order[empty[order]]])
+
+
+def bin_starts(n, max_bins, group_starts=None):
+    """Start positions of at most max_bins runs covering 0..n-1; runs don't cross group_starts when possible."""
+    if n <= max_bins:
+        return np.arange(n)
+    size = math.ceil(n / max_bins)
+    if group_starts is not None and len(group_starts) <= max_bins:
+        bounds = np.append(group_starts, n)
+        lengths = np.diff(bounds)
+        while np.ceil(lengths / size).sum() > max_bins:
+            size += 1
+        return np.concatenate([np.arange(start, stop, size) for start, stop in zip(bounds[:-1], bounds[1:])])
+    return np.arange(0, n, size)
+
+
+def bin_means(X, starts, axis):
+    # NaN-aware mean of each run of rows (axis 0) or columns (axis 1)
+    present = ~np.isnan(X)
+    sums = np.add.reduceat(np.where(present, X, 0.0), starts, axis=axis)
+    counts = np.add.reduceat(present.astype(np.float64), starts, axis=axis)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(counts > 0, sums / counts, np.nan)
+
+
+class IndicatorMatrix:
+    """The PCN table's indicators as one matrix, ready to be ordered and binned for a heatmap."""
+
+    def __init__(self, df, indicators):
+        self.indicators = [c for c in indicators if c in df.columns and pd.api.types.is_numeric_dtype(df[c])]
+        key_columns = [c for c in KEY_COLUMNS if c in df.columns]
+        self.names = df[key_columns].astype(object).fillna("Unknown").astype(str).reset_index(drop=True)
+        self.values = df[self.indicators].to_numpy(dtype=np.float64, na_value=np.nan)
+        self.flip = np.array([lower_is_better(c) for c in self.indicators], dtype=bool)
+        self.percentiles = percentile_scores(self.values, self.flip)
+        self._orders = {}
+
+    def matrix(self, scale):
+        return self.percentiles if scale == SCALES[0] else self.values
+
+    def row_order(self, order):
+        """Row positions in display order for one of ROW_ORDERS."""
+        if order not in self._orders:
+            grouped, how = ROW_ORDERS[order]
+            # ordering always works on percentiles, so wide-range indicators don't dominate
+            X = self.percentiles
+            counties = self.names['County'].to_numpy() if 'County' in self.names else np.full(len(X), "")
+            with np.errstate(invalid='ignore'):
+                means = np.nanmean(np.where(np.isnan(X).all(axis=1)[:, None], 0.0, X), axis=1)
+            label = self.names.iloc[:, -1].to_numpy() if len(self.names.columns) else np.arange(len(X)).astype(str)
+
+            def arrange(rows):
+                if how == 'name':
+                    return rows[np.argsort(label[rows], kind='stable')]
+                if how == 'mean':
+                    return rows[np.argsort(-means[rows], kind='stable')]
+                return rows[cluster_order(X[rows])]
+
+            if grouped:
+                self._orders[order] = np.concatenate(
+                    [arrange(np.flatnonzero(counties == county)) for county in sorted(set(counties))]
+                ) if len(X) else np.arange(0)
+            else:
+                self._orders[order] = arrange(np.arange(len(X)))
+        return self._orders[order]
+
+    def heatmap(self, scale, order, max_rows, max_cols):
+        """Cells to draw, at most max_rows x max_cols, with labels and the row / column count behind each cell."""
+        grouped, _ = ROW_ORDERS[order]
+        rows = self.row_order(order)
+        X = self.matrix(scale)[rows]
+        names = self.names.iloc[rows].reset_index(drop=True)
+        counties = names['County'].to_numpy() if 'County' in names else np.full(len(rows), "")
+        group_starts = np.flatnonzero(np.r_[True, counties[1:] != counties[:-1]]) if grouped and len(rows) else None
+
+        row_starts = bin_starts(len(rows), max_rows, group_starts)
+        col_starts = bin_starts(len(self.indicators), max_cols)
+        z = bin_means(bin_means(X, row_starts, axis=0), col_starts, axis=1) if X.size else X
+        row_stops = np.append(row_starts[1:], len(rows))
+        col_stops = np.append(col_starts[1:], len(self.indicators))
+
+        pcn_label = names.iloc[:, -1].to_numpy() if len(names.columns) else np.arange(len(rows)).astype(str)
+        row_labels = [
+            f"{counties[a]}: {pcn_label[a]}" if b - a == 1 else f"{counties[a]}: {pcn_label[a]} ... {pcn_label[b - 1]}"
+            for a, b in zip(row_starts, row_stops)
+        ]
+        col_labels = [
+            self.indicators[a] if b - a == 1 else f"{self.indicators[a]} ... {self.indicators[b - 1]}"
+            for a, b in zip(col_starts, col_stops)
+        ]
+        # county separators / tick positions in binned rows
+        row_counties = counties[row_starts] if len(row_starts) else counties[:0]
+        county_starts = np.flatnonzero(np.r_[True, row_counties[1:] != row_counties[:-1]]) if grouped and len(row_starts) else np.arange(0)
+        return {
+            'z': z,
+            'row_labels': row_labels,
+            'col_labels': col_labels,
+            'row_counts': row_stops - row_starts,
+            'col_counts': col_stops - col_starts,
+            'county_starts': county_starts,
+            'county_names': [str(c) for c in row_counties[county_starts]],
+            'binned': len(row_starts) < len(rows) or len(col_starts) < len(self.indicators),
+            'shape': (len(rows), len(self.indicators)),
+        }
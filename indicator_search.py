@@ -0,0 +1,126 @@
+"""
+Search box over every county and PCN indicator.
+
+The catalog is every (level, pillar, indicator) the pillar pickers can show, using
+the same keyword rule as group_columns_by_pillar. IndicatorIndex is built once
+from it:
+    - an inverted index from each lower-cased word of an indicator name to the
+      catalog entries containing it
+    - a character-trigram index over that vocabulary, so a query word only gets
+      compared against the few words that share trigrams with it
+A query word matches a vocabulary word exactly, as a prefix (while typing), or
+within a small edit distance (1 for short words, 2 from 7 letters), which covers
+the misspellings in the headers themselves ("Perfomance", "refferal",
+"Proprtion", "facilties") as well as the user's. Every query word has to match;
+results are ranked by how exactly they matched. Word expansions are memoised, so
+a repeated or extended query is a handful of set intersections.
+"""
+import functools
+import re
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+# weight of each kind of word match
+EXACT, PREFIX, FUZZY = 1.0, 0.8, 0.6
+
+
+def words(text):
+    return _WORD.findall(str(text).lower())
+
+
+def trigrams(word):
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def max_typos(word):
+    if len(word) < 4:
+        return 0
+    return 1 if len(word) < 7 else 2
+
+
+def edit_distance(a, b, limit):
+    """Optimal string alignment distance (adjacent swaps count as one), or limit + 1 once it is exceeded."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev2, prev = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        if min(cur) > limit:
+            return limit + 1
+        prev2, prev = prev, cur
+    return prev[-1]
+
+
+def catalog_entries(level, columns, pillar_keywords, skip=('County', 'Sub county', 'PCN')):
+    # (level, pillar, indicator) for every column a pillar picker lists
+    entries = []
+    for pillar, keywords in pillar_keywords.items():
+        lowered = [kw.lower() for kw in keywords]
+        for col in columns:
+            if col not in skip and any(kw in col.lower() for kw in lowered):
+                entries.append((level, pillar, col))
+    return entries
+
+
+class IndicatorIndex:
+    def __init__(self, entries):
+        self.entries = list(entries)
+        self.postings = {}
+        for i, (_, _, indicator) in enumerate(self.entries):
+            for word in set(words(indicator)):
+                self.postings.setdefault(word, set()).add(i)
+        self.by_trigram = {}
+        for word in self.postings:
+            for gram in trigrams(word):
+                self.by_trigram.setdefault(gram, set()).add(word)
+        self._expand = functools.lru_cache(maxsize=4096)(self._expand_word)
+
+    def _expand_word(self, word):
+        # {entry: best weight} for every catalog entry this query word matches
+        matches = {}
+
+        def add(vocab_word, weight):
+            for i in self.postings[vocab_word]:
+                if matches.get(i, 0) < weight:
+                    matches[i] = weight
+
+        if word in self.postings:
+            add(word, EXACT)
+        limit = max_typos(word)
+        grams = trigrams(word)
+        candidates = set()
+        for gram in grams:
+            candidates |= self.by_trigram.get(gram, set())
+        for vocab_word in candidates:
+            if vocab_word == word:
+                continue
+            if len(word) >= 2 and vocab_word.startswith(word):
+                add(vocab_word, PREFIX)
+            elif limit and edit_distance(word, vocab_word, limit) <= limit:
+                add(vocab_word, FUZZY)
+        return matches
+
+    def search(self, query, limit=10, level=None):
+        """[(level, pillar, indicator, score)], best first; every word of the query has to match."""
+        query_words = list(dict.fromkeys(words(query)))
+        if not query_words:
+            return []
+        scores = None
+        for word in query_words:
+            matches = self._expand(word)
+            if scores is None:
+                scores = dict(matches)
+            else:
+                scores = {i: s + matches[i] for i, s in scores.items() if i in matches}
+            if not scores:
+                return []
+        hits = [(i, s) for i, s in scores.items() if level is None or self.entries[i][0] == level]
+        # best match first, then the shorter (more specific) name
+        hits.sort(key=lambda hit: (-hit[1], len(self.entries[hit[0]][2]), hit[0]))
+        return [self.entries[i] + (round(s / len(query_words), 2),) for i, s in hits[:limit]]
@@ -0,0 +1,334 @@
+"""
+Concurrent-session load test for a dashboard version.
+
+    python load_test.py [app.py] [--sessions 1 5 10] [--clicks 8] [--think 0.5] [--json out.json]
+    python load_test.py --url http://host:8501 [--pid PID] ...
+
+Starts `streamlit run app.py` headless on a free port (or uses the server at --url)
+and, for every concurrency level, connects N sessions at once over the same
+websocket the browser uses. Each session does a first load, then --clicks
+interactions drawn from CLICK_PATHS (county pillar / indicator, PCN county ->
+subcounty drill-down, PCN pillar / indicator, back to national), with a random
+think time of up to --think seconds between clicks. A click sends the widget's new
+value like the front end does and is timed until the server reports the rerun
+finished, so the numbers include serialising and sending every element, and show
+how reruns queue up behind each other in one worker as N grows.
+
+Reported per level: interactions per second, latency percentiles (first loads and
+clicks separately, and per action), bytes received per interaction, errors
+(exceptions shown on the page or failed connections), and the server's resident
+memory: the RSS after one warm-up session is the baseline, and the growth to the
+end of the level, with all N sessions still connected, divided by N is the memory
+each extra session costs. Memory needs the server's pid, so it is only reported
+for a server started here or given with --pid (Linux /proc).
+
+Sessions are asyncio tasks on one client thread; the client only parses
+protobufs, so it is not the bottleneck. AppTest can't be used for this: it sets up
+a fresh runtime per run and two can't run at the same time. --seed makes the
+click paths repeatable.
+
+Needs the `websockets` package (pip install websockets), a test-only dependency
+that the dashboard itself doesn't use, so it isn't in requirements.txt.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+import numpy as np
+
+# click paths a user actually takes; each step picks a random option of its widget
+CLICK_PATHS = {
+    "county pillar": [
+        {"name": "county pillar", "match": ["county_pillar", "county_pillar_select", "1. Select Pillar:"]},
+        {"name": "county indicator", "match": ["county_indicator", "county_indicator_select", "2. Select Indicator/Metric:"]},
+    ],
+    "county indicator": [
+        {"name": "county indicator", "match": ["county_indicator", "county_indicator_select", "2. Select Indicator/Metric:"]},
+    ],
+    "pcn drill-down": [
+        {"name": "pcn county", "match": ["County (PCN data)", "pcn_county_select"]},
+        {"name": "pcn subcounty", "match": ["Subcounty", "pcn_subcounty_select"]},
+    ],
+    "pcn indicator": [
+        {"name": "pcn pillar", "match": ["pcn_pillar", "pcn_pillar_select"]},
+        {"name": "pcn indicator", "match": ["pcn_indicator", "pcn_indicator_select"]},
+    ],
+    "pcn national": [
+        {"name": "pcn national", "match": ["County (PCN data)", "pcn_county_select"], "value": "All"},
+    ],
+}
+PERCENTILES = (50, 90, 95, 99)
+
+
+def rss_mb(pid):
+    # resident set size of the server process, None when it can't be read
+    if pid is None:
+        return None
+    try:
+        with open(f"/proc/{pid}/statm") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(app_path, port, timeout):
+    """`streamlit run` headless on this port; returns the process once /_stcore/health answers."""
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", app_path, "--server.headless", "true",
+         "--server.port", str(port), "--server.address", "127.0.0.1",
+         "--browser.gatherUsageStats", "false", "--server.fileWatcherType", "none"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"streamlit exited with code {proc.returncode}")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=2) as r:
+                if r.status == 200:
+                    return proc
+        except OSError:
+            time.sleep(0.25)
+    proc.terminate()
+    raise RuntimeError(f"streamlit didn't come up on port {port} within {timeout:.0f} s")
+
+
+class Session:
+    """One simulated user on its own websocket: a first load, then `clicks` interactions."""
+
+    def __init__(self, url, clicks, think, seed, timeout):
+        self.url = url.rstrip("/").replace("http", "ws", 1) + "/_stcore/stream"
+        self.clicks = clicks
+        self.think = think
+        self.timeout = timeout
+        self.rng = random.Random(seed)
+        self.widgets = {}   # key or label -> selectbox element of the last rerun
+        self.states = {}    # widget id -> WidgetState sent with every rerun, like the front end
+        self.messages = {}  # hash -> ForwardMsg, for messages the server sends by reference
+        self.timings = []   # (kind, action, seconds, bytes)
+        self.errors = []
+        self.ws = None
+
+    async def _rerun(self, kind, action):
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+
+        msg = BackMsg()
+        msg.rerun_script.query_string = ""
+        msg.rerun_script.page_script_hash = ""
+        msg.rerun_script.widget_states.widgets.extend(self.states.values())
+        start = time.perf_counter()
+        received = 0
+        widgets = {}
+        await self.ws.send(msg.SerializeToString())
+        while True:
+            data = await asyncio.wait_for(self.ws.recv(), self.timeout)
+            received += len(data)
+            fwd = self._parse(data)
+            kind_of = fwd.WhichOneof("type")
+            if kind_of == "delta" and fwd.delta.WhichOneof("type") == "new_element":
+                element = fwd.delta.new_element
+                if element.WhichOneof("type") == "selectbox":
+                    box = element.selectbox
+                    # ids end in "-<key>" for keyed widgets, so keys and labels both match
+                    widgets.setdefault(box.id.rsplit("-", 1)[-1], box)
+                    widgets.setdefault(box.label, box)
+                elif element.WhichOneof("type") == "exception":
+                    self.errors.append(f"{action}: {element.exception.message[:160]}")
+            elif kind_of == "script_finished":
+                break
+        self.timings.append((kind, action, time.perf_counter() - start, received))
+        self.widgets = widgets
+        # widgets that are gone this run are dropped, as the front end does
+        live = {box.id for box in widgets.values()}
+        self.states = {wid: state for wid, state in self.states.items() if wid in live}
+
+    def _parse(self, data):
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        fwd = ForwardMsg()
+        fwd.ParseFromString(data)
+        if fwd.WhichOneof("type") == "ref_hash":
+            fwd = self.messages.get(fwd.ref_hash, fwd)
+        elif fwd.hash:
+            self.messages[fwd.hash] = fwd
+        return fwd
+
+    def _choose(self, step):
+        # (widget id, value) for a step, or None when this version has no such widget
+        box = next((self.widgets[m] for m in step["match"] if m in self.widgets), None)
+        if box is None or not box.options:
+            return None
+        options = list(box.options)
+        if step.get("value") in options:
+            return box.id, step["value"]
+        current = self.states[box.id].string_value if box.id in self.states else None
+        choices = [o for o in options if o != current] or options
+        return box.id, self.rng.choice(choices)
+
+    async def walk(self):
+        from websockets.asyncio.client import connect
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+        try:
+            self.ws = await connect(self.url, subprotocols=["streamlit"], max_size=None, open_timeout=self.timeout)
+            await self._rerun("load", "first load")
+            done, misses = 0, 0
+            while done < self.clicks and misses < 20:
+                path = self.rng.choice(list(CLICK_PATHS))
+                for step in CLICK_PATHS[path]:
+                    if done >= self.clicks:
+                        break
+                    choice = self._choose(step)
+                    if choice is None:
+                        # this app version has no such widget (or the path doesn't apply here)
+                        misses += 1
+                        continue
+                    await asyncio.sleep(self.rng.uniform(0, self.think))
+                    widget_id, value = choice
+                    self.states[widget_id] = WidgetState(id=widget_id, string_value=value)
+                    await self._rerun("click", step["name"])
+                    done += 1
+        except Exception as e:
+            self.errors.append(f"{e!r}"[:200])
+
+    async def close(self):
+        if self.ws is not None:
+            await self.ws.close()
+
+
+def percentiles(values):
+    if not values:
+        return {f"p{p}": None for p in PERCENTILES}
+    return {f"p{p}": float(np.percentile(values, p)) for p in PERCENTILES}
+
+
+async def run_level(url, pid, n, clicks, think, seed, timeout):
+    sessions = [Session(url, clicks, think, seed * 1000 + i, timeout) for i in range(n)]
+    start = time.perf_counter()
+    await asyncio.gather(*(s.walk() for s in sessions))
+    wall = time.perf_counter() - start
+    # read before disconnecting, so the reading includes all N sessions
+    memory = rss_mb(pid)
+    await asyncio.gather(*(s.close() for s in sessions), return_exceptions=True)
+
+    timings = [t for s in sessions for t in s.timings]
+    loads = [sec for kind, _, sec, _ in timings if kind == "load"]
+    click_times = [sec for kind, _, sec, _ in timings if kind == "click"]
+    by_action = {}
+    for _, action, sec, _ in timings:
+        by_action.setdefault(action, []).append(sec)
+    return {
+        "sessions": n,
+        "wall_s": wall,
+        "interactions": len(timings),
+        "throughput_per_s": len(timings) / wall if wall else 0.0,
+        "first_load": percentiles(loads),
+        "clicks": percentiles(click_times),
+        "by_action": {action: dict(count=len(v), **percentiles(v)) for action, v in sorted(by_action.items())},
+        "kb_per_interaction": float(np.mean([b for *_, b in timings])) / 1e3 if timings else None,
+        "errors": [e for s in sessions for e in s.errors],
+        "rss_mb": memory,
+    }
+
+
+def format_report(target, baseline, results):
+    def ms(value):
+        return f"{value * 1000:7.0f}" if value is not None else f"{'-':>7}"
+
+    def mb(value):
+        return f"{value:7.0f}" if value is not None else f"{'-':>7}"
+
+    lines = [f"target: {target}",
+             f"baseline server RSS after warm-up: {baseline:.0f} MB" if baseline is not None
+             else "server RSS: not available (pass --pid for a server started elsewhere)", "",
+             f"{'N':>3} {'ints':>5} {'int/s':>6}  {'load p50':>8} {'load p95':>8}  "
+             f"{'click p50':>9} {'p90':>7} {'p95':>7} {'p99':>7}  {'KB/int':>7} {'RSS MB':>7} {'MB/sess':>7} {'errors':>6}"]
+    for r in results:
+        per_session = (r["rss_mb"] - baseline) / r["sessions"] if baseline is not None and r["rss_mb"] is not None else None
+        lines.append(
+            f"{r['sessions']:>3} {r['interactions']:>5} {r['throughput_per_s']:6.2f}  "
+            f"{ms(r['first_load']['p50']):>8} {ms(r['first_load']['p95']):>8}  "
+            f"{ms(r['clicks']['p50']):>9} {ms(r['clicks']['p90'])} {ms(r['clicks']['p95'])} {ms(r['clicks']['p99'])}  "
+            f"{mb(r['kb_per_interaction'])} {mb(r['rss_mb'])} "
+            f"{f'{per_session:7.1f}' if per_session is not None else f'{chr(45):>7}'} {len(r['errors']):>6}"
+        )
+    lines += ["", "latency by action at the highest level (ms)"]
+    for action, stats in results[-1]["by_action"].items():
+        lines.append(f"  {action:<18} n={stats['count']:<4} p50 {ms(stats['p50'])}  p95 {ms(stats['p95'])}")
+    errors = [e for r in results for e in r["errors"]]
+    if errors:
+        lines += ["", f"{len(errors)} errors, first ones:"] + [f"  {e}" for e in errors[:5]]
+    return "\n".join(lines)
+
+
+async def _load_test(url, pid, levels, clicks, think, seed, timeout):
+    # one session first, so every level starts from warm caches and the baseline includes them
+    warm = Session(url, clicks, 0, seed, timeout)
+    await warm.walk()
+    await warm.close()
+    if warm.errors and not warm.timings:
+        raise RuntimeError(f"warm-up session failed: {warm.errors[0]}")
+    await asyncio.sleep(1.0)
+    baseline = rss_mb(pid)
+    results = []
+    for i, n in enumerate(levels):
+        results.append(await run_level(url, pid, n, clicks, think, seed + i, timeout))
+    return baseline, results
+
+
+def load_test(app_path=None, levels=(1, 5, 10), clicks=8, think=0.5, seed=0, timeout=300, url=None, pid=None):
+    """(baseline server RSS in MB or None, [result per concurrency level])."""
+    server = None
+    if url is None:
+        port = free_port()
+        server = start_server(os.path.abspath(app_path), port, timeout)
+        url, pid = f"http://127.0.0.1:{port}", server.pid
+    try:
+        return asyncio.run(_load_test(url, pid, list(levels), clicks, think, seed, timeout))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("app", nargs="?", default="dashboard3.0.py")
+    parser.add_argument("--url", help="test a running server instead of starting one, e.g. http://127.0.0.1:8501")
+    parser.add_argument("--pid", type=int, help="server process id, for memory readings with --url")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 5, 10], help="concurrency levels to run")
+    parser.add_argument("--clicks", type=int, default=8, help="interactions per session after the first load")
+    parser.add_argument("--think", type=float, default=0.5, help="max think time between clicks, seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=300, help="per-rerun and server start-up timeout in seconds")
+    parser.add_argument("--json", help="also write the full results to this file")
+    args = parser.parse_args(argv[1:])
+    try:
+        import websockets  # noqa: F401
+    except ImportError:
+        parser.error("the websockets package is needed for the load test: pip install websockets")
+
+    baseline, results = load_test(args.app, args.sessions, args.clicks, args.think, args.seed, args.timeout,
+                                  url=args.url, pid=args.pid)
+    target = args.url or args.app
+    print(format_report(target, baseline, results))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump({"target": target, "baseline_rss_mb": baseline, "levels": results}, fh, indent=1)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
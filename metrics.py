@@ -0,0 +1,277 @@
+"""
+Process-wide metrics for the dashboard in Prometheus text format (and JSON).
+
+    pcn_rerun_seconds{section}                  histogram, one observation per section per rerun
+                                                ("total" for the whole script)
+    pcn_cache_requests_total{function,layer,result}
+                                                counter; layer "memory" is st.cache_data /
+                                                st.cache_resource, "disk" the disk_cache backend;
+                                                result "hit" or "miss"
+    pcn_figure_payload_bytes{figure}            histogram of the JSON size of every chart sent
+    pcn_active_sessions                         sessions that reran in the last SESSION_IDLE_SECONDS
+    pcn_reruns_total                            counter
+
+Nothing is collected unless one of these is set:
+    PCN_METRICS_PORT=9464   serves /metrics (text) and /metrics.json on 127.0.0.1 from a daemon
+                            thread of the first Streamlit process to bind the port
+    PCN_METRICS_FILE=path   rewrites that file (e.g. for node_exporter's textfile collector) after a
+                            rerun, at most every PCN_METRICS_INTERVAL seconds (default 15)
+
+Memory-cache hits are counted by wrapping the cached function twice (counted()):
+the outer call always runs, the inner one only on a miss. Figure payloads are
+measured with fig.to_json(), which costs about as much as Streamlit's own
+serialisation of the figure, hence opt-in.
+"""
+import functools
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PORT_ENV_VAR = "PCN_METRICS_PORT"
+FILE_ENV_VAR = "PCN_METRICS_FILE"
+INTERVAL_ENV_VAR = "PCN_METRICS_INTERVAL"
+SESSION_IDLE_SECONDS = 300
+
+RERUN_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+PAYLOAD_BUCKETS = (1e3, 1e4, 5e4, 1e5, 5e5, 1e6, 5e6, 1e7, 5e7)
+
+HELP = {
+    'pcn_rerun_seconds': ('histogram', "Wall time of each dashboard section per rerun."),
+    'pcn_cache_requests_total': ('counter', "Calls to cached functions by cache layer and hit/miss."),
+    'pcn_figure_payload_bytes': ('histogram', "JSON size of each chart sent to the browser."),
+    'pcn_active_sessions': ('gauge', f"Sessions that reran in the last {SESSION_IDLE_SECONDS} seconds."),
+    'pcn_reruns_total': ('counter', "Script reruns."),
+}
+
+
+def metrics_enabled():
+    return bool(os.environ.get(PORT_ENV_VAR) or os.environ.get(FILE_ENV_VAR))
+
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.total += 1
+        self.sum += value
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = {}   # (name, labels) -> _Histogram
+        self.counters = {}     # (name, labels) -> float
+        self.sessions = {}     # session id -> last rerun (monotonic)
+
+    def observe(self, name, labels, value, buckets):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            if key not in self.histograms:
+                self.histograms[key] = _Histogram(buckets)
+            self.histograms[key].observe(value)
+
+    def inc(self, name, labels=None, amount=1):
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def note_session(self, session_id):
+        now = time.monotonic()
+        with self._lock:
+            self.sessions[session_id] = now
+            for sid, seen in list(self.sessions.items()):
+                if now - seen > SESSION_IDLE_SECONDS:
+                    del self.sessions[sid]
+
+    def active_sessions(self):
+        now = time.monotonic()
+        with self._lock:
+            return sum(1 for seen in self.sessions.values() if now - seen <= SESSION_IDLE_SECONDS)
+
+    def render(self):
+        """Prometheus text exposition format."""
+        lines, typed = [], set()
+
+        def header(name):
+            if name not in typed:
+                typed.add(name)
+                kind, text = HELP.get(name, ('untyped', name))
+                lines.extend([f"# HELP {name} {text}", f"# TYPE {name} {kind}"])
+
+        with self._lock:
+            counters = sorted(self.counters.items())
+            histograms = [(key, h.buckets, list(h.counts), h.total, h.sum) for key, h in sorted(self.histograms.items(), key=lambda kv: kv[0])]
+        for (name, labels), value in counters:
+            header(name)
+            lines.append(f"{name}{_labels(labels)} {_number(value)}")
+        for (name, labels), buckets, counts, total, total_sum in histograms:
+            header(name)
+            for bound, count in zip(buckets, counts):
+                lines.append(f"{name}_bucket{_labels(labels + (('le', _number(bound)),))} {count}")
+            lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {total}")
+            lines.append(f"{name}_sum{_labels(labels)} {_number(total_sum)}")
+            lines.append(f"{name}_count{_labels(labels)} {total}")
+        header('pcn_active_sessions')
+        lines.append(f"pcn_active_sessions {self.active_sessions()}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        """The same numbers as a JSON-friendly dict."""
+        with self._lock:
+            counters = [{"name": name, "labels": dict(labels), "value": value}
+                        for (name, labels), value in sorted(self.counters.items())]
+            histograms = [{"name": name, "labels": dict(labels), "count": h.total, "sum": h.sum,
+                           "buckets": dict(zip(map(str, h.buckets), h.counts))}
+                          for (name, labels), h in sorted(self.histograms.items(), key=lambda kv: kv[0])]
+        return {"counters": counters, "histograms": histograms, "active_sessions": self.active_sessions()}
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) and not float(value).is_integer() else str(int(value))
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in labels)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + "}"
+
+
+REGISTRY = Registry()
+
+
+# ---- cache hit / miss ----
+_calls = threading.local()
+
+
+def record_cache(function, layer, hit):
+    if metrics_enabled():
+        REGISTRY.inc('pcn_cache_requests_total', {'function': function, 'layer': layer, 'result': 'hit' if hit else 'miss'})
+
+
+def counted(cache):
+    """Use in place of a caching decorator: @counted(st.cache_data) or @counted(st.cache_data(show_spinner=...))."""
+    def decorate(func):
+        name = func.__name__
+
+        @functools.wraps(func)
+        def on_miss(*args, **kwargs):
+            # only reached when the cache runs the function; marks the innermost pending call
+            stack = getattr(_calls, 'stack', None)
+            if stack:
+                stack[-1] = False
+            return func(*args, **kwargs)
+
+        cached = cache(on_miss)
+
+        @functools.wraps(func)
+        def call(*args, **kwargs):
+            stack = _calls.__dict__.setdefault('stack', [])
+            stack.append(True)
+            try:
+                return cached(*args, **kwargs)
+            finally:
+                hit = stack.pop()
+                record_cache(name, 'memory', hit)
+
+        call.clear = getattr(cached, 'clear', None)
+        return call
+    return decorate
+
+
+# ---- rerun timing ----
+class RerunTimer:
+    """Lap timer for one rerun: section(name) closes the previous section, finish() records the total."""
+
+    def __init__(self, session_id=None):
+        self.enabled = metrics_enabled()
+        self.started = self._lap = time.perf_counter()
+        self.current = None
+        if self.enabled:
+            REGISTRY.inc('pcn_reruns_total')
+            if session_id is not None:
+                REGISTRY.note_session(session_id)
+
+    def section(self, name):
+        now = time.perf_counter()
+        if self.enabled and self.current is not None:
+            REGISTRY.observe('pcn_rerun_seconds', {'section': self.current}, now - self._lap, RERUN_BUCKETS)
+        self.current, self._lap = name, now
+
+    def finish(self):
+        self.section(None)
+        if self.enabled:
+            REGISTRY.observe('pcn_rerun_seconds', {'section': 'total'}, time.perf_counter() - self.started, RERUN_BUCKETS)
+            write_metrics_file()
+
+
+def record_figure(name, fig):
+    if metrics_enabled():
+        REGISTRY.observe('pcn_figure_payload_bytes', {'figure': name}, len(fig.to_json()), PAYLOAD_BUCKETS)
+
+
+# ---- exposure ----
+_file_lock = threading.Lock()
+_last_write = [0.0]
+
+
+def write_metrics_file(path=None, force=False):
+    path = path or os.environ.get(FILE_ENV_VAR)
+    if not path:
+        return
+    interval = float(os.environ.get(INTERVAL_ENV_VAR, "15"))
+    with _file_lock:
+        if not force and time.monotonic() - _last_write[0] < interval:
+            return
+        _last_write[0] = time.monotonic()
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as fh:
+                fh.write(REGISTRY.render())
+            # scrapers read either the old or the new file, never a half-written one
+            os.replace(tmp_path, path)
+        except OSError:
+            # metrics must never take the page down
+            pass
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") == "/metrics":
+            body, kind = REGISTRY.render().encode(), "text/plain; version=0.0.4; charset=utf-8"
+        elif self.path.rstrip("/") == "/metrics.json":
+            body, kind = json.dumps(REGISTRY.snapshot()).encode(), "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", kind)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_metrics_server(port=None, host="127.0.0.1"):
+    """Serve the registry on a daemon thread; None if no port is configured or it is already taken."""
+    port = port or os.environ.get(PORT_ENV_VAR)
+    if not port:
+        return None
+    try:
+        server = ThreadingHTTPServer((host, int(port)), _Handler)
+    except OSError:
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="pcn-metrics", daemon=True).start()
+    return server
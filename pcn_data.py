@@ -0,0 +1,295 @@
+"""
+Pillar definitions and the cleaning rules shared by dashboard3.0.py and the
+data bundle builder (data_bundle.py): the pillar keyword maps, name
+standardisation, pillar grouping, the CSV cleaning steps and the shapefile ->
+geojson conversion. Kept out of the Streamlit script so both build the exact
+same frames and geometry.
+"""
+import json
+
+import pandas as pd
+
+from data_schema import COUNTY_SCHEMA, PCN_SCHEMA, read_with_schema
+
+PILLAR_KEYWORDS = {
+    '1. Governance': [
+        'Proportion of functional PHC advisory Committees in Place',
+        'Proportion of PCNs Established',
+        'Proportion of PCNs Gazetted',
+        'Availability of a Functional PCN management committee',
+        'Proportion of Hospital management boards appointed/gazetted:',
+        'Proportion of Health Facilities (level 2&3) with Health Facility Management Committee Appointed/Gazetted',
+        'Availability of a functional PHC TWG Score',
+        'Proportion of PCNs with an operational budget for the MDT activities:',
+        'Perfomance Review Score',
+        'CHMT Support Supervision Score',
+        'Governance Score',
+        'Governance Weighted Score'
+    ],
+    '2. Human Resources for Health (HRH)': [
+        'Does the County have a mechanism to enhance health workers skills',
+        'HRH Score',
+        'HRH Weighted Score'
+    ],
+    '3. Health Product Technologies (HPT)': [
+        'Proportion of county health budget allocated to drugs and supplies',
+        'Proportion of county HPT budget allocated to levels 2&3 :',
+        'HPT Score',
+        'HPT Weighted Score'
+    ],
+    '4. Service Delivery Systems': [
+        'PCNs with functional refferal mechanisms',
+        'Service Delivery Systems Score',
+        'Service Delivery Systems Weighted Score'
+    ],
+    '5. Healthcare Financing': [
+        'Proportion of households registered on SHA within the County',
+        'Healthcare Financing Score',
+        'Healthcare Financing Weighted Score'
+    ],
+    '6. HMIS/Digital Health': [
+        'Proportion of SMART PCNs in the County',
+        'HMIS Score',
+        'HMIS Weighted Score'
+    ],
+    '7. Quality of Care (QoC) - Management Systems': [
+        'Mechanism to Coordinate Quality Improvement Score',
+        'Mechanism for Implementation of Support Supervision in Health Facilities Score',
+        'Presence of an Infection Prevention Control (IPC) committee Score',
+        'QoC Management Systems Score',
+        'QoC Management Systems Weighted Score'
+    ],
+    '8. Multisectoral Partnerships and Coordination': [
+        'Number of bi-annual multisectoral stakeholder forums Score',
+        'Proportion of MOUs and partnership agreements aligned to PHC signed',
+        'Research studies done on PCN implementation Score',
+        'Multisectoral Partnerships and Coordination Score',
+        'Multisectoral Partnerships and Coordination Weighted Score'
+    ],
+    '9. Innovations and Learning': [
+        'Number of knowledge management and learning forums conducted Score:',
+        'No. of research studies done on PCN implementation Score',
+        'Innovations and Learning Score',
+        'Innovations and Learning Weighted Score'
+    ],
+    '10. Overall Score': [
+        'Total County Score (Total Weighted Score)',
+    ]
+}
+
+# PCN-level pillar keywords (based on the long header you shared).
+# Use substrings from the header so group_columns_by_pillar will catch the right columns.
+PCN_PILLAR_KEYWORDS = {
+    '1. Governance': [
+        'Proportion of functional Community Health Committees',
+        'Proportion of Health facilities that have received supportive supervision',
+        'Functional PCN Management committee',
+        'Functionallity of MDTs',
+        'Governance Score', 'Governance Weighted Score'
+    ],
+    '2. Population Health Needs': [
+        'Number of population profiling assessments conducted',
+        'Proportion of population health needs that have been addressed',
+        'Number of wellness activities conducted',
+        'Population Needs Score', 'Population Needs Weighted Score'
+    ],
+    '3. Capacity Readiness': [
+        'Proportion of facilities in the PCN that had all 22 tracer pharmaceuticals',
+        'Proportion of facilities in the PCN that have all 23 tracer non-pharmaceuticals',
+        'Availability of the whole blood and blood components',
+        'Percentage of Health facilities with stock out on any of the 22 tracer pharmaceuticals',
+        'Percentage of Health facilities with stock out on any of the 22 tracer non-pharmaceuticals',
+        'Proportion of hospitals with comprehensive lab services',
+        'Proportion of spokes with basic lab services',
+        'Proportion of Facilities within the PCN with all basic tracer equipment',
+        'Capacity Readiness Score', 'Capacity Readiness Weighted Score'
+    ],
+    '4. Healthcare Financing': [
+        'Proportion of clients accessing Health Services using SHIF',
+        'Proportion of the target Health Facilities empanneled on SHA',
+        'Proportion of Health Facilities in the PCN making SHA claims',
+        'Proportion of claims reimbursed to HFs within the PCN',
+        'Proportion of FIF collected rolled back to the facilities within PCN',
+        'Number of people waived for user fees',
+        'Total amount of user fees waived',
+        'Healthcare Financing Score', 'Healthcare Financing Weighted Score'
+    ],
+    '5. Health Infrastructure': [
+        'Proportion of health facilities with accessible road network',
+        'Proportion of facilities with the appropriate WASH facilities',
+        'Proportion of facilities with the tracer list of infrastructure',
+        'Proportion of facilties with a reliable power source',
+        'PCN access to adequate ambulance services',
+        'Ambulance request Score', 'Health infrastructure Score', 'Health infrastructure Weighted Score'
+    ],
+    '6. HMIS/Digital Health': [
+        'Proprtion of facilties with reliable internet connection',
+        'Proportion of facilities in the PCN with the key OPD reporting tools',
+        'No of performance and data quality review meetings held quarterly',
+        'Proportion of facilities with ICT infrastructure',
+        'Proportion of facilities in a PCN with an integrated functional EMR',
+        'Proportion of CHUs within the PCN reporting monthly',
+        'HMIS Score', 'HMIS Weighted Score'
+    ],
+    '7. Human Resources for Health (HRH)': [
+        'Core HRH density', 'Doctor to population ratio', 'Clinical officer to  population ratio',
+        'Nurse to population ratio', 'CHA/CHO  to population ratio',
+        'Proportion of CHPs trained on basic modules',
+        'Health care workers sensitized on PHC /PCN',
+        'Does the PCN have a mechanism to enhance health workers skills',
+        'Proportion of health workers who have undergone a skills/ competency buliding course',
+        'HRH Score', 'HRH Weighted Score'
+    ],
+    '8. Service Delivery': [
+        'Number of outreaches conducted by the MDT',
+        'Number of in-reaches conducted within the PCN',
+        'Service Delivery Score', 'Service Delivery Weighted Score'
+    ],
+    '9. Quality of Care - Management Systems': [
+        'Proportion of hospitals with functional facility quality improvement teams',
+        'Proportion of spokes with functional facility work improvement teams',
+        'Average availability of selected IPC items',
+        'QoC Management Systems Score', 'QoC Management Systems Weighted Score'
+    ],
+    '10. Quality of Care - PHC Core Systems': [
+        'Adherence to clinical guidelines', 'Provider Availability (absenteeism)',
+        'QoC PHC Core Systems Score'
+    ],
+    '11. Quality of Care - Outcomes': [
+        'Proportion of facilities conducting MPDSR',
+        'Fresh Stillbirth rate', 'Number of maternal deaths', 'Proportion of maternal deaths Audited',
+        'Number of neonatal deaths', 'Proportion of neonatal deaths audited',
+        'TB Treatment Success Rate',
+        'QoC Outcomes Score'
+    ],
+    '12. Social Accountability': [
+        'Proportion of facilities which have conducted a client satisfaction survey',
+        'No. of MDT engagements with the community',
+        'No. of health facilities with functional GRMs',
+        'Social Accountability Score'
+    ],
+    '13. Multisectoral Partnerships and Coordination': [
+        'Proportion of multi-sectoral actions implemented',
+        'Number of inter- PCN peer to peer learning sessions held',
+        'Multisectoral Partnerships and Coordination Score'
+    ],
+    '14. Innovations and Learning': [
+        'Number of PHC related innovations', 'Innovations and Learning Score', 'Innovations and Learning Weighted Score'
+    ],
+    '15. Overall PCN Score': [
+        'Total PCN Score', 'Total PCN Score (Total Weighted Score)'
+    ]
+}
+
+
+def standardize_name(name):
+    if pd.isna(name):
+        return name
+    name = str(name).strip().title()
+    
+    # --- START FIX: More robust cleaning ---
+    name = (
+        name.replace('\xa0', ' ')
+        .replace('/', ' ')
+        .replace('-', ' ')
+        .replace('Sub County', '') # Added to remove "Sub County"
+        .replace('Sub-County', '') # Added to remove "Sub-County"
+        .replace('District', '')   # Added to remove "District"
+        .replace('Division', '')   # Added to remove "Division"
+        .replace('County', '')     # Original line
+    )
+    # --- END FIX ---
+    
+    while '  ' in name: # Note: two spaces here
+        name = name.replace('  ', ' ')
+    
+    # 2. Add explicit mapping for problematic names
+    name_standardization_map = {
+        'Nairobi City': 'Nairobi',
+        # Add explicit fixes for the names that still don't match after cleaning:
+        # Example: If 'Garissa Township Sub ' is still the GeoJSON name, map it to the desired name.
+        # However, the expanded cleaning above should fix this, so start with the cleaning.
+    }
+    name = name_standardization_map.get(name, name)
+    return name.strip()
+
+def group_columns_by_pillar(df_raw, pillar_keywords):
+    pillar_dfs = {}
+    for pillar, keywords in pillar_keywords.items():
+        # match any keyword substring (case-insensitive) appearing inside column names
+        matching_cols = ['County'] + [
+            col for col in df_raw.columns
+            if any(keyword.lower() in col.lower() for keyword in keywords)
+        ]
+        if len(matching_cols) > 1:
+            pillar_dfs[pillar] = df_raw[matching_cols].copy()
+    return pillar_dfs
+
+
+def clean_county_frame(df):
+    score_cols = [col for col in df.columns if col != 'County']
+    df['County'] = df['County'].apply(standardize_name)
+    # Filtering (to prevent plotting zero-data counties)
+    df_filtered = df.dropna(subset=score_cols, how='all')
+    return df_filtered.fillna(0)
+
+
+def clean_pcn_frame(df):
+    # apply standardization to County and Subcounty if present
+    if 'County' in df.columns:
+        df['County'] = df['County'].apply(standardize_name)
+    if 'Sub county' in df.columns:
+        df['Sub county'] = df['Sub county'].apply(standardize_name)
+    return df
+
+
+def read_county_csv(path):
+    # one typed read driven by COUNTY_SCHEMA (usecols/dtype/na_values), section headers never parsed
+    df, schema_report = read_with_schema(path, COUNTY_SCHEMA)
+    return clean_county_frame(df), schema_report
+
+
+def read_pcn_csv(path):
+    # scores come out as float64 straight from read_csv, names as strings (PCN_SCHEMA)
+    df, schema_report = read_with_schema(path, PCN_SCHEMA)
+    return clean_pcn_frame(df), schema_report
+
+
+def county_geojson(shp_path):
+    # geopandas is imported here, not at module level, so callers that hit a cache never load it
+    import geopandas as gpd
+
+    gdf = gpd.read_file(shp_path)
+    if gdf.crs != "EPSG:4326":
+        gdf = gdf.to_crs(epsg=4326)
+    gdf_clean = gdf[['ADM1_EN', 'geometry']].rename(columns={'ADM1_EN': 'County_Name_Key'})
+    gdf_clean['County_Name_Key'] = gdf_clean['County_Name_Key'].apply(standardize_name)
+    return json.loads(gdf_clean.to_json())
+
+
+def subcounty_geojson(shp_path):
+    import geopandas as gpd
+
+    gdf = gpd.read_file(shp_path)
+    if gdf.crs != "EPSG:4326":
+        gdf = gdf.to_crs(epsg=4326)
+
+    # CRITICAL FIX: Explicitly use ADM2_EN for Subcounty name and ADM1_EN for County name
+    NAME_COLUMN_KEY = 'ADM2_EN'
+    COUNTY_COLUMN_KEY = 'ADM1_EN' # Assumed County column in the adm2 shapefile
+
+    if NAME_COLUMN_KEY not in gdf.columns or COUNTY_COLUMN_KEY not in gdf.columns:
+        raise ValueError(f"Shapefile is missing expected columns ('{NAME_COLUMN_KEY}' or '{COUNTY_COLUMN_KEY}'). Cannot map.")
+
+    # Select both name columns and rename them
+    gdf_clean = gdf[[NAME_COLUMN_KEY, COUNTY_COLUMN_KEY, 'geometry']].rename(
+        columns={
+            NAME_COLUMN_KEY: 'Subcounty_Name_Key',
+            COUNTY_COLUMN_KEY: 'County_Name_Key' # New property for filtering
+        }
+    )
+
+    # Apply standardization to both names
+    gdf_clean['Subcounty_Name_Key'] = gdf_clean['Subcounty_Name_Key'].apply(standardize_name)
+    gdf_clean['County_Name_Key'] = gdf_clean['County_Name_Key'].apply(standardize_name)
+    return json.loads(gdf_clean.to_json())
@@ -0,0 +1,117 @@
+"""
+Peer PCNs: the k PCNs whose indicator profile is closest to a selected one.
+
+PeerIndex standardises every indicator of the PCN table (NaN-aware z-score: mean
+and spread over the PCNs that report it) and, once per data version and indicator
+set, measures every PCN against every other with indicator_matrix.nan_sq_distances
+(mean squared difference over the indicators both report), BLOCK rows at a time so
+memory stays at BLOCK x PCNs however big the table gets. Pairs that share fewer
+than min_shared indicators aren't peers. Each row keeps its MAX_K nearest, sorted,
+so a lookup is a slice of a prebuilt array.
+
+peers() returns the k nearest with their distance (root-mean-square difference, in
+standard deviations), how many indicators they share and how they compare: for every
+indicator, peer minus selected, and how many indicators each peer does better on
+given the indicator's direction, so a manager can see what the stronger peers do
+differently.
+"""
+import numpy as np
+import pandas as pd
+
+from indicator_matrix import nan_sq_distances, percentile_scores
+from rounds import lower_is_better
+
+KEY_COLUMNS = ('County', 'Sub county', 'PCN')
+MAX_K = 25
+MIN_SHARED = 3
+BLOCK = 512
+
+
+def standardize(X):
+    # z-score per column over its observed values; constant or empty columns only centre, NaN stays NaN
+    present = ~np.isnan(X)
+    counts = np.maximum(present.sum(axis=0), 1)
+    mean = np.where(present, X, 0.0).sum(axis=0) / counts
+    std = np.sqrt(np.where(present, (X - mean) ** 2, 0.0).sum(axis=0) / counts)
+    std[~(std > 0)] = 1.0
+    return (X - mean) / std
+
+
+def pcn_labels(names):
+    # "County / Sub county / PCN", the text the peer picker shows
+    return names.astype(str).agg(" / ".join, axis=1).to_numpy(dtype=object)
+
+
+class PeerIndex:
+    """Every PCN's nearest neighbours over one set of indicators, computed once."""
+
+    def __init__(self, df, indicators, max_k=MAX_K, min_shared=MIN_SHARED, block=BLOCK):
+        self.indicators = [c for c in indicators if c in df.columns and pd.api.types.is_numeric_dtype(df[c])]
+        key_columns = [c for c in KEY_COLUMNS if c in df.columns]
+        self.names = df[key_columns].astype(object).fillna("Unknown").astype(str).reset_index(drop=True)
+        self.labels = pcn_labels(self.names)
+        self.values = df[self.indicators].to_numpy(dtype=np.float64, na_value=np.nan)
+        self.flip = np.array([lower_is_better(c) for c in self.indicators], dtype=bool)
+        self.mean_percentile = self._mean_percentile()
+
+        Z = standardize(self.values)
+        n = len(Z)
+        k = max(0, min(max_k, n - 1))
+        self.neighbours = np.full((n, k), -1, dtype=np.int64)
+        self.distances = np.full((n, k), np.nan)
+        self.shared = np.zeros((n, k), dtype=np.int64)
+        for start in range(0, n, block):
+            stop = min(start + block, n)
+            D, shared = nan_sq_distances(Z[start:stop], Z)
+            D = np.where((shared >= min_shared) & ~np.isnan(D), D, np.inf)
+            D[np.arange(stop - start), np.arange(start, stop)] = np.inf
+            if k == 0:
+                continue
+            # k smallest per row, then sorted (ties by position)
+            near = np.argpartition(D, k - 1, axis=1)[:, :k] if k < n else np.argsort(D, axis=1)[:, :k]
+            near_d = np.take_along_axis(D, near, axis=1)
+            order = np.lexsort((near, near_d), axis=1)
+            near, near_d = np.take_along_axis(near, order, axis=1), np.take_along_axis(near_d, order, axis=1)
+            found = np.isfinite(near_d)
+            rows = np.arange(start, stop)[:, None]
+            self.neighbours[start:stop] = np.where(found, near, -1)
+            self.distances[start:stop] = np.where(found, np.sqrt(near_d), np.nan)
+            self.shared[start:stop] = np.where(found, shared[rows - start, near], 0)
+        self._position = {label: i for i, label in enumerate(self.labels)}
+        # PCNs that report too little to be compared have no peers; pickers only offer the others
+        self.with_peers = [label for label, first in zip(self.labels, self.neighbours[:, 0] if k else []) if first >= 0]
+
+    def _mean_percentile(self):
+        # mean of each PCN's percentiles (high = good on every indicator), NaN when it reports nothing
+        P = percentile_scores(self.values, self.flip)
+        present = ~np.isnan(P)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(present, P, 0.0).sum(axis=1) / present.sum(axis=1)
+
+    def position(self, label):
+        return self._position.get(label)
+
+    def peers(self, position, k=10):
+        """(peers table, indicator deltas) for the PCN at this row position; both empty when it has no peers."""
+        found = self.neighbours[position, :k]
+        keep = found >= 0
+        near, dist, shared = found[keep], self.distances[position, :k][keep], self.shared[position, :k][keep]
+
+        delta = self.values[near] - self.values[position]
+        better = np.where(self.flip, delta < 0, delta > 0)
+        worse = np.where(self.flip, delta > 0, delta < 0)
+        table = self.names.iloc[near].reset_index(drop=True)
+        table.insert(0, 'Rank', np.arange(1, len(near) + 1))
+        table['Distance (SD)'] = dist
+        table['Shared indicators'] = shared
+        table['Mean percentile'] = self.mean_percentile[near]
+        table['vs selected'] = self.mean_percentile[near] - self.mean_percentile[position]
+        table['Better on'] = better.sum(axis=1)
+        table['Worse on'] = worse.sum(axis=1)
+
+        # one row per indicator: the selected PCN's value, then peer minus selected for every peer
+        deltas = pd.DataFrame(delta.T, index=self.indicators,
+                              columns=[f"{i + 1}. {name}" for i, name in enumerate(self.names.iloc[near, -1])])
+        deltas.insert(0, 'Selected', self.values[position])
+        deltas.insert(1, 'Lower is better', self.flip)
+        return table, deltas
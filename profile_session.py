@@ -0,0 +1,207 @@
+"""
+Profile a dashboard through a scripted sequence of widget changes.
+
+    python profile_session.py [app.py] [--steps steps.json] [--out profiles] [--top 25]
+
+The app runs headless under Streamlit's AppTest. Every interaction (the first
+load, then one widget change per step) is sampled on its own: a background thread
+records the stack of the script thread every --interval seconds, and each
+interaction is written out as collapsed stacks (NN_<step>.folded, one
+"frame;frame;frame count" line per distinct stack), ready for flamegraph.pl,
+speedscope or any other flame-graph viewer. summary.txt lists the wall time of
+every interaction and the functions with the most samples, inclusive and self.
+
+AppTest executes the script on its own thread, which cProfile (per-thread) can't
+follow; sampling every thread but our own works for any dashboard version.
+
+A steps file is a JSON list of
+    {"name": "pcn county", "widget": "selectbox", "match": ["County (PCN data)", "pcn_county_select"],
+     "value": "Kakamega", "option": 1}
+"match" holds widget keys or labels, tried in order, so one script covers versions
+that label their widgets differently. "value" is set when it is valid, otherwise
+"option" picks an option by position. A step whose widget is missing is skipped
+and reported. Without --steps the built-in DEFAULT_STEPS are used.
+"""
+import argparse
+import collections
+import json
+import os
+import re
+import sys
+import threading
+import time
+
+DEFAULT_STEPS = [
+    {"name": "county pillar", "widget": "selectbox",
+     "match": ["county_pillar", "county_pillar_select", "1. Select Pillar:"], "option": 2},
+    {"name": "county indicator", "widget": "selectbox",
+     "match": ["county_indicator", "county_indicator_select", "2. Select Indicator/Metric:"], "option": 1},
+    {"name": "pcn county", "widget": "selectbox",
+     "match": ["County (PCN data)", "pcn_county_select"], "value": "Kakamega", "option": 1},
+    {"name": "pcn subcounty", "widget": "selectbox",
+     "match": ["Subcounty", "pcn_subcounty_select"], "option": 1},
+    {"name": "pcn pillar", "widget": "selectbox",
+     "match": ["pcn_pillar", "pcn_pillar_select"], "option": 1},
+    {"name": "pcn indicator", "widget": "selectbox",
+     "match": ["pcn_indicator", "pcn_indicator_select"], "option": 1},
+]
+
+
+# leaf frames of threads that are parked, not working; those samples are dropped
+IDLE_FRAMES = {"threading.py:wait", "selectors.py:select", "queue.py:get"}
+
+
+class StackSampler:
+    """Collects collapsed stacks of every thread except the caller's and its own."""
+
+    def __init__(self, interval=0.002):
+        self.interval = interval
+        self.ignore = {threading.get_ident()}
+        self.stacks = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def _frame_name(frame):
+        code = frame.f_code
+        return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+    def _run(self):
+        self.ignore.add(threading.get_ident())
+        while not self._stop.is_set():
+            for ident, frame in sys._current_frames().items():
+                if ident in self.ignore:
+                    continue
+                names = []
+                while frame is not None:
+                    names.append(self._frame_name(frame))
+                    frame = frame.f_back
+                if names[0] in IDLE_FRAMES:
+                    continue
+                self.stacks[";".join(reversed(names))] += 1
+            time.sleep(self.interval)
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def top_functions(stacks, n):
+    """(inclusive, self) sample counts per frame, largest first."""
+    inclusive, own = collections.Counter(), collections.Counter()
+    for stack, count in stacks.items():
+        frames = stack.split(";")
+        for name in set(frames):
+            inclusive[name] += count
+        own[frames[-1]] += count
+    return inclusive.most_common(n), own.most_common(n)
+
+
+def write_folded(path, stacks):
+    with open(path, "w", encoding="utf-8") as fh:
+        for stack, count in sorted(stacks.items()):
+            fh.write(f"{stack} {count}\n")
+
+
+def find_widget(at, step):
+    elements = getattr(at, step["widget"])
+    for match in step["match"]:
+        for element in elements:
+            if getattr(element, "key", None) == match or getattr(element, "label", None) == match:
+                return element
+    return None
+
+
+def apply_step(at, step):
+    """Queue the widget change for the next run; returns a short description or None if the widget is missing."""
+    widget = find_widget(at, step)
+    if widget is None:
+        return None
+    kind = step["widget"]
+    if kind == "selectbox":
+        options = list(widget.options)
+        if "value" in step and str(step["value"]) in options:
+            widget.select(step["value"])
+            return str(step["value"])
+        index = min(step.get("option", 0), len(options) - 1)
+        widget.select_index(index)
+        return options[index]
+    if kind == "text_input":
+        widget.input(step["value"])
+    elif kind == "button":
+        widget.click()
+        return "click"
+    else:
+        widget.set_value(step["value"])
+    return str(step["value"])
+
+
+def slug(text):
+    return re.sub(r"[^a-z0-9]+", "_", text.lower()).strip("_")
+
+
+def profile_session(app_path, steps, out_dir, interval=0.002, timeout=300, top=25):
+    from streamlit.testing.v1 import AppTest
+
+    os.makedirs(out_dir, exist_ok=True)
+    at = AppTest.from_file(os.path.abspath(app_path), default_timeout=timeout)
+    rows, totals = [], collections.Counter()
+
+    for i, step in enumerate([{"name": "initial load"}] + list(steps)):
+        change = "run" if i == 0 else apply_step(at, step)
+        if change is None:
+            rows.append((i, step["name"], "widget not found - skipped", None, 0))
+            continue
+        sampler = StackSampler(interval)
+        start = time.perf_counter()
+        with sampler:
+            at.run()
+        wall = time.perf_counter() - start
+        errors = [str(e.value)[:80] for e in at.exception]
+        path = os.path.join(out_dir, f"{i:02d}_{slug(step['name'])}.folded")
+        write_folded(path, sampler.stacks)
+        totals.update(sampler.stacks)
+        rows.append((i, step["name"], change if not errors else f"{change} (error: {errors[0]})",
+                     wall, sum(sampler.stacks.values())))
+
+    lines = [f"app: {app_path}", "", f"{'#':>2}  {'step':<20} {'wall ms':>9} {'samples':>8}  change"]
+    for i, name, change, wall, samples in rows:
+        wall_text = f"{wall * 1000:9.0f}" if wall is not None else f"{'-':>9}"
+        lines.append(f"{i:>2}  {name:<20} {wall_text} {samples:>8}  {change}")
+
+    inclusive, own = top_functions(totals, top)
+    total_samples = max(1, sum(totals.values()))
+    for title, counts in (("inclusive", inclusive), ("self", own)):
+        lines += ["", f"top functions by {title} samples (all interactions)"]
+        for name, count in counts:
+            lines.append(f"{count:>8} {100 * count / total_samples:5.1f}%  {name}")
+    summary = "\n".join(lines)
+    with open(os.path.join(out_dir, "summary.txt"), "w", encoding="utf-8") as fh:
+        fh.write(summary + "\n")
+    return summary
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("app", nargs="?", default="dashboard3.0.py")
+    parser.add_argument("--steps", help="JSON file with the widget steps (default: built-in script)")
+    parser.add_argument("--out", default="profiles", help="output folder (default: profiles)")
+    parser.add_argument("--interval", type=float, default=0.002, help="sampling interval in seconds")
+    parser.add_argument("--timeout", type=float, default=300, help="per-run timeout in seconds")
+    parser.add_argument("--top", type=int, default=25, help="functions listed in the summary")
+    args = parser.parse_args(argv[1:])
+
+    steps = DEFAULT_STEPS
+    if args.steps:
+        with open(args.steps, encoding="utf-8") as fh:
+            steps = json.load(fh)
+    print(profile_session(args.app, steps, args.out, args.interval, args.timeout, args.top))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
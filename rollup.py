@@ -0,0 +1,69 @@
+"""
+PCN -> county roll-up joined to the county table.
+
+Both tables are keyed on a normalised county name (standardize_name output,
+lower-cased, punctuation and spaces dropped, so "Homa Bay" / "Homabay" and
+"Murang'a" with either apostrophe meet). Every PCN indicator is aggregated per
+county in one groupby (mean, min, max and the number of PCNs reporting), and the
+result sits next to the county-level indicators in one frame indexed by that key,
+so a cross-level comparison is a column lookup. Names that appear on only one side
+are kept in the report instead of being dropped silently.
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+ROLLUP_STATS = ('mean', 'min', 'max', 'count')
+
+_NOT_ALNUM = re.compile(r"[^a-z0-9]+")
+
+
+def county_key(name):
+    if pd.isna(name):
+        return np.nan
+    return _NOT_ALNUM.sub("", str(name).lower()) or np.nan
+
+
+class CountyRollup:
+    """county: county rows by key; pcn: MultiIndex (indicator, stat) roll-ups by key; plus the unmatched names."""
+
+    def __init__(self, county_df, pcn_df, pcn_indicators=None, name_col='County'):
+        county_keys = county_df[name_col].map(county_key)
+        pcn_keys = pcn_df[name_col].map(county_key)
+        if pcn_indicators is None:
+            pcn_indicators = [c for c in pcn_df.columns if c not in ('County', 'Sub county', 'PCN')
+                              and pd.api.types.is_numeric_dtype(pcn_df[c])]
+        self.pcn_indicators = list(pcn_indicators)
+        self.name_col = name_col
+
+        self.county = county_df.set_index(county_keys.rename('key'))
+        grouped = pcn_df[self.pcn_indicators].astype('float64').groupby(pcn_keys.rename('key').to_numpy())
+        self.pcn = grouped.agg(list(ROLLUP_STATS))
+        self.pcn_rows = pcn_keys.value_counts().rename('PCN rows')
+
+        county_set, pcn_set = set(county_keys.dropna()), set(pcn_keys.dropna())
+        self.unmatched_county = sorted(county_df[name_col][county_keys.isin(county_set - pcn_set)].astype(str).unique())
+        self.unmatched_pcn = sorted(pcn_df[name_col][pcn_keys.isin(pcn_set - county_set)].astype(str).unique())
+        self.missing_county_name = int(pcn_keys.isna().sum())
+
+    def compare(self, county_indicator, pcn_indicator, stat='mean'):
+        """One row per county: the county-level value next to the roll-up of its PCN rows."""
+        out = pd.DataFrame({'County': self.county[self.name_col].astype(str)})
+        out['County value'] = self.county[county_indicator].to_numpy()
+        stats = self.pcn[pcn_indicator].reindex(out.index)
+        out[f'PCN {stat}'] = stats[stat].to_numpy()
+        out['PCNs reporting'] = stats['count'].fillna(0).astype(int).to_numpy()
+        out['PCN rows'] = self.pcn_rows.reindex(out.index).fillna(0).astype(int).to_numpy()
+        out['Difference'] = out['County value'] - out[f'PCN {stat}']
+        return out.reset_index(drop=True)
+
+    def report(self):
+        lines = []
+        if self.unmatched_county:
+            lines.append(f"County table only (no PCN rows): {', '.join(self.unmatched_county)}")
+        if self.unmatched_pcn:
+            lines.append(f"PCN table only (no county row): {', '.join(self.unmatched_pcn)}")
+        if self.missing_county_name:
+            lines.append(f"{self.missing_county_name} PCN rows have no county name")
+        return lines
@@ -0,0 +1,155 @@
+"""
+Round-over-round change between two assessment rounds.
+
+Rounds are listed in a JSON file (PCN_ROUNDS_FILE, default rounds.json):
+
+    {"2024": {"county": "rounds/county_2024.csv", "pcn": "rounds/pcn_2024.csv"},
+     "2025": {"county": "county_lvl_data.csv", "pcn": "pcn_lvl_data.csv"}}
+
+Each file is read with the same schema and cleaning as the dashboard's own CSVs.
+RoundComparison aligns two cleaned frames of one level on their standardized
+names (County, or County / Sub county / PCN, normalised like rollup.county_key)
+and computes, for every indicator the rounds share at once, on (rows x indicators)
+matrices: before, after, change, % change, the rank in each round and the rank
+shift. An indicator change is then a column lookup. "Improved" follows the
+indicator's direction: for the LOWER_IS_BETTER indicators in scoring.py
+(stock-outs, stillbirth / maternal / neonatal deaths) a drop is an improvement and
+rank 1 is the lowest value.
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from rollup import county_key
+from scoring import LOWER_IS_BETTER
+
+ROUNDS_ENV_VAR = "PCN_ROUNDS_FILE"
+DEFAULT_ROUNDS_FILE = "rounds.json"
+LEVEL_KEYS = {'County': ['County'], 'PCN': ['County', 'Sub county', 'PCN']}
+NAME_COLUMNS = ('County', 'Sub county', 'PCN', 'pcn_location')
+CHANGE_METRICS = {'Change': 'delta', '% change': 'pct', 'Rank shift': 'rank_shift'}
+
+
+def load_rounds(path=None):
+    """{label: {'county': csv, 'pcn': csv}} in file order; {} when there is no rounds file."""
+    path = path or os.environ.get(ROUNDS_ENV_VAR, DEFAULT_ROUNDS_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as fh:
+        rounds = json.load(fh)
+    folder = os.path.dirname(os.path.abspath(path))
+    out = {}
+    for label, files in rounds.items():
+        # relative paths are relative to the rounds file
+        out[str(label)] = {level: f if os.path.isabs(f) else os.path.relpath(os.path.join(folder, f))
+                           for level, f in files.items()}
+    return out
+
+
+def lower_is_better(indicator):
+    return any(keyword.lower() in indicator.lower() for keyword in LOWER_IS_BETTER)
+
+
+def row_keys(df, columns):
+    # "county|subcounty|pcn" on normalised names; NaN when any part is missing
+    parts = [df[col].astype(object).map(county_key) for col in columns]
+    key = parts[0].astype(object)
+    for part in parts[1:]:
+        key = key + "|" + part
+    return key
+
+
+def _ranks(values, flip):
+    # rank 1 = best in the round, per column; NaN stays unranked
+    ranked = pd.DataFrame(np.where(flip, values, -values)).rank(method='min')
+    return ranked.to_numpy()
+
+
+class RoundComparison:
+    """Two rounds of one level aligned row by row; every statistic is an (rows x indicators) frame."""
+
+    def __init__(self, before_df, after_df, level):
+        self.level = level
+        self.key_columns = [c for c in LEVEL_KEYS[level] if c in before_df.columns and c in after_df.columns]
+        before_keys = row_keys(before_df, self.key_columns)
+        after_keys = row_keys(after_df, self.key_columns)
+
+        # rows with no name, or a name repeated inside one round, can't be paired
+        before_ok = before_keys.notna() & ~before_keys.duplicated(keep=False)
+        after_ok = after_keys.notna() & ~after_keys.duplicated(keep=False)
+        self.unpaired = {
+            'unnamed or repeated (before)': int((~before_ok).sum()),
+            'unnamed or repeated (after)': int((~after_ok).sum()),
+        }
+        before_pos = pd.Series(np.flatnonzero(before_ok.to_numpy()), index=before_keys[before_ok].to_numpy())
+        after_pos = pd.Series(np.flatnonzero(after_ok.to_numpy()), index=after_keys[after_ok].to_numpy())
+        common = after_pos.index.intersection(before_pos.index, sort=False)
+        self.only_before = sorted(set(before_pos.index) - set(common))
+        self.only_after = sorted(set(after_pos.index) - set(common))
+
+        def numeric(df):
+            return [c for c in df.columns if c not in NAME_COLUMNS and pd.api.types.is_numeric_dtype(df[c])]
+
+        before_cols = set(numeric(before_df))
+        self.indicators = [c for c in numeric(after_df) if c in before_cols]
+        self.dropped_indicators = sorted(before_cols.symmetric_difference(numeric(after_df)))
+
+        b_rows, a_rows = before_pos[common].to_numpy(), after_pos[common].to_numpy()
+        self.names = after_df[self.key_columns].iloc[a_rows].astype(str).reset_index(drop=True)
+        before = before_df[self.indicators].to_numpy(dtype=np.float64, na_value=np.nan)[b_rows]
+        after = after_df[self.indicators].to_numpy(dtype=np.float64, na_value=np.nan)[a_rows]
+
+        # every indicator at once
+        flip = np.array([lower_is_better(c) for c in self.indicators], dtype=bool)
+        delta = after - before
+        with np.errstate(divide='ignore', invalid='ignore'):
+            pct = np.where(before != 0, delta / np.abs(before) * 100.0, np.nan)
+        rank_before, rank_after = _ranks(before, flip), _ranks(after, flip)
+        self.flip = pd.Series(flip, index=self.indicators)
+        self.stats = {
+            name: pd.DataFrame(values, columns=self.indicators)
+            for name, values in (('before', before), ('after', after), ('delta', delta), ('pct', pct),
+                                 ('rank_before', rank_before), ('rank_after', rank_after),
+                                 ('rank_shift', rank_before - rank_after))
+        }
+        # +1 improved, -1 declined, 0 unchanged, NaN not comparable
+        self.stats['direction'] = pd.DataFrame(np.sign(np.where(flip, -delta, delta)), columns=self.indicators)
+
+    def indicator_frame(self, indicator):
+        """One row per paired county / PCN for this indicator, biggest improvement first."""
+        out = self.names.copy()
+        labels = {'before': 'Before', 'after': 'After', 'delta': 'Change', 'pct': '% change',
+                  'rank_before': 'Rank before', 'rank_after': 'Rank after', 'rank_shift': 'Rank shift'}
+        for stat, label in labels.items():
+            out[label] = self.stats[stat][indicator].to_numpy()
+        improvement = self.stats['delta'][indicator] * (-1 if self.flip[indicator] else 1)
+        return out.iloc[np.argsort(-improvement.fillna(-np.inf).to_numpy(), kind='stable')].reset_index(drop=True)
+
+    def summary(self, indicators=None):
+        """Per indicator: how many rows improved / declined / stayed the same, and the mean change."""
+        indicators = [c for c in (indicators or self.indicators) if c in self.stats['delta'].columns]
+        direction = self.stats['direction'][indicators]
+        return pd.DataFrame({
+            'Indicator': indicators,
+            'Improved': (direction > 0).sum().to_numpy(),
+            'Declined': (direction < 0).sum().to_numpy(),
+            'Unchanged': (direction == 0).sum().to_numpy(),
+            'Not comparable': direction.isna().sum().to_numpy(),
+            'Mean change': self.stats['delta'][indicators].mean().to_numpy(),
+            'Lower is better': self.flip[indicators].to_numpy(),
+        })
+
+    def report(self):
+        lines = []
+        if self.only_before:
+            lines.append(f"Only in the earlier round: {len(self.only_before)} {self.level} rows")
+        if self.only_after:
+            lines.append(f"Only in the later round: {len(self.only_after)} {self.level} rows")
+        for label, count in self.unpaired.items():
+            if count:
+                lines.append(f"{count} rows {label} were left out")
+        if self.dropped_indicators:
+            lines.append("Indicators in one round only: " + "; ".join(self.dropped_indicators))
+        return lines
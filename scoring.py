@@ -0,0 +1,197 @@
+"""
+What-if re-weighting of pillar and total scores.
+
+The pillar/indicator hierarchy in PILLAR_KEYWORDS / PCN_PILLAR_KEYWORDS is turned
+into a weight matrix W (inputs x pillars). Every pillar score for every row is
+then one matrix product: the data (missing values as 0) and its presence mask are
+stacked into a single (2n x k) matrix, so [X; M] @ W gives the weighted sums and
+the weights actually present in one go, and pillar = sum / weight present. That
+way a missing indicator drops out of its pillar instead of counting as zero. The
+total is the weighted mean of the pillar scores, with the pillar weights from the
+UI sliders.
+
+That mean doesn't reproduce the published ranking (the CSV's own total, e.g.
+"Total County Score (Total Weighted Score)", comes from weights the file doesn't
+carry), so scenarios are compared against the published total and rank when the
+table has one: published_scores() is the baseline, and compare_rankings() takes
+the rank shift over the rows both rankings cover.
+
+Two input sources:
+    'reported'   - each pillar's own "<Pillar> Score" column from the CSV (0-100)
+    'indicators' - the pillar's indicator columns, put on a 0-100 scale first:
+                   columns already inside 0-100 are used as is, anything else
+                   (counts, ratios, amounts) is min-max scaled, and the few
+                   "lower is better" indicators in LOWER_IS_BETTER are flipped.
+"""
+import numpy as np
+import pandas as pd
+
+SOURCES = ('reported', 'indicators')
+
+# substrings of indicators where a higher value is worse
+LOWER_IS_BETTER = [
+    'stock out',
+    'Stillbirth rate',
+    'maternal deaths reported',
+    'neonatal deaths per',
+]
+
+
+def _matches(col, keywords):
+    # same rule as group_columns_by_pillar
+    return any(keyword.lower() in col.lower() for keyword in keywords)
+
+
+def split_pillar_keywords(pillar_keywords):
+    """{pillar: (indicator keywords, pillar score keywords)}.
+
+    Each pillar list ends with its own score keywords: any "... Weighted Score"
+    entries, and the last plain "... Score" entry before them. Everything before
+    that is an indicator. Overall/total pillars end up with no indicators.
+    """
+    split = {}
+    for pillar, keywords in pillar_keywords.items():
+        keywords = list(keywords)
+        summary = []
+        while keywords and 'weighted score' in keywords[-1].lower():
+            summary.insert(0, keywords.pop())
+        if keywords and keywords[-1].rstrip(' :').lower().endswith('score'):
+            summary.insert(0, keywords.pop())
+        split[pillar] = (keywords, summary)
+    return split
+
+
+def reported_total_column(columns, pillar_keywords):
+    # the published overall score: a summary column of the pillar without indicators of its own
+    for indicator_kw, summary_kw in split_pillar_keywords(pillar_keywords).values():
+        if indicator_kw:
+            continue
+        for col in columns:
+            if _matches(col, summary_kw):
+                return col
+    return None
+
+
+def pillar_inputs(columns, pillar_keywords, source='reported'):
+    """{pillar: [input columns]} for pillars that have at least one input in `columns`."""
+    if source not in SOURCES:
+        raise ValueError(f"source must be one of {SOURCES}, got {source!r}")
+    inputs = {}
+    for pillar, (indicator_kw, summary_kw) in split_pillar_keywords(pillar_keywords).items():
+        if source == 'reported':
+            plain = [kw for kw in summary_kw if 'weighted score' not in kw.lower()]
+            cols = [col for col in columns if _matches(col, plain) and 'weighted' not in col.lower()]
+        else:
+            summary_cols = {col for col in columns if _matches(col, summary_kw)}
+            cols = [col for col in columns if _matches(col, indicator_kw) and col not in summary_cols]
+        if cols:
+            inputs[pillar] = cols
+    return inputs
+
+
+def to_score_scale(X, columns):
+    # X: (n, k) float array; returns a copy on a 0-100, higher-is-better scale
+    X = X.copy()
+    # all-NaN columns end up with lo=inf, hi=-inf and are left alone
+    lo = np.where(np.isnan(X), np.inf, X).min(axis=0, initial=np.inf)
+    hi = np.where(np.isnan(X), -np.inf, X).max(axis=0, initial=-np.inf)
+    outside = (lo < 0) | (hi > 100)
+    span = np.where(hi > lo, hi - lo, 1.0)
+    X[:, outside] = (X[:, outside] - lo[outside]) / span[outside] * 100
+    flip = np.array([_matches(col, LOWER_IS_BETTER) for col in columns], dtype=bool)
+    X[:, flip] = 100 - X[:, flip]
+    return X
+
+
+class ScoringEngine:
+    """Precomputes everything that doesn't depend on the weights; score() is the per-slider path."""
+
+    def __init__(self, df, pillar_keywords, key_columns, source='reported'):
+        self.source = source
+        self.key_columns = [col for col in key_columns if col in df.columns]
+        self.pillar_columns = pillar_inputs(list(df.columns), pillar_keywords, source)
+        self.pillars = list(self.pillar_columns)
+        # an indicator can sit in more than one pillar (keywords overlap); it is stored once
+        self.inputs = list(dict.fromkeys(col for cols in self.pillar_columns.values() for col in cols))
+        position = {col: i for i, col in enumerate(self.inputs)}
+
+        # membership matrix: A[i, j] = 1 when input i belongs to pillar j
+        self.membership = np.zeros((len(self.inputs), len(self.pillars)))
+        for j, pillar in enumerate(self.pillars):
+            for col in self.pillar_columns[pillar]:
+                self.membership[position[col], j] = 1.0
+
+        self.rows = df[self.key_columns].reset_index(drop=True)
+        self.total_column = reported_total_column(list(df.columns), pillar_keywords)
+        self.published_total = (df[self.total_column].to_numpy(dtype=np.float64, na_value=np.nan)
+                                if self.total_column else None)
+        X = df[self.inputs].to_numpy(dtype=np.float64, na_value=np.nan)
+        if source == 'indicators':
+            X = to_score_scale(X, self.inputs)
+        present = ~np.isnan(X)
+        self.n_rows = X.shape[0]
+        # [values with NaN as 0; presence mask] so one product gives numerators and denominators
+        self._stacked = np.vstack([np.where(present, X, 0.0), present.astype(np.float64)])
+
+    def weight_matrix(self, indicator_weights=None):
+        w = np.ones(len(self.inputs))
+        if indicator_weights:
+            for i, col in enumerate(self.inputs):
+                w[i] = indicator_weights.get(col, 1.0)
+        return self.membership * w[:, None]
+
+    def pillar_scores(self, indicator_weights=None):
+        W = self.weight_matrix(indicator_weights)
+        both = self._stacked @ W
+        sums, weight_present = both[:self.n_rows], both[self.n_rows:]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(weight_present > 0, sums / weight_present, np.nan)
+
+    def total_scores(self, pillar_scores, pillar_weights=None):
+        pw = np.array([1.0 if not pillar_weights else pillar_weights.get(p, 1.0) for p in self.pillars])
+        present = ~np.isnan(pillar_scores)
+        weight_present = present @ pw
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(weight_present > 0, np.where(present, pillar_scores, 0.0) @ pw / weight_present, np.nan)
+
+    def score(self, pillar_weights=None, indicator_weights=None):
+        """Key columns, one column per pillar, Total and Rank (1 = best)."""
+        pillars = self.pillar_scores(indicator_weights)
+        total = self.total_scores(pillars, pillar_weights)
+        out = self.rows.copy()
+        out[self.pillars] = pillars
+        out['Total'] = total
+        out['Rank'] = rank_desc(total)
+        return out
+
+
+    def published_scores(self):
+        """Key columns, the table's published Total and its Rank; None when the table has no total column."""
+        if self.published_total is None:
+            return None
+        out = self.rows.copy()
+        out['Total'] = self.published_total
+        out['Rank'] = rank_desc(self.published_total)
+        return out
+
+
+def rank_desc(values):
+    # competition ranking (1, 2, 2, 4), highest first; NaN stays unranked
+    return pd.Series(values).rank(ascending=False, method='min').to_numpy()
+
+
+def compare_rankings(baseline, scenario, key_columns, label='Baseline'):
+    """Scenario table with the baseline total/rank next to it and the rank shift (positive = moved up).
+
+    The shift ranks both totals again over the rows that have both, so rows missing from
+    one ranking don't move everyone else; it is NaN for the other rows.
+    """
+    merged = scenario[key_columns + ['Total', 'Rank']].copy()
+    merged[f'{label} Total'] = baseline['Total'].to_numpy()
+    merged[f'{label} Rank'] = baseline['Rank'].to_numpy()
+    both = (merged['Total'].notna() & merged[f'{label} Total'].notna()).to_numpy()
+    shift = np.full(len(merged), np.nan)
+    shift[both] = rank_desc(merged[f'{label} Total'].to_numpy()[both]) - rank_desc(merged['Total'].to_numpy()[both])
+    merged['Rank Shift'] = shift
+    merged = merged.dropna(subset=['Total'])
+    return merged.sort_values('Rank', kind='stable')
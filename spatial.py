@@ -0,0 +1,237 @@
+"""
+County / subcounty adjacency and spatial autocorrelation (Moran's I).
+
+    python spatial.py [--levels adm1 adm2] [--out geometry]
+
+builds, for each level's shapefile, which polygons share a border: one STRtree
+query of every polygon against all the others with the `touches` predicate (plus
+`overlaps`, so neighbours whose digitised borders overlap by a sliver still count),
+keyed on the same standardized names as the maps (County_Name_Key /
+Subcounty_Name_Key). The graph is stored as a compressed sparse row matrix,
+(indptr, indices) in numpy arrays, in <out>/adjacency_<level>.npz with the
+shapefile's data_version. The dashboard only ever loads that file: building the
+STRtree means geopandas and the shapefile, several seconds that don't belong in a
+request, so without an up-to-date file the hotspot outlines are off.
+
+SpatialWeights row-standardizes it, so the spatial lag of a value (the mean over a
+polygon's neighbours) is one gather plus np.add.reduceat over the edges, for one
+vector or for a whole stack of permutations at once. On top of it:
+
+    global_morans_i   I for one indicator, with a permutation p-value
+    local_morans_i    LISA per polygon: I_i, a permutation p-value and the quadrant,
+                      High-High = hotspot, Low-Low = coldspot, High-Low / Low-High
+                      = outliers; "Not significant" above the p-value threshold
+
+Polygons with no value (or no neighbour with a value) are left out of the statistics.
+Permutations shuffle all the other values, rather than conditioning on each
+polygon's own value, so one pass of matrix work serves every polygon.
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from disk_cache import data_version
+from geo_partitions import partition_dir
+from pcn_data import standardize_name
+
+ADJACENCY_LEVELS = {
+    'adm1': {'shape': "ken_admbnda_adm1_iebc_20191031.shp", 'name': 'ADM1_EN'},
+    'adm2': {'shape': "ken_admbnda_adm2_iebc_20191031.shp", 'name': 'ADM2_EN'},
+}
+PERMUTATIONS = 999
+SIGNIFICANCE = 0.05
+QUADRANTS = {1: 'High-High', 2: 'Low-High', 3: 'Low-Low', 4: 'High-Low'}
+HOTSPOT, COLDSPOT = 'High-High', 'Low-Low'
+NOT_SIGNIFICANT = 'Not significant'
+
+
+def adjacency_path(level, out_dir=None):
+    return os.path.join(out_dir or partition_dir(), f"adjacency_{level}.npz")
+
+
+def adjacency_pairs(geoms):
+    """(i, j) index arrays of every pair of polygons that share a border, both directions, no self pairs."""
+    import shapely
+
+    tree = shapely.STRtree(geoms)
+    pairs = [tree.query(geoms, predicate=predicate) for predicate in ('touches', 'overlaps')]
+    i, j = np.concatenate([p[0] for p in pairs]), np.concatenate([p[1] for p in pairs])
+    keep = i != j
+    # symmetric and without duplicates, whatever each predicate returned
+    edges = np.unique(np.concatenate([np.stack([i[keep], j[keep]]), np.stack([j[keep], i[keep]])], axis=1), axis=1)
+    return edges[0], edges[1]
+
+
+def build_adjacency(level, shape=None):
+    """(keys, indptr, indices) for a level's shapefile; polygons with the same name are merged. None if no shapefile."""
+    import geopandas as gpd
+
+    spec = ADJACENCY_LEVELS[level]
+    shape = shape or spec['shape']
+    if not os.path.exists(shape):
+        return None
+    gdf = gpd.read_file(shape)
+    names = gdf[spec['name']].map(standardize_name).to_numpy(dtype=object)
+    i, j = adjacency_pairs(gdf.geometry.to_numpy())
+
+    keys, node = np.unique(names.astype(str), return_inverse=True)
+    a, b = node[i], node[j]
+    keep = a != b
+    edges = np.unique(np.stack([a[keep], b[keep]]), axis=1)
+    indptr = np.searchsorted(edges[0], np.arange(len(keys) + 1)).astype(np.int64)
+    return keys, indptr, edges[1].astype(np.int64)
+
+
+def save_adjacency(level, out_dir=None, shape=None):
+    shape = shape or ADJACENCY_LEVELS[level]['shape']
+    built = build_adjacency(level, shape)
+    if built is None:
+        return None
+    keys, indptr, indices = built
+    path = adjacency_path(level, out_dir)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp.npz"
+    np.savez(tmp_path, keys=keys.astype(str), indptr=indptr, indices=indices, source=np.array(data_version(shape)))
+    os.replace(tmp_path, path)
+    return SpatialWeights(keys, indptr, indices)
+
+
+def load_adjacency(level, out_dir=None, shape=None):
+    """SpatialWeights from the prebuilt file; None when it is missing or older than the shapefile."""
+    shape = shape or ADJACENCY_LEVELS[level]['shape']
+    path = adjacency_path(level, out_dir)
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        if os.path.exists(shape) and str(data['source']) != data_version(shape):
+            return None
+        return SpatialWeights(data['keys'].astype(object), data['indptr'], data['indices'])
+
+
+class SpatialWeights:
+    """Row-standardized contiguity weights over named polygons, stored as CSR arrays."""
+
+    def __init__(self, keys, indptr, indices):
+        self.keys = np.asarray(keys, dtype=object)
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.neighbours = np.diff(self.indptr)
+        self.rows = np.repeat(np.arange(len(self.keys)), self.neighbours)
+        self._position = {key: i for i, key in enumerate(self.keys)}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def subset(self, keep):
+        """Weights restricted to the polygons where keep is True (edges to dropped polygons go)."""
+        keep = np.asarray(keep, dtype=bool)
+        new_index = np.cumsum(keep) - 1
+        edge_ok = keep[self.rows] & keep[self.indices]
+        rows, cols = new_index[self.rows[edge_ok]], new_index[self.indices[edge_ok]]
+        indptr = np.searchsorted(rows, np.arange(int(keep.sum()) + 1))
+        return SpatialWeights(self.keys[keep], indptr, cols)
+
+    def align(self, keys, values):
+        """One value per polygon, in weight order (mean when several rows share a polygon; NaN when none)."""
+        frame = pd.DataFrame({'key': np.asarray(keys, dtype=object), 'value': np.asarray(values, dtype=np.float64)})
+        means = frame.dropna().groupby('key')['value'].mean()
+        return means.reindex(self.keys).to_numpy(dtype=np.float64)
+
+    def lag(self, values):
+        """Mean of each polygon's neighbours, for a vector (n,) or a stack (p, n); 0 for polygons with none."""
+        values = np.asarray(values, dtype=np.float64)
+        gathered = values[..., self.indices]
+        out = np.zeros(values.shape)
+        has = self.neighbours > 0
+        if gathered.shape[-1]:
+            sums = np.add.reduceat(gathered, self.indptr[:-1][has], axis=-1)
+            out[..., has] = sums / self.neighbours[has]
+        return out
+
+
+def _usable(weights, values):
+    # the polygons with a value and at least one neighbour that has one
+    values = np.asarray(values, dtype=np.float64)
+    observed = ~np.isnan(values)
+    sub = weights.subset(observed)
+    has = sub.neighbours > 0
+    while not has.all():
+        observed_idx = np.flatnonzero(observed)
+        observed[observed_idx[~has]] = False
+        sub = weights.subset(observed)
+        has = sub.neighbours > 0
+    return sub, values[observed], observed
+
+
+def global_morans_i(weights, values, permutations=PERMUTATIONS, seed=0):
+    """{'I', 'expected', 'p_value', 'n'}; NaNs when fewer than 3 polygons can be compared."""
+    sub, x, _ = _usable(weights, values)
+    n = len(x)
+    result = {'I': np.nan, 'expected': -1.0 / (n - 1) if n > 1 else np.nan, 'p_value': np.nan, 'n': n}
+    if n < 3:
+        return result
+    z = x - x.mean()
+    denominator = (z * z).sum()
+    if denominator == 0:
+        return result
+    # row-standardized weights sum to n, so I = sum(z * lag(z)) / sum(z^2)
+    observed = (z * sub.lag(z)).sum() / denominator
+    rng = np.random.default_rng(seed)
+    shuffled = rng.permuted(np.broadcast_to(z, (permutations, n)), axis=1)
+    simulated = (shuffled * sub.lag(shuffled)).sum(axis=1) / denominator
+    extreme = np.abs(simulated - simulated.mean()) >= abs(observed - simulated.mean())
+    result.update(I=float(observed), p_value=float((extreme.sum() + 1) / (permutations + 1)))
+    return result
+
+
+def local_morans_i(weights, values, permutations=PERMUTATIONS, seed=0, significance=SIGNIFICANCE):
+    """One row per polygon: value, spatial lag, I_i, p-value and cluster (quadrant or "Not significant")."""
+    sub, x, observed_mask = _usable(weights, values)
+    out = pd.DataFrame({'key': weights.keys, 'value': np.asarray(values, dtype=np.float64)})
+    out['lag'], out['I'], out['p_value'] = np.nan, np.nan, np.nan
+    out['cluster'] = NOT_SIGNIFICANT
+    n = len(x)
+    if n < 3 or np.all(x == x[0]):
+        return out
+    z = (x - x.mean()) / x.std()
+    lag = sub.lag(z)
+    local = z * lag
+
+    rng = np.random.default_rng(seed)
+    shuffled = rng.permuted(np.broadcast_to(z, (permutations, n)), axis=1)
+    simulated = z * sub.lag(shuffled)
+    # folded: as or more extreme than observed, on the observed side
+    more = np.where(local >= 0, simulated >= local, simulated <= local).sum(axis=0)
+    p_value = (more + 1) / (permutations + 1)
+
+    quadrant = np.where(z > 0, np.where(lag > 0, 1, 4), np.where(lag > 0, 2, 3))
+    cluster = np.where(p_value <= significance, pd.Series(quadrant).map(QUADRANTS).to_numpy(), NOT_SIGNIFICANT)
+    rows = np.flatnonzero(observed_mask)
+    out.loc[rows, 'lag'] = lag * x.std() + x.mean()
+    out.loc[rows, 'I'] = local
+    out.loc[rows, 'p_value'] = p_value
+    out.loc[rows, 'cluster'] = cluster
+    return out
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--levels", nargs="+", default=list(ADJACENCY_LEVELS), choices=list(ADJACENCY_LEVELS))
+    parser.add_argument("--out", default=partition_dir(), help="output folder (default: geometry)")
+    args = parser.parse_args(argv[1:])
+
+    for level in args.levels:
+        weights = save_adjacency(level, args.out)
+        if weights is None:
+            print(f"{level}: {ADJACENCY_LEVELS[level]['shape']} not found, skipped")
+            continue
+        islands = int((weights.neighbours == 0).sum())
+        print(f"{level}: {len(weights)} polygons, {len(weights.indices) // 2} shared borders, {islands} without neighbours"
+              f" -> {adjacency_path(level, args.out)}")
+
+
+if __name__ == "__main__":
+    main(sys.argv)
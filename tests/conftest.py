@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the dashboard's modules sit at the repo root, next to the scripts
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
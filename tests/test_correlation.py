@@ -0,0 +1,61 @@
+"""
+The vectorized pairwise correlation against DataFrame.corr.
+
+Pearson uses the rows both columns report, exactly like pandas. Spearman ranks
+each column once over all of its values, so it only matches pandas when the
+columns are missing on the same rows.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from correlation import correlation_frames, pairwise_corr, strongest_pairs
+
+
+@pytest.fixture
+def frame():
+    rng = np.random.default_rng(7)
+    base = rng.normal(size=40)
+    df = pd.DataFrame({
+        "a": base,
+        "b": base * 2 + rng.normal(scale=0.5, size=40),
+        "c": -base + rng.normal(scale=2.0, size=40),
+        "d": rng.normal(size=40),
+    })
+    df.loc[[1, 5, 9], "b"] = np.nan
+    df.loc[[2, 5, 30, 31], "c"] = np.nan
+    return df
+
+
+def test_pearson_matches_pandas(frame):
+    corr, counts = correlation_frames(frame)
+    pd.testing.assert_frame_equal(corr, frame.corr(min_periods=3), atol=1e-12)
+    assert counts.loc["b", "c"] == 40 - 6
+    assert counts.loc["a", "a"] == 40
+
+
+def test_spearman_matches_pandas_without_gaps(frame):
+    full = frame.fillna(0.0)
+    corr, _ = correlation_frames(full, method="spearman")
+    pd.testing.assert_frame_equal(corr, full.corr(method="spearman"), atol=1e-12)
+
+
+def test_too_few_rows_or_no_variance_is_nan():
+    X = np.array([[1.0, 5.0, 1.0], [2.0, 5.0, np.nan], [3.0, 5.0, np.nan], [4.0, 5.0, 2.0]])
+    r, n = pairwise_corr(X, min_periods=3)
+    assert np.isnan(r[0, 1])  # column 1 is constant
+    assert np.isnan(r[0, 2]) and n[0, 2] == 2
+    assert r[0, 0] == pytest.approx(1.0)
+
+
+def test_unknown_method():
+    with pytest.raises(ValueError):
+        pairwise_corr(np.zeros((3, 2)), method="kendall")
+
+
+def test_strongest_pairs(frame):
+    corr, counts = correlation_frames(frame)
+    pairs = strongest_pairs(corr, counts, top=3)
+    assert len(pairs) == 3
+    assert (pairs["Indicator A"].iloc[0], pairs["Indicator B"].iloc[0]) == ("a", "b")
+    assert pairs["r"].abs().is_monotonic_decreasing
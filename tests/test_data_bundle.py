@@ -0,0 +1,95 @@
+"""
+Bundle round trip: what comes back out of the mapped file is what went in.
+
+Built from copies of the repo's CSVs; the geometry loaders are swapped for a tiny
+feature collection (and a failing loader), so no shapefile is read.
+"""
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import data_bundle
+from data_bundle import DataBundle, build_bundle
+from hierarchy import PCNHierarchy
+from pcn_data import PILLAR_KEYWORDS, group_columns_by_pillar, read_county_csv, read_pcn_csv
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GEOJSON = {"type": "FeatureCollection", "features": [{"type": "Feature", "id": "Kakamega", "properties": {},
+                                                      "geometry": {"type": "Point", "coordinates": [34.7, 0.3]}}]}
+
+
+def no_shapefile(path):
+    raise OSError(f"{path} not found")
+
+
+@pytest.fixture
+def built(tmp_path, monkeypatch):
+    monkeypatch.setattr(data_bundle, "county_geojson", lambda path: GEOJSON)
+    monkeypatch.setattr(data_bundle, "subcounty_geojson", no_shapefile)
+    sources = {}
+    for name in ("county_lvl_data.csv", "pcn_lvl_data.csv"):
+        sources[name] = str(tmp_path / name)
+        shutil.copyfile(os.path.join(REPO, name), sources[name])
+    args = (sources["county_lvl_data.csv"], sources["pcn_lvl_data.csv"], "adm1.shp", "adm2.shp")
+    path = str(tmp_path / "test.bundle")
+    build_bundle(path, *args)
+    return DataBundle(path), args
+
+
+def test_frames_round_trip(built):
+    bundle, (county_csv, pcn_csv, _, _) = built
+    for level, reader in (("county", read_county_csv), ("pcn", read_pcn_csv)):
+        expected, report = reader(county_csv if level == "county" else pcn_csv)
+        df = bundle.frame(level)
+        assert list(df.columns) == list(expected.columns)
+        assert df.index.tolist() == expected.index.tolist()
+        for col in df.columns:
+            if isinstance(df[col].dtype, pd.CategoricalDtype):
+                pd.testing.assert_series_equal(df[col].astype(object), expected[col].astype(object), check_names=False)
+            else:
+                np.testing.assert_array_equal(df[col].to_numpy(), expected[col].to_numpy(dtype=np.float64))
+        assert bundle.schema_report(level) == report
+
+
+def test_frames_are_views_of_the_mapping(built):
+    bundle, _ = built
+    mapped = np.frombuffer(bundle._map, dtype=np.uint8)
+    pillars = bundle.pillar_frames("county")
+    assert bundle.pillar_frames("county") is pillars
+    expected = group_columns_by_pillar(read_county_csv(os.path.join(REPO, "county_lvl_data.csv"))[0], PILLAR_KEYWORDS)
+    assert {p: list(df.columns) for p, df in pillars.items()} == {p: list(df.columns) for p, df in expected.items()}
+    for df in list(pillars.values()) + [bundle.frame("pcn")]:
+        for col in df.columns:
+            if df[col].dtype.kind == "f":
+                assert np.shares_memory(df[col].to_numpy(), mapped), col
+
+
+def test_hierarchy_round_trip(built):
+    bundle, (_, pcn_csv, _, _) = built
+    expected = PCNHierarchy(read_pcn_csv(pcn_csv)[0])
+    hierarchy = bundle.hierarchy()
+    assert hierarchy.paths() == expected.paths()
+    for path in expected.paths()[:50]:
+        np.testing.assert_array_equal(hierarchy.positions(*path), expected.positions(*path))
+
+
+def test_geometry_and_staleness(built):
+    bundle, (county_csv, pcn_csv, county_shape, subcounty_shape) = built
+    assert bundle.geojson("county") == GEOJSON
+    # a loader that failed at build time leaves the map out instead of failing the bundle
+    assert bundle.geojson("subcounty") is None
+    assert bundle.header["geometry"]["subcounty"]["error"].endswith("not found")
+    assert bundle.matches(county_csv, pcn_csv, county_shape, subcounty_shape)
+    with open(pcn_csv, "a", encoding="ISO-8859-1") as fh:
+        fh.write("\n")
+    assert not bundle.matches(county_csv, pcn_csv, county_shape, subcounty_shape)
+
+
+def test_not_a_bundle(tmp_path):
+    path = tmp_path / "other.bin"
+    path.write_bytes(b"NOTABNDL" + b"\0" * 64)
+    with pytest.raises(ValueError):
+        DataBundle(str(path))
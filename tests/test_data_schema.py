@@ -0,0 +1,74 @@
+"""
+Typed CSV reads against a declared schema, and the drift report they return.
+"""
+import os
+
+import numpy as np
+import pytest
+
+from data_schema import clean_header, format_drift_report, has_drift, read_with_schema
+from pcn_data import read_county_csv, read_pcn_csv, standardize_name
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCHEMA = {
+    'encoding': 'ISO-8859-1',
+    'nrows': None,
+    'text_columns': ['County', 'PCN'],
+    'numeric_columns': ['Coverage', 'Budget', 'Missing Score'],
+    'drop_columns': ['GOVERNANCE'],
+    'aliases': {'PCN Name': 'PCN'},
+}
+
+
+def write_csv(tmp_path, text):
+    path = tmp_path / "data.csv"
+    path.write_bytes(text.encode('ISO-8859-1'))
+    return str(path)
+
+
+def test_clean_header():
+    assert clean_header("Coverage\xa0 of\n PCNs \x85") == "Coverage of PCNs"
+
+
+def test_typed_read(tmp_path):
+    path = write_csv(tmp_path, "County,PCN Name,GOVERNANCE,Coverage,Budget,New indicator\n"
+                               " Kakamega ,Shinyalu,,50,#DIV/0!,1\n"
+                               "Nairobi,Njiru,,N/A,20.5,2\n")
+    df, report = read_with_schema(path, SCHEMA)
+    assert list(df.columns) == ['County', 'PCN', 'Coverage', 'Budget', 'New indicator']
+    assert df['County'].tolist() == ['Kakamega', 'Nairobi']
+    assert df['Coverage'].dtype == np.float64
+    np.testing.assert_allclose(df['Coverage'], [50.0, np.nan])
+    np.testing.assert_allclose(df['Budget'], [np.nan, 20.5])
+    assert report['aliased'] == {'PCN Name': 'PCN'}
+    assert report['unexpected'] == ['New indicator']
+    assert report['missing'] == ['Missing Score']
+    assert report['coerced'] == {}
+    assert has_drift(report)
+
+
+def test_non_numeric_values_are_blanked_and_reported(tmp_path):
+    path = write_csv(tmp_path, "County,PCN,Coverage,Budget,Missing Score\n"
+                               "Kakamega,Shinyalu,50,pending,1\n"
+                               "Nairobi,Njiru,60,20,2\n")
+    df, report = read_with_schema(path, SCHEMA)
+    np.testing.assert_allclose(df['Budget'], [np.nan, 20.0])
+    np.testing.assert_allclose(df['Coverage'], [50.0, 60.0])
+    assert report['coerced'] == {'Budget': ['pending']}
+    assert format_drift_report(report) == ["Non-numeric values blanked in 'Budget': 'pending'"]
+
+
+def test_standardize_name():
+    assert standardize_name("nairobi  city") == "Nairobi"
+    assert standardize_name("Kakamega-County") == "Kakamega"
+    assert standardize_name("Mumias East Sub County") == "Mumias East"
+    assert standardize_name(np.nan) is np.nan
+
+
+@pytest.mark.parametrize("reader, name", [(read_county_csv, "county_lvl_data.csv"), (read_pcn_csv, "pcn_lvl_data.csv")])
+def test_repo_csvs_match_their_schema(reader, name):
+    df, report = reader(os.path.join(REPO, name))
+    assert len(df)
+    assert not report['missing'], report['missing']
+    assert not report['coerced'], report['coerced']
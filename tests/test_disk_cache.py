@@ -0,0 +1,170 @@
+"""
+When make_key changes, and when it must not.
+
+A key covers the function (module, name, source), every argument except the
+"_"-prefixed ones, the size/mtime of any argument that is an existing file
+(shapefile sidecars included) and the code version of the modules next to
+disk_cache.py. The backends treat anything they can't unpickle as a miss, and a
+hit only writes its "last used" stamp once that is TOUCH_SECONDS old.
+"""
+import inspect
+import os
+import sqlite3
+import sys
+
+import pandas as pd
+import pytest
+
+import disk_cache
+from disk_cache import FileCache, SQLiteCache, code_version, data_version, disk_cached, make_key
+
+
+def load(source, level=1, _geometry=None):
+    return source, level
+
+
+def other(source, level=1, _geometry=None):
+    return source, level
+
+
+def key(func=load, **arguments):
+    bound = inspect.signature(func).bind(**arguments)
+    bound.apply_defaults()
+    return make_key(func, bound.arguments)
+
+
+@pytest.fixture(autouse=True)
+def fresh_code_version():
+    # code_version is memoised per process; tests that change it mustn't leak into the others
+    yield
+    code_version.cache_clear()
+
+
+def touch(path, text, mtime_ns):
+    with open(path, "w") as fh:
+        fh.write(text)
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_arguments_change_the_key():
+    assert key(source="a.csv") == key(source="a.csv")
+    assert key(source="a.csv") != key(source="b.csv")
+    assert key(source="a.csv") != key(source="a.csv", level=2)
+    # a default spelled out gives the same key as leaving it out
+    assert key(source="a.csv") == key(source="a.csv", level=1)
+
+
+def test_underscore_arguments_are_skipped():
+    assert key(source="a.csv", _geometry={"big": "geojson"}) == key(source="a.csv", _geometry=None)
+
+
+def test_function_identity_changes_the_key():
+    assert key(load, source="a.csv") != key(other, source="a.csv")
+
+
+def test_frames_hash_by_content():
+    df = pd.DataFrame({"County": ["Kakamega"], "Score": [1.0]})
+    assert key(source=df) == key(source=df.copy())
+    assert key(source=df) != key(source=df.assign(Score=2.0))
+    assert key(source=df) != key(source=df.rename(columns={"Score": "Total"}))
+    assert key(source=df) != key(source=df.astype({"Score": "float32"}))
+
+
+def test_file_changes_change_the_key(tmp_path):
+    path = str(tmp_path / "county_lvl_data.csv")
+    touch(path, "County\n", 1_000_000_000)
+    before = key(source=path)
+    assert key(source=path) == before
+    touch(path, "County\n", 2_000_000_000)
+    after_mtime = key(source=path)
+    assert after_mtime != before
+    touch(path, "County,Score\n", 2_000_000_000)
+    assert key(source=path) != after_mtime
+
+
+def test_shapefile_sidecars_change_the_key(tmp_path):
+    shp = str(tmp_path / "counties.shp")
+    touch(shp, "shp", 1_000_000_000)
+    touch(str(tmp_path / "counties.dbf"), "dbf", 1_000_000_000)
+    before, version = key(source=shp), data_version(shp)
+    touch(str(tmp_path / "counties.dbf"), "dbf, edited", 1_000_000_000)
+    assert key(source=shp) != before
+    assert data_version(shp) != version
+
+
+def test_code_version(tmp_path, monkeypatch):
+    (tmp_path / "pcn_data.py").write_text("A = 1\n")
+    first = code_version(str(tmp_path))
+    (tmp_path / "pcn_data.py").write_text("A = 2\n")
+    code_version.cache_clear()
+    assert code_version(str(tmp_path)) != first
+    (tmp_path / "pcn_data.py").write_text("A = 1\n")
+    code_version.cache_clear()
+    assert code_version(str(tmp_path)) == first
+    monkeypatch.setattr(disk_cache, "CACHE_VERSION", disk_cache.CACHE_VERSION + 1)
+    code_version.cache_clear()
+    assert code_version(str(tmp_path)) != first
+
+
+def test_code_version_is_part_of_the_key(monkeypatch):
+    before = key(source="a.csv")
+    monkeypatch.setattr(disk_cache, "code_version", lambda: "edited")
+    assert key(source="a.csv") != before
+
+
+def test_disk_cached_round_trip(tmp_path):
+    calls = []
+
+    @disk_cached
+    def double(x, _unhashed=None):
+        calls.append(x)
+        return x * 2
+
+    disk_cache.set_backend(FileCache(str(tmp_path), 1024 * 1024))
+    try:
+        assert double(2) == 4 and double(2, _unhashed=object()) == 4
+        assert calls == [2]
+        assert double(3) == 6
+        assert calls == [2, 3]
+    finally:
+        disk_cache.set_backend(None)
+
+
+def accessed(cache, key):
+    conn = sqlite3.connect(cache.path)
+    try:
+        return conn.execute("SELECT accessed FROM artifacts WHERE key = ?", (key,)).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_sqlite_hits_only_touch_stale_stamps(tmp_path, monkeypatch):
+    cache = SQLiteCache(str(tmp_path), 1024 * 1024)
+    cache.set("k", {"a": 1})
+    stamp = accessed(cache, "k")
+    assert cache.get("k") == {"a": 1}
+    assert accessed(cache, "k") == stamp
+    monkeypatch.setattr(disk_cache, "TOUCH_SECONDS", -1)
+    assert cache.get("k") == {"a": 1}
+    assert accessed(cache, "k") > stamp
+
+
+class Renamed:
+    pass
+
+
+def test_unreadable_entries_are_misses(tmp_path, monkeypatch):
+    files = FileCache(str(tmp_path / "files"), 1024 * 1024)
+    db = SQLiteCache(str(tmp_path / "sqlite"), 1024 * 1024)
+    for cache in (files, db):
+        cache.set("gone", Renamed())
+        cache.set("k", {"a": 1})
+    # the class was renamed since the entry was written: AttributeError, not UnpicklingError
+    monkeypatch.delattr(sys.modules[__name__], "Renamed")
+    assert files.get("gone") is disk_cache._MISSING
+    assert db.get("gone") is disk_cache._MISSING
+    assert files.get("absent") is disk_cache._MISSING
+
+    with open(files._path("k"), "wb") as fh:
+        fh.write(b"\x80\x04truncated")
+    assert files.get("k") is disk_cache._MISSING
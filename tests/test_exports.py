@@ -0,0 +1,81 @@
+"""
+Export files: what each writer produces, the on-disk reuse and the size cap.
+
+The writers go chunk by chunk, so the tests use a chunk smaller than the frame to
+check the pieces join up into the same file a one-shot write gives.
+"""
+import io
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import exports
+from exports import export_callable, export_file, export_key, export_name, selection_frame, too_large, write_csv
+
+FRAME = pd.DataFrame({
+    "County": pd.Categorical(["Kakamega", "Nairobi", None, "Kisumu", "Nairobi"]),
+    "PCN": ["Shinyalu", "Njiru", "Lost", "Kisumu East", "Embakasi"],
+    "Coverage": [50.0, np.nan, 12.5, 70.0, 1.0],
+})
+SELECTION = {"level": "pcn", "county": "All", "pillar": "1. Governance"}
+
+
+def test_csv_in_chunks_matches_one_write():
+    fh = io.BytesIO()
+    write_csv(FRAME, fh, chunk_rows=2)
+    assert fh.getvalue().decode("utf-8") == FRAME.to_csv(index=False)
+    empty = io.BytesIO()
+    write_csv(FRAME.iloc[:0], empty)
+    assert empty.getvalue().decode("utf-8") == "County,PCN,Coverage\n"
+
+
+def test_parquet_round_trip(tmp_path):
+    pytest.importorskip("pyarrow")
+    path = export_file(FRAME, SELECTION, "Parquet", "v1", folder=str(tmp_path))
+    pd.testing.assert_frame_equal(pd.read_parquet(path), FRAME)
+
+
+def test_xlsx_round_trip(tmp_path):
+    pytest.importorskip("openpyxl")
+    path = export_file(FRAME, SELECTION, "Excel", "v1", folder=str(tmp_path))
+    back = pd.read_excel(path, sheet_name="data")
+    assert back["PCN"].tolist() == FRAME["PCN"].tolist()
+    assert back["County"].isna().tolist() == FRAME["County"].isna().tolist()
+    np.testing.assert_allclose(back["Coverage"], FRAME["Coverage"])
+
+
+def test_files_are_reused_until_the_version_changes(tmp_path):
+    folder = str(tmp_path)
+    first = export_file(FRAME, SELECTION, "CSV", "v1", folder=folder)
+    # a different frame under the same key is not rewritten: the key stands for the data
+    assert export_file(FRAME.iloc[:1], SELECTION, "CSV", "v1", folder=folder) == first
+    assert open(first, "rb").read().decode("utf-8") == FRAME.to_csv(index=False)
+    assert export_file(FRAME, SELECTION, "CSV", "v2", folder=folder) != first
+    assert export_key(SELECTION, "CSV", "v1") == export_key(dict(reversed(list(SELECTION.items()))), "CSV", "v1")
+    assert not [name for name in os.listdir(folder) if name.endswith(".tmp")]
+
+
+def test_old_files_are_evicted(tmp_path, monkeypatch):
+    monkeypatch.setattr(exports, "EXPORT_MAX_FILES", 2)
+    for version in ("v1", "v2", "v3"):
+        export_file(FRAME, SELECTION, "CSV", version, folder=str(tmp_path))
+    assert len(os.listdir(tmp_path)) == 2
+
+
+def test_callable_returns_the_file_and_respects_the_cap(tmp_path, monkeypatch):
+    monkeypatch.setenv("PCN_CACHE_DIR", str(tmp_path))
+    build = export_callable(FRAME, SELECTION, "CSV", "v1")
+    assert build() == FRAME.to_csv(index=False).encode("utf-8")
+    assert not too_large(FRAME)
+    monkeypatch.setenv(exports.MAX_MB_ENV_VAR, "0.00001")
+    assert too_large(FRAME)
+    with pytest.raises(ValueError, match="limit"):
+        build()
+
+
+def test_names_and_columns():
+    assert export_name(SELECTION, "Excel") == "pcn_1__Governance.xlsx"
+    assert export_name({"county": "All"}, "CSV") == "export.csv"
+    assert list(selection_frame(FRAME, ["PCN", "Coverage", "PCN", "Missing"]).columns) == ["PCN", "Coverage"]
@@ -0,0 +1,64 @@
+"""
+Partition index lookups and map views on a hand-written index: two counties, one
+file each, plus a national file. No shapefile is needed; the index's source only
+has to match when the shapefile exists, and the test's doesn't.
+"""
+import json
+
+import pytest
+
+from geo_partitions import (bbox_view, features_bbox, file_stem, load_national, load_partition,
+                            partition_index)
+
+LEVEL = "adm2"
+SHAPE = "no_such_shapefile.shp"
+SQUARE = {"type": "Feature", "geometry": {"type": "Polygon", "coordinates": [[[36, -1], [37, -1], [37, 0], [36, 0], [36, -1]]]}}
+POINTS = {"type": "Feature", "geometry": {"type": "MultiPoint", "coordinates": [[34.5, 2.0], [35.0, -4.5]]}}
+
+
+@pytest.fixture
+def out_dir(tmp_path):
+    folder = tmp_path / LEVEL
+    folder.mkdir()
+    counties = {"Nairobi": {"file": "nairobi.geojson", "features": 1, "bbox": [36, -1, 37, 0]}}
+    index = {"source": "test", "tolerance": 0.001, "counties": counties,
+             "national": {"file": "_national.geojson", "features": 2, "bbox": [34.5, -4.5, 37, 2]}}
+    (folder / "index.json").write_text(json.dumps(index))
+    (folder / "nairobi.geojson").write_text(json.dumps({"type": "FeatureCollection", "features": [SQUARE]}))
+    (folder / "_national.geojson").write_text(json.dumps({"type": "FeatureCollection", "features": [SQUARE, POINTS]}))
+    return str(tmp_path)
+
+
+def test_file_stem():
+    assert file_stem("Elgeyo/Marakwet") == "elgeyo_marakwet"
+    assert file_stem("Murang'a") == "murang_a"
+    assert file_stem("--") == "unknown"
+
+
+def test_index_and_files(out_dir):
+    index = partition_index(LEVEL, out_dir, shape=SHAPE)
+    assert list(index["counties"]) == ["Nairobi"]
+    assert load_partition(index, LEVEL, "Nairobi", out_dir)["features"] == [SQUARE]
+    assert load_partition(index, LEVEL, "Mombasa", out_dir) is None
+    assert len(load_national(index, LEVEL, out_dir)["features"]) == 2
+    # nothing built: no index, and the loaders take None
+    assert partition_index("adm3", out_dir, shape=SHAPE) is None
+    assert load_partition(None, LEVEL, "Nairobi", out_dir) is None
+    assert load_national(None, LEVEL, out_dir) is None
+
+
+def test_features_bbox():
+    assert features_bbox([SQUARE]) == [36.0, -1.0, 37.0, 0.0]
+    # nested rings and flat point lists both count, features without geometry don't
+    assert features_bbox([SQUARE, POINTS, {"type": "Feature", "geometry": None}]) == [34.5, -4.5, 37.0, 2.0]
+    assert features_bbox([]) is None
+
+
+def test_bbox_view():
+    center, zoom = bbox_view([36, -1, 37, 0])
+    assert center == {"lat": -0.5, "lon": 36.5}
+    # a one-degree box fits at log2(400) - 0.3
+    assert zoom == pytest.approx(8.34, abs=0.01)
+    # a point doesn't zoom past max_zoom, the whole country doesn't zoom out past min_zoom
+    assert bbox_view([36.8, -1.3, 36.8, -1.3])[1] == 11.0
+    assert bbox_view([-180, -90, 180, 90])[1] == 4.5
@@ -0,0 +1,62 @@
+"""
+County -> Subcounty -> PCN lookups on a small PCN table.
+
+"All" at a level means everything under the level above; a PCN picked with the
+subcounty on "All" is found whichever subcounty it sits in.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from hierarchy import ALL, PCNHierarchy
+
+FRAME = pd.DataFrame({
+    "County": ["Kakamega", "Kakamega", "Kakamega", "Nairobi", "Nairobi", None],
+    "Sub county": ["Lurambi", "Lurambi", "Mumias", "Embakasi", "Embakasi", "Unknown"],
+    "PCN": ["Shinyalu", "Butsotso", "Mumias East", "Njiru", "Njiru", "Lost"],
+})
+
+
+@pytest.fixture
+def tree():
+    return PCNHierarchy(FRAME)
+
+
+def test_options(tree):
+    assert tree.counties() == ["Kakamega", "Nairobi"]
+    assert tree.subcounties("Kakamega") == ["Lurambi", "Mumias"]
+    assert tree.subcounties(ALL) == []
+    assert tree.pcns("Kakamega") == ["Butsotso", "Mumias East", "Shinyalu"]
+    assert tree.pcns("Kakamega", "Lurambi") == ["Butsotso", "Shinyalu"]
+    assert tree.pcns(ALL) == []
+
+
+def test_positions(tree):
+    np.testing.assert_array_equal(tree.positions(), np.arange(len(FRAME)))
+    np.testing.assert_array_equal(tree.positions("Kakamega"), [0, 1, 2])
+    np.testing.assert_array_equal(tree.positions("Kakamega", "Mumias"), [2])
+    np.testing.assert_array_equal(tree.positions("Nairobi", ALL, "Njiru"), [3, 4])
+    np.testing.assert_array_equal(tree.positions("Kakamega", "Lurambi", "Butsotso"), [1])
+    assert len(tree.positions("Turkana")) == 0
+
+
+def test_valid_resets_what_is_not_under_the_level_above(tree):
+    assert tree.valid("Kakamega", "Embakasi", "Njiru") == ("Kakamega", ALL, ALL)
+    assert tree.valid("Turkana", "Lurambi", "Butsotso") == (ALL, ALL, ALL)
+    assert tree.valid("Kakamega", ALL, "Mumias East") == ("Kakamega", ALL, "Mumias East")
+
+
+def test_paths(tree):
+    paths = tree.paths()
+    assert paths[:4] == [(ALL, ALL, ALL), ("Kakamega", ALL, ALL), ("Kakamega", "Lurambi", ALL),
+                         ("Kakamega", "Lurambi", "Butsotso")]
+    assert len(paths) == len(set(paths)) == 1 + 2 + 3 + 4
+
+
+def test_array_round_trip(tree):
+    nodes, positions = tree.to_arrays()
+    rebuilt = PCNHierarchy.from_arrays(tree.levels, nodes, positions)
+    assert rebuilt.paths() == tree.paths()
+    for path in tree.paths():
+        np.testing.assert_array_equal(rebuilt.positions(*path), tree.positions(*path))
+    np.testing.assert_array_equal(rebuilt.positions("Nairobi", ALL, "Njiru"), [3, 4])
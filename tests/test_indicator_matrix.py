@@ -0,0 +1,96 @@
+"""
+Binning, percentiles, NaN-aware distances and clustering of the indicator heatmap,
+on matrices small enough to work out by hand.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from indicator_matrix import (SCALES, IndicatorMatrix, bin_means, bin_starts, cluster_order, nan_sq_distances,
+                              percentile_scores)
+
+NAN = np.nan
+
+
+def test_bin_starts():
+    # few enough rows: one per bin
+    np.testing.assert_array_equal(bin_starts(3, 4), [0, 1, 2])
+    # ten rows into at most four bins of ceil(10 / 4) = 3
+    np.testing.assert_array_equal(bin_starts(10, 4), [0, 3, 6, 9])
+    # groups of 4 and 6 rows: bins of 3 fit in four without crossing the boundary at 4
+    np.testing.assert_array_equal(bin_starts(10, 4, group_starts=np.array([0, 4])), [0, 3, 4, 7])
+    # groups of 1, 1 and 8 need bins of 4 to stay within four
+    np.testing.assert_array_equal(bin_starts(10, 4, group_starts=np.array([0, 1, 2])), [0, 1, 2, 6])
+    # more groups than bins: the boundaries are ignored
+    np.testing.assert_array_equal(bin_starts(10, 2, group_starts=np.array([0, 1, 2])), [0, 5])
+
+
+def test_bin_means_skip_nan():
+    X = np.array([[1.0, NAN], [3.0, NAN], [NAN, NAN], [5.0, 2.0]])
+    np.testing.assert_allclose(bin_means(X, np.array([0, 2]), axis=0), [[2.0, NAN], [5.0, 2.0]])
+    np.testing.assert_allclose(bin_means(X, np.array([0]), axis=1), [[1.0], [3.0], [NAN], [3.5]])
+
+
+def test_percentile_scores():
+    X = np.array([[1.0, 10.0], [2.0, 30.0], [3.0, 20.0], [NAN, NAN]])
+    scores = percentile_scores(X, np.array([False, True]))
+    np.testing.assert_allclose(scores[:, 0], [100 / 3, 200 / 3, 100.0, NAN])
+    # flipped: the lowest value is the best
+    np.testing.assert_allclose(scores[:, 1], [100.0, 100 / 3, 200 / 3, NAN])
+
+
+def test_nan_sq_distances():
+    X = np.array([[0.0, 0.0], [1.0, NAN], [NAN, NAN], [2.0, 4.0]])
+    D, shared = nan_sq_distances(X)
+    np.testing.assert_allclose(shared[0], [2, 1, 0, 2])
+    # row 0 vs row 3: (4 + 16) / 2; vs row 1 only the first column counts
+    np.testing.assert_allclose(D[0], [0.0, 1.0, NAN, 10.0])
+    np.testing.assert_allclose(D, D.T)
+
+
+def test_cluster_order_keeps_similar_rows_together():
+    X = np.array([[0.0], [10.0], [1.0], [11.0], [NAN]])
+    order = cluster_order(X).tolist()
+    assert sorted(order) == [0, 1, 2, 3, 4]
+    # the empty row goes last, and each close pair stays adjacent
+    assert order[-1] == 4
+    assert abs(order.index(0) - order.index(2)) == 1
+    assert abs(order.index(1) - order.index(3)) == 1
+    # past max_rows, runs of rows sorted by mean are clustered as units
+    X = np.array([[5.0], [0.0], [6.0], [1.0], [7.0], [2.0]])
+    order = cluster_order(X, max_rows=3).tolist()
+    assert sorted(order) == list(range(6))
+    assert {frozenset(order[i:i + 2]) for i in (0, 2, 4)} == {frozenset({1, 3}), frozenset({5, 0}), frozenset({2, 4})}
+
+
+@pytest.fixture
+def matrix():
+    df = pd.DataFrame({
+        'County': ["A", "B", "A", "B", "A"],
+        'PCN': ["a1", "b1", "a2", "b2", "a3"],
+        'x': [1.0, 2.0, 3.0, 4.0, 5.0],
+        'y': [5.0, NAN, 3.0, 2.0, 1.0],
+        'z': [0.0, 0.0, 0.0, 0.0, 0.0],
+        'label': ["p", "q", "r", "s", "t"],
+    })
+    return IndicatorMatrix(df, ['x', 'y', 'z', 'label', 'missing'])
+
+
+def test_heatmap_bins_within_counties(matrix):
+    assert matrix.indicators == ['x', 'y', 'z']
+    cells = matrix.heatmap(SCALES[1], 'County, then name', max_rows=3, max_cols=2)
+    assert cells['shape'] == (5, 3)
+    assert cells['binned']
+    # county A (a1, a2, a3) in bins of 2 and 1, county B (b1, b2) in one
+    np.testing.assert_array_equal(cells['row_counts'], [2, 1, 2])
+    np.testing.assert_array_equal(cells['col_counts'], [2, 1])
+    assert cells['row_labels'] == ["A: a1 ... a2", "A: a3", "B: b1 ... b2"]
+    assert cells['col_labels'] == ["x ... y", "z"]
+    assert cells['county_names'] == ["A", "B"]
+    np.testing.assert_array_equal(cells['county_starts'], [0, 2])
+    # rows are averaged first, then columns: b1, b2 give x = 3 and y = 2 (b1 has no y), so 2.5
+    np.testing.assert_allclose(cells['z'], [[3.0, 0.0], [3.0, 0.0], [2.5, 0.0]])
+
+    unbinned = matrix.heatmap(SCALES[0], 'All PCNs by mean percentile', max_rows=10, max_cols=10)
+    assert not unbinned['binned']
+    assert unbinned['z'].shape == (5, 3)
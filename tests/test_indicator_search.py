@@ -0,0 +1,54 @@
+"""
+Indicator search: exact, prefix and misspelt words, across both levels.
+"""
+import pytest
+
+from indicator_search import IndicatorIndex, catalog_entries, edit_distance, max_typos
+
+COUNTY_KEYWORDS = {"Governance": ["Perfomance Review Score", "CHMT Support Supervision Score"]}
+PCN_KEYWORDS = {"HRH": ["Nurse to population ratio", "Doctor to population ratio"]}
+COLUMNS = ["County", "Perfomance Review Score", "CHMT Support Supervision Score",
+           "Nurse to population ratio", "Doctor to population ratio"]
+
+
+@pytest.fixture
+def index():
+    entries = catalog_entries("County", COLUMNS, COUNTY_KEYWORDS) + catalog_entries("PCN", COLUMNS, PCN_KEYWORDS)
+    return IndicatorIndex(entries)
+
+
+def test_edit_distance():
+    assert edit_distance("perfomance", "performance", 2) == 1
+    assert edit_distance("refferal", "referral", 2) == 2
+    # an adjacent swap is one edit
+    assert edit_distance("nusre", "nurse", 1) == 1
+    assert edit_distance("nurse", "doctor", 2) == 3
+    assert [max_typos(w) for w in ("hrh", "nurse", "supervision")] == [0, 1, 2]
+
+
+def test_catalog_entries():
+    assert catalog_entries("PCN", COLUMNS, PCN_KEYWORDS) == [
+        ("PCN", "HRH", "Nurse to population ratio"), ("PCN", "HRH", "Doctor to population ratio")]
+
+
+def test_exact_prefix_and_typo(index):
+    assert index.search("nurse")[0][2] == "Nurse to population ratio"
+    assert index.search("nurse")[0][3] == 1.0
+    # "performance" is misspelt in the header itself
+    hit = index.search("performance review")[0]
+    assert hit[:3] == ("County", "Governance", "Perfomance Review Score")
+    assert hit[3] == pytest.approx(0.8)
+    # while typing: "supervi" is a prefix of "supervision"
+    assert index.search("supervi")[0][2] == "CHMT Support Supervision Score"
+
+
+def test_every_word_has_to_match(index):
+    assert {hit[2] for hit in index.search("population ratio")} == {
+        "Nurse to population ratio", "Doctor to population ratio"}
+    assert index.search("nurse supervision") == []
+    assert index.search("   ") == []
+
+
+def test_level_filter(index):
+    assert index.search("score", level="PCN") == []
+    assert {hit[0] for hit in index.search("score")} == {"County"}
@@ -0,0 +1,185 @@
+"""
+Latency and payload budgets for the dashboard interactions.
+
+Each dataset ("real": the CSVs in the repo, "scaled": the PCN table replicated
+PCN_TEST_SCALE times under new PCN names) is walked once through the app with
+AppTest: first load, pillar change, indicator change, county drill-down and
+subcounty filter. Every step is then checked against its wall-time and payload
+budget from latency_budgets.json. The payload is the serialized size of every
+element the run produced, which is what goes over the wire to the browser.
+
+The budgets assume the simplified boundary files of `python geo_partitions.py`
+(the full-precision national shapefile alone is ~16 MB per rerun), so the ADM2
+partitions are built into a temporary folder first, unless PCN_GEOMETRY_DIR
+already holds a current build; without the shapefile the tests fail. The payload
+budgets are the partitioned sizes plus about 10%, the wall-time budgets about three
+times the slowest of three runs, and no scaled budget is below its real one.
+
+    PCN_BUDGET_FILE    other budget file (same layout as latency_budgets.json)
+    PCN_BUDGET_FACTOR  multiplies every wall-time budget, for slower machines (default 1)
+    PCN_TEST_SCALE     replication factor of the scaled dataset (default 20)
+    PCN_GEOMETRY_DIR   prebuilt partitions to reuse instead of building them
+"""
+import csv
+import json
+import os
+import shutil
+import time
+
+import pytest
+
+pytest.importorskip("streamlit.testing.v1")
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+from geo_partitions import PARTITION_DIR_ENV_VAR, PARTITION_LEVELS, build_level, partition_index  # noqa: E402
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(REPO, "dashboard3.0.py")
+COUNTY_CSV = os.path.join(REPO, "county_lvl_data.csv")
+PCN_CSV = os.path.join(REPO, "pcn_lvl_data.csv")
+BUDGET_FILE = os.environ.get("PCN_BUDGET_FILE", os.path.join(os.path.dirname(__file__), "latency_budgets.json"))
+BUDGET_FACTOR = float(os.environ.get("PCN_BUDGET_FACTOR", "1"))
+SCALE = int(os.environ.get("PCN_TEST_SCALE", "20"))
+CSV_ENCODING = "ISO-8859-1"  # same as PCN_SCHEMA
+
+# (step name, widget kind, key or label, value to select, or option index when the value is an int)
+STEPS = [
+    ("pillar change", "selectbox", "county_pillar", 2),
+    ("indicator change", "selectbox", "county_indicator", 1),
+    ("county drill-down", "selectbox", "County (PCN data)", "Kakamega"),
+    ("subcounty filter", "selectbox", "Subcounty", 1),
+]
+STEP_NAMES = ["initial load"] + [step[0] for step in STEPS]
+DATASETS = ["real", "scaled"]
+
+with open(BUDGET_FILE, encoding="utf-8") as fh:
+    BUDGETS = json.load(fh)
+
+
+def make_scaled_pcn_csv(src, dst, scale):
+    # every data row repeated `scale` times; copies after the first get " #k" on their PCN name
+    with open(src, newline="", encoding=CSV_ENCODING) as fh:
+        rows = list(csv.reader(fh))
+    header, data = rows[0], rows[1:]
+    pcn_col = [h.replace("\xa0", " ").strip() for h in header].index("PCN")
+    with open(dst, "w", newline="", encoding=CSV_ENCODING) as fh:
+        writer = csv.writer(fh)
+        writer.writerow(header)
+        for k in range(scale):
+            for row in data:
+                row = list(row)
+                if k and row[pcn_col].strip():
+                    row[pcn_col] = f"{row[pcn_col]} #{k}"
+                writer.writerow(row)
+
+
+def payload_bytes(node):
+    size = 0
+    proto = getattr(node, "proto", None)
+    if proto is not None and hasattr(proto, "ByteSize"):
+        size += proto.ByteSize()
+    for child in getattr(node, "children", {}).values():
+        size += payload_bytes(child)
+    return size
+
+
+def find_widget(at, kind, match):
+    for element in getattr(at, kind):
+        if getattr(element, "key", None) == match or getattr(element, "label", None) == match:
+            return element
+    raise AssertionError(f"no {kind} with key or label {match!r}")
+
+
+def timed_run(at):
+    start = time.perf_counter()
+    at.run()
+    wall_ms = (time.perf_counter() - start) * 1000
+    assert not at.exception, [e.value for e in at.exception]
+    return {"wall_ms": wall_ms, "payload_kb": payload_bytes(at._tree) / 1024,
+            "captions": [c.value for c in at.caption]}
+
+
+def build_partitions(folder):
+    # the index is keyed on the shapefile path as the app spells it (relative to the repo), so build from there
+    cwd = os.getcwd()
+    os.chdir(REPO)
+    try:
+        prebuilt = os.environ.get(PARTITION_DIR_ENV_VAR)
+        if prebuilt and partition_index('adm2', os.path.abspath(prebuilt)) is not None:
+            return os.path.abspath(prebuilt)
+        if build_level('adm2', folder) is None:
+            pytest.fail(f"{PARTITION_LEVELS['adm2']['shape']} not found: the budgets assume the ADM2 partitions")
+        return folder
+    finally:
+        os.chdir(cwd)
+
+
+def walk(county_csv, pcn_csv, geometry_dir):
+    saved = {k: os.environ.get(k) for k in ("PCN_COUNTY_CSV", "PCN_PCN_CSV", PARTITION_DIR_ENV_VAR)}
+    os.environ["PCN_COUNTY_CSV"], os.environ["PCN_PCN_CSV"] = county_csv, pcn_csv
+    os.environ[PARTITION_DIR_ENV_VAR] = geometry_dir
+    cwd = os.getcwd()
+    os.chdir(REPO)  # shapefile paths in the app are relative to the repo
+    try:
+        at = AppTest.from_file(APP, default_timeout=600)
+        results = {"initial load": timed_run(at)}
+        for name, kind, match, value in STEPS:
+            widget = find_widget(at, kind, match)
+            if isinstance(value, int):
+                widget.select_index(min(value, len(widget.options) - 1))
+            else:
+                widget.select(value)
+            results[name] = timed_run(at)
+        return results
+    finally:
+        os.chdir(cwd)
+        for k, v in saved.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+
+
+@pytest.fixture(scope="module")
+def measurements(tmp_path_factory):
+    folder = tmp_path_factory.mktemp("scaled")
+    scaled_pcn = str(folder / "pcn_lvl_data.csv")
+    make_scaled_pcn_csv(PCN_CSV, scaled_pcn, SCALE)
+    # the county table has one row per county, so it is not scaled; a copy keeps the cache keys apart
+    scaled_county = str(folder / "county_lvl_data.csv")
+    shutil.copyfile(COUNTY_CSV, scaled_county)
+    geometry_dir = build_partitions(str(tmp_path_factory.mktemp("geometry")))
+    results = {
+        "real": walk(COUNTY_CSV, PCN_CSV, geometry_dir),
+        "scaled": walk(scaled_county, scaled_pcn, geometry_dir),
+    }
+    print("\n" + "\n".join(
+        f"{dataset:>6} {step:<18} {r['wall_ms']:8.0f} ms {r['payload_kb']:9.0f} KB"
+        for dataset, steps in results.items() for step, r in steps.items()
+    ))
+    return results
+
+
+def test_scaled_data_is_loaded(measurements):
+    # the national PCN table caption ("Rows 1-25 of N") shows how many rows the app read
+    real_rows = [c for c in measurements["real"]["initial load"]["captions"] if c.startswith("Rows ")]
+    scaled_rows = [c for c in measurements["scaled"]["initial load"]["captions"] if c.startswith("Rows ")]
+    assert real_rows and scaled_rows
+    n_real = int(real_rows[0].rsplit(" ", 1)[1])
+    assert scaled_rows[0].endswith(f" of {n_real * SCALE}")
+
+
+@pytest.mark.parametrize("dataset", DATASETS)
+@pytest.mark.parametrize("step", STEP_NAMES)
+def test_wall_time_budget(measurements, dataset, step):
+    budget = BUDGETS[dataset][step]["wall_ms"] * BUDGET_FACTOR
+    took = measurements[dataset][step]["wall_ms"]
+    assert took <= budget, f"{dataset} / {step}: {took:.0f} ms, budget {budget:.0f} ms"
+
+
+@pytest.mark.parametrize("dataset", DATASETS)
+@pytest.mark.parametrize("step", STEP_NAMES)
+def test_payload_budget(measurements, dataset, step):
+    budget = BUDGETS[dataset][step]["payload_kb"]
+    size = measurements[dataset][step]["payload_kb"]
+    assert size <= budget, f"{dataset} / {step}: {size:.0f} KB sent, budget {budget:.0f} KB"
@@ -0,0 +1,94 @@
+"""
+Histogram buckets, the text format, and counted()'s hit/miss on a plain dict
+memo standing in for st.cache_data: it runs the function only for a new key.
+"""
+import functools
+
+import pytest
+
+import metrics
+from metrics import Registry, counted
+
+
+def memo(func):
+    results = {}
+
+    @functools.wraps(func)
+    def call(*args):
+        if args not in results:
+            results[args] = func(*args)
+        return results[args]
+
+    call.clear = results.clear
+    return call
+
+
+@pytest.fixture
+def registry(monkeypatch, tmp_path):
+    # metrics are only collected when an exporter is configured
+    monkeypatch.setenv(metrics.FILE_ENV_VAR, str(tmp_path / "metrics.prom"))
+    registry = Registry()
+    monkeypatch.setattr(metrics, "REGISTRY", registry)
+    return registry
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    for value in (0.02, 0.3, 0.3, 50.0):
+        registry.observe('pcn_rerun_seconds', {'section': 'total'}, value, metrics.RERUN_BUCKETS)
+    h = registry.histograms[('pcn_rerun_seconds', (('section', 'total'),))]
+    buckets = dict(zip(h.buckets, h.counts))
+    assert (buckets[0.01], buckets[0.025], buckets[0.25], buckets[0.5], buckets[30.0]) == (0, 1, 1, 3, 3)
+    # 50 s is past the last bound: only the count (+Inf) and sum see it
+    assert h.total == 4
+    assert h.sum == pytest.approx(50.62)
+
+    text = registry.render()
+    assert 'pcn_rerun_seconds_bucket{section="total",le="0.5"} 3' in text
+    assert 'pcn_rerun_seconds_bucket{section="total",le="+Inf"} 4' in text
+    assert 'pcn_rerun_seconds_count{section="total"} 4' in text
+    assert "# TYPE pcn_rerun_seconds histogram" in text
+
+
+def test_counted_records_hits_and_misses(registry):
+    calls = []
+
+    @counted(memo)
+    def square(x):
+        calls.append(x)
+        return x * x
+
+    assert [square(2), square(2), square(3), square(2)] == [4, 4, 9, 4]
+    assert calls == [2, 3]
+    counters = registry.counters
+    assert counters[('pcn_cache_requests_total', (('function', 'square'), ('layer', 'memory'), ('result', 'miss')))] == 2
+    assert counters[('pcn_cache_requests_total', (('function', 'square'), ('layer', 'memory'), ('result', 'hit')))] == 2
+    # clear() reaches the wrapped cache
+    square.clear()
+    square(2)
+    assert calls == [2, 3, 2]
+
+
+def test_nested_counted_calls_mark_their_own_frame(registry):
+    @counted(memo)
+    def inner(x):
+        return x + 1
+
+    @counted(memo)
+    def outer(x):
+        return inner(x) * 2
+
+    inner(1)
+    # outer misses, but the inner call it makes is a hit
+    assert outer(1) == 4
+    assert registry.counters[('pcn_cache_requests_total', (('function', 'outer'), ('layer', 'memory'), ('result', 'miss')))] == 1
+    assert registry.counters[('pcn_cache_requests_total', (('function', 'inner'), ('layer', 'memory'), ('result', 'hit')))] == 1
+
+
+def test_nothing_recorded_when_disabled(monkeypatch):
+    monkeypatch.delenv(metrics.PORT_ENV_VAR, raising=False)
+    monkeypatch.delenv(metrics.FILE_ENV_VAR, raising=False)
+    registry = Registry()
+    monkeypatch.setattr(metrics, "REGISTRY", registry)
+    counted(memo)(abs)(-1)
+    assert registry.counters == {}
@@ -0,0 +1,70 @@
+"""
+PCN filter state: the indicator-search jump, the batched form and the URL.
+
+The jump buttons in the sidebar set the PCN pillar / indicator pickers from a
+callback; with "Apply filters together" on, the pickers are the form's, which
+keep their own widget state, so the jump has to land there too.
+"""
+import os
+
+import pytest
+
+pytest.importorskip("streamlit.testing.v1")
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(REPO, "dashboard3.0.py")
+TIMEOUT = 300
+
+# a PCN indicator outside the default (first) pillar
+JUMP_QUERY = "Nurse to population ratio"
+JUMP_TARGET = ("7. Human Resources for Health (HRH)", "Nurse to population ratio")
+
+
+def run_app(query_params=None):
+    at = AppTest.from_file(APP, default_timeout=TIMEOUT)
+    for name, value in (query_params or {}).items():
+        at.query_params[name] = value
+    at.run()
+    assert not at.exception, [e.value for e in at.exception]
+    return at
+
+
+def jump(at, query):
+    # search, then click the first PCN-level result
+    at.text_input(key="indicator_search").input(query).run()
+    buttons = [b for b in at.button if b.label.endswith(f"(PCN: {JUMP_TARGET[0]})")]
+    assert buttons, [b.label for b in at.button]
+    buttons[0].click().run()
+    assert not at.exception, [e.value for e in at.exception]
+    return at
+
+
+def test_jump_sets_the_pcn_pickers():
+    at = jump(run_app(), JUMP_QUERY)
+    assert (at.selectbox(key="pcn_pillar").value, at.selectbox(key="pcn_indicator").value) == JUMP_TARGET
+    assert at.query_params["indicator"] == JUMP_TARGET[1]
+
+
+def test_jump_sets_the_batched_form():
+    at = run_app()
+    at.toggle(key="pcn_batched").set_value(True).run()
+    assert at.selectbox(key="pcn_form_indicator").value != JUMP_TARGET
+    at = jump(at, JUMP_QUERY)
+    assert at.selectbox(key="pcn_form_indicator").value == JUMP_TARGET
+    assert at.query_params["pillar"] == JUMP_TARGET[0]
+    assert at.query_params["indicator"] == JUMP_TARGET[1]
+    # the form doesn't snap back on the next rerun
+    at.run()
+    assert at.selectbox(key="pcn_form_indicator").value == JUMP_TARGET
+
+
+def test_selection_survives_switching_modes():
+    at = run_app({"county": "Kakamega"})
+    assert at.selectbox(key="pcn_county").value == "Kakamega"
+    at.toggle(key="pcn_batched").set_value(True).run()
+    assert at.selectbox(key="pcn_form_area").value[0] == "Kakamega"
+    at = jump(at, JUMP_QUERY)
+    at.toggle(key="pcn_batched").set_value(False).run()
+    assert at.selectbox(key="pcn_county").value == "Kakamega"
+    assert at.selectbox(key="pcn_indicator").value == JUMP_TARGET[1]
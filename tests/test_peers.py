@@ -0,0 +1,79 @@
+"""
+Peer order on a table where the answer is known.
+
+Every indicator carries the same values, so after standardizing each PCN sits at
+one z-score on all of them and the distance between two PCNs is just the gap
+between their z-scores: the nearest peers are the closest values, ties broken by
+row position.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from peers import PeerIndex, standardize
+
+VALUES = [0.0, 1.0, 3.0, 10.0, 1.0]
+# "stock out" makes the last indicator lower-is-better
+INDICATORS = ["Coverage", "Proportion of PCNs Established", "Days of stock out"]
+
+
+def make_frame(values=VALUES):
+    df = pd.DataFrame({
+        "County": ["Kakamega"] * len(values),
+        "Sub county": ["Lurambi"] * len(values),
+        "PCN": [f"PCN {i}" for i in range(len(values))],
+    })
+    for col in INDICATORS:
+        df[col] = values
+    return df
+
+
+def test_standardize():
+    X = np.array([[1.0, 5.0, np.nan], [3.0, 5.0, 2.0], [np.nan, 5.0, np.nan]])
+    Z = standardize(X)
+    np.testing.assert_allclose(Z[:, 0], [-1.0, 1.0, np.nan])
+    # a constant column is only centred; NaN stays NaN
+    np.testing.assert_allclose(Z[:, 1], [0.0, 0.0, 0.0])
+    np.testing.assert_allclose(Z[:, 2], [np.nan, 0.0, np.nan])
+
+
+def test_peer_order_and_distances():
+    index = PeerIndex(make_frame(), INDICATORS, max_k=4)
+    z = standardize(np.array(VALUES)[:, None])[:, 0]
+    # PCN 0: PCN 1 and PCN 4 tie at value 1 and come in row order, then 3, then 10
+    assert index.neighbours[0].tolist() == [1, 4, 2, 3]
+    np.testing.assert_allclose(index.distances[0], np.abs(z[[1, 4, 2, 3]] - z[0]))
+    # PCN 1 and PCN 4 are each other's nearest, at distance 0
+    assert index.neighbours[1, 0] == 4 and index.distances[1, 0] == 0
+    assert (index.shared[index.neighbours >= 0] == len(INDICATORS)).all()
+
+
+def test_blocks_give_the_same_peers():
+    df = make_frame()
+    whole = PeerIndex(df, INDICATORS, max_k=3)
+    blocked = PeerIndex(df, INDICATORS, max_k=3, block=2)
+    np.testing.assert_array_equal(whole.neighbours, blocked.neighbours)
+    np.testing.assert_allclose(whole.distances, blocked.distances)
+
+
+def test_too_few_shared_indicators_means_no_peers():
+    df = make_frame()
+    df.loc[3, INDICATORS[1:]] = np.nan
+    index = PeerIndex(df, INDICATORS, max_k=4, min_shared=2)
+    assert "Kakamega / Lurambi / PCN 3" not in index.with_peers
+    assert (index.neighbours[3] == -1).all()
+    assert 3 not in index.neighbours[0].tolist()
+    table, deltas = index.peers(3)
+    assert table.empty and deltas.shape == (len(INDICATORS), 2)
+
+
+def test_peers_table_counts_better_and_worse():
+    index = PeerIndex(make_frame(), INDICATORS, max_k=4)
+    table, deltas = index.peers(index.position("Kakamega / Lurambi / PCN 0"), k=2)
+    assert table["PCN"].tolist() == ["PCN 1", "PCN 4"]
+    assert table["Rank"].tolist() == [1, 2]
+    # +1 on every indicator: better on the two higher-is-better ones, worse on stock-outs
+    assert table["Better on"].tolist() == [2, 2]
+    assert table["Worse on"].tolist() == [1, 1]
+    assert deltas["Lower is better"].tolist() == [False, False, True]
+    assert deltas["1. PCN 1"].tolist() == pytest.approx([1.0, 1.0, 1.0])
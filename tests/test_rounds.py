@@ -0,0 +1,87 @@
+"""
+Round-over-round deltas, ranks and direction on two small county tables.
+
+Names are paired on county_key, so case and punctuation differences between the
+rounds don't matter. "Stillbirth rate" is one of the LOWER_IS_BETTER indicators:
+a drop is an improvement there and rank 1 is the lowest value.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from rounds import RoundComparison, lower_is_better
+
+BEFORE = pd.DataFrame({
+    "County": ["Kakamega", "Nairobi", "Kisumu", "Mombasa"],
+    "Coverage": [50.0, 80.0, 40.0, 10.0],
+    "Stillbirth rate": [20.0, 10.0, 30.0, 5.0],
+    "Old indicator": [1.0, 2.0, 3.0, 4.0],
+})
+AFTER = pd.DataFrame({
+    "County": ["kakamega", "NAIROBI ", "Kisumu", "Turkana"],
+    "Coverage": [60.0, 70.0, 40.0, 90.0],
+    "Stillbirth rate": [10.0, 15.0, np.nan, 8.0],
+})
+
+
+@pytest.fixture
+def comparison():
+    return RoundComparison(BEFORE, AFTER, "County")
+
+
+def test_pairing(comparison):
+    assert comparison.names["County"].tolist() == ["kakamega", "NAIROBI ", "Kisumu"]
+    assert comparison.only_before == ["mombasa"]
+    assert comparison.only_after == ["turkana"]
+    assert comparison.indicators == ["Coverage", "Stillbirth rate"]
+    assert comparison.dropped_indicators == ["Old indicator"]
+
+
+def test_deltas(comparison):
+    stats = comparison.stats
+    np.testing.assert_allclose(stats["delta"]["Coverage"], [10.0, -10.0, 0.0])
+    np.testing.assert_allclose(stats["pct"]["Coverage"], [20.0, -12.5, 0.0])
+    np.testing.assert_allclose(stats["delta"]["Stillbirth rate"], [-10.0, 5.0, np.nan])
+    # higher coverage is better; a lower stillbirth rate is better
+    np.testing.assert_allclose(stats["direction"]["Coverage"], [1.0, -1.0, 0.0])
+    np.testing.assert_allclose(stats["direction"]["Stillbirth rate"], [1.0, -1.0, np.nan])
+
+
+def test_ranks(comparison):
+    stats = comparison.stats
+    # coverage before 50, 80, 40 -> 2, 1, 3; after 60, 70, 40 -> 2, 1, 3
+    np.testing.assert_allclose(stats["rank_before"]["Coverage"], [2.0, 1.0, 3.0])
+    np.testing.assert_allclose(stats["rank_shift"]["Coverage"], [0.0, 0.0, 0.0])
+    # stillbirths before 20, 10, 30 -> 2, 1, 3 (lowest first); after 10, 15, NaN -> 1, 2, unranked
+    np.testing.assert_allclose(stats["rank_before"]["Stillbirth rate"], [2.0, 1.0, 3.0])
+    np.testing.assert_allclose(stats["rank_after"]["Stillbirth rate"], [1.0, 2.0, np.nan])
+    np.testing.assert_allclose(stats["rank_shift"]["Stillbirth rate"], [1.0, -1.0, np.nan])
+
+
+def test_indicator_frame_puts_the_biggest_improvement_first(comparison):
+    frame = comparison.indicator_frame("Stillbirth rate")
+    assert frame["County"].tolist() == ["kakamega", "NAIROBI ", "Kisumu"]
+    assert frame["Change"].tolist()[:2] == [-10.0, 5.0]
+    frame = comparison.indicator_frame("Coverage")
+    assert frame["County"].tolist() == ["kakamega", "Kisumu", "NAIROBI "]
+
+
+def test_summary(comparison):
+    summary = comparison.summary().set_index("Indicator")
+    assert summary.loc["Coverage", ["Improved", "Declined", "Unchanged", "Not comparable"]].tolist() == [1, 1, 1, 0]
+    assert summary.loc["Stillbirth rate", ["Improved", "Declined", "Not comparable"]].tolist() == [1, 1, 1]
+    assert summary.loc["Coverage", "Mean change"] == pytest.approx(0.0)
+    assert summary["Lower is better"].tolist() == [False, True]
+
+
+def test_repeated_names_are_left_out():
+    before = pd.concat([BEFORE, BEFORE.iloc[[0]]], ignore_index=True)
+    comparison = RoundComparison(before, AFTER, "County")
+    assert comparison.unpaired["unnamed or repeated (before)"] == 2
+    assert "kakamega" not in comparison.names["County"].tolist()
+
+
+def test_lower_is_better():
+    assert lower_is_better("Stillbirth rate per 1000 births")
+    assert lower_is_better("Number of tracer commodities with a STOCK OUT")
+    assert not lower_is_better("Coverage")
@@ -0,0 +1,103 @@
+"""
+Pillar and total scores from the weight matrix, checked against hand arithmetic.
+
+Two pillars: P1 has Coverage and Budget, P2 has a stock-out indicator (lower is
+better, so it is flipped to 100 - x). A missing indicator drops out of its pillar
+instead of counting as zero. "Total" is the table's published score, the
+baseline scenarios are compared against.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from scoring import (ScoringEngine, compare_rankings, rank_desc, reported_total_column, split_pillar_keywords,
+                     to_score_scale)
+
+KEYWORDS = {
+    "P1": ["Coverage", "Budget", "P1 Score", "P1 Weighted Score"],
+    "P2": ["Days of stock out", "P2 Score"],
+    "Overall": ["Total Score (Total Weighted Score)"],
+}
+FRAME = pd.DataFrame({
+    "County": ["Kakamega", "Nairobi", "Kisumu"],
+    "Coverage": [50.0, 70.0, np.nan],
+    "Budget": [100.0, np.nan, np.nan],
+    "Days of stock out": [10.0, 40.0, np.nan],
+    "P1 Score": [60.0, 20.0, 40.0],
+    "P1 Weighted Score": [6.0, 2.0, 4.0],
+    "P2 Score": [30.0, 90.0, np.nan],
+    "Total Score (Total Weighted Score)": [70.0, 40.0, np.nan],
+})
+
+
+def engine(source="indicators"):
+    return ScoringEngine(FRAME, KEYWORDS, ["County"], source)
+
+
+def test_split_pillar_keywords():
+    split = split_pillar_keywords(KEYWORDS)
+    assert split["P1"] == (["Coverage", "Budget"], ["P1 Score", "P1 Weighted Score"])
+    assert split["P2"] == (["Days of stock out"], ["P2 Score"])
+
+
+def test_to_score_scale():
+    X = np.array([[200.0, 10.0], [400.0, 40.0], [np.nan, np.nan]])
+    # the first column is outside 0-100 and gets min-max scaled; the stock-out column is flipped
+    np.testing.assert_allclose(to_score_scale(X, ["Amount", "Days of stock out"]),
+                               [[0.0, 90.0], [100.0, 60.0], [np.nan, np.nan]])
+
+
+def test_pillar_scores_skip_missing_indicators():
+    scores = engine().pillar_scores()
+    np.testing.assert_allclose(scores, [[75.0, 90.0], [70.0, 60.0], [np.nan, np.nan]])
+    # Coverage counts three times as much as Budget
+    np.testing.assert_allclose(engine().pillar_scores({"Coverage": 3.0})[0], [62.5, 90.0])
+
+
+def test_total_and_rank():
+    scored = engine().score()
+    np.testing.assert_allclose(scored["Total"], [82.5, 65.0, np.nan])
+    np.testing.assert_allclose(scored["Rank"], [1.0, 2.0, np.nan])
+    weighted = engine().score(pillar_weights={"P1": 3.0, "P2": 1.0})
+    np.testing.assert_allclose(weighted["Total"], [78.75, 67.5, np.nan])
+
+
+def test_reported_scores():
+    e = engine("reported")
+    assert e.pillar_columns == {"P1": ["P1 Score"], "P2": ["P2 Score"]}
+    scored = e.score()
+    # Kisumu has no P2 score, so its total is P1 alone
+    np.testing.assert_allclose(scored["Total"], [45.0, 55.0, 40.0])
+    assert scored["Rank"].tolist() == [2.0, 1.0, 3.0]
+
+
+def test_rank_desc_ties():
+    np.testing.assert_allclose(rank_desc([5.0, 7.0, 7.0, np.nan, 1.0]), [3.0, 1.0, 1.0, np.nan, 4.0])
+
+
+def test_compare_rankings():
+    e = engine("reported")
+    baseline = e.score()
+    scenario = e.score(pillar_weights={"P1": 1.0, "P2": 0.0})
+    compared = compare_rankings(baseline, scenario, ["County"])
+    assert compared["County"].tolist() == ["Kakamega", "Kisumu", "Nairobi"]
+    assert compared["Rank Shift"].tolist() == [1.0, 1.0, -2.0]
+
+
+def test_published_baseline():
+    e = engine("reported")
+    assert reported_total_column(list(FRAME.columns), KEYWORDS) == "Total Score (Total Weighted Score)"
+    published = e.published_scores()
+    np.testing.assert_allclose(published["Rank"], [1.0, 2.0, np.nan])
+    compared = compare_rankings(published, e.score(), ["County"], label="Published")
+    # equal weights put Nairobi first; Kisumu has no published total, so no shift
+    assert compared["County"].tolist() == ["Nairobi", "Kakamega", "Kisumu"]
+    assert compared["Published Rank"].tolist()[:2] == [2.0, 1.0]
+    np.testing.assert_allclose(compared["Rank Shift"], [1.0, -1.0, np.nan])
+    no_total = ScoringEngine(FRAME.drop(columns="Total Score (Total Weighted Score)"), KEYWORDS, ["County"])
+    assert no_total.published_scores() is None
+
+
+def test_unknown_source():
+    with pytest.raises(ValueError):
+        engine("weighted")
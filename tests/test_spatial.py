@@ -0,0 +1,76 @@
+"""
+Adjacency and Moran's I on a hand-built map: four polygons in a row, A-B-C-D.
+
+With values 1, 2, 3, 4 the deviations are z = -1.5, -0.5, 0.5, 1.5 (sum of squares
+5) and the row-standardized spatial lag of z is -0.5, -0.5, 0.5, 0.5, so
+I = sum(z * lag) / sum(z^2) = 2 / 5.
+"""
+import numpy as np
+import pytest
+
+from spatial import SpatialWeights, adjacency_pairs, global_morans_i, local_morans_i
+
+KEYS = ["A", "B", "C", "D"]
+# A: B | B: A, C | C: B, D | D: C
+INDPTR = [0, 1, 3, 5, 6]
+INDICES = [1, 0, 2, 1, 3, 2]
+VALUES = [1.0, 2.0, 3.0, 4.0]
+
+
+@pytest.fixture
+def weights():
+    return SpatialWeights(KEYS, INDPTR, INDICES)
+
+
+def test_adjacency_pairs_of_boxes_in_a_row():
+    shapely = pytest.importorskip("shapely")
+    boxes = np.array([shapely.box(i, 0, i + 1, 1) for i in range(4)])
+    i, j = adjacency_pairs(boxes)
+    assert sorted(zip(i.tolist(), j.tolist())) == [(0, 1), (1, 0), (1, 2), (2, 1), (2, 3), (3, 2)]
+
+
+def test_lag_is_the_neighbour_mean(weights):
+    np.testing.assert_allclose(weights.lag(VALUES), [2.0, 2.0, 3.0, 3.0])
+    # a stack of vectors at once, and 0 for a polygon without neighbours
+    stacked = weights.lag(np.array([VALUES, VALUES[::-1]]))
+    np.testing.assert_allclose(stacked, [[2.0, 2.0, 3.0, 3.0], [3.0, 3.0, 2.0, 2.0]])
+    island = SpatialWeights(KEYS, [0, 1, 2, 2, 2], [1, 0])
+    np.testing.assert_allclose(island.lag(VALUES), [2.0, 1.0, 0.0, 0.0])
+
+
+def test_global_morans_i_by_hand(weights):
+    result = global_morans_i(weights, VALUES, permutations=99)
+    assert result["I"] == pytest.approx(0.4)
+    assert result["expected"] == pytest.approx(-1 / 3)
+    assert result["n"] == 4
+    assert 0 < result["p_value"] <= 1
+    # alternating values: z = -1.5, 1.5, -0.5, 0.5, lag = 1.5, -1, 1, -0.5, so I = -4.5 / 5
+    assert global_morans_i(weights, [1.0, 4.0, 2.0, 3.0], permutations=99)["I"] == pytest.approx(-0.9)
+
+
+def test_missing_values_drop_out(weights):
+    # D has no value, so the map is A-B-C with z = -1, 0, 1 and every lag 0
+    result = global_morans_i(weights, [1.0, 2.0, 3.0, np.nan], permutations=99)
+    assert result["n"] == 3
+    assert result["I"] == pytest.approx(0.0)
+    # fewer than three comparable polygons: no statistic
+    assert np.isnan(global_morans_i(weights, [1.0, np.nan, 3.0, 4.0])["I"])
+
+
+def test_local_morans_i(weights):
+    local = local_morans_i(weights, VALUES, permutations=99)
+    assert local["key"].tolist() == KEYS
+    np.testing.assert_allclose(local["lag"], [2.0, 2.0, 3.0, 3.0])
+    # I_i = z_i * lag(z)_i on standardized values; the local values add up to n * I
+    z = (np.array(VALUES) - 2.5) / np.std(VALUES)
+    np.testing.assert_allclose(local["I"], z * weights.lag(z))
+    assert local["I"].sum() == pytest.approx(4 * 0.4)
+    # four polygons can't reach p <= 0.05
+    assert (local["cluster"] == "Not significant").all()
+
+
+def test_subset_drops_edges(weights):
+    sub = weights.subset([True, True, False, True])
+    assert sub.keys.tolist() == ["A", "B", "D"]
+    assert sub.neighbours.tolist() == [1, 1, 0]
+    np.testing.assert_allclose(weights.align(["D", "A", "A"], [4.0, 1.0, 3.0]), [2.0, np.nan, np.nan, 4.0])
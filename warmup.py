@@ -0,0 +1,133 @@
+"""
+Background cache warm-up for the dashboard.
+
+The first session after a deploy normally pays for CSV cleaning, geometry
+loading and the first figure of every pillar. CacheWarmer runs those same
+cached functions on a daemon thread, one task at a time from a priority queue,
+and backs off whenever a real session has rerun recently so it never competes
+with a user for the GIL.
+
+Which selections get warmed beyond the defaults is learned from a small local
+usage log (one JSON object per line) written by the dashboard itself.
+"""
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+from collections import Counter
+
+# opt-in: nothing is logged or warmed unless this is set to "1"
+WARMUP_ENV_VAR = "PCN_DASHBOARD_WARMUP"
+USAGE_LOG_ENV_VAR = "PCN_USAGE_LOG"
+DEFAULT_USAGE_LOG = "usage_log.jsonl"
+
+
+def warmup_enabled():
+    return os.environ.get(WARMUP_ENV_VAR, "0") == "1"
+
+
+def usage_log_path():
+    return os.environ.get(USAGE_LOG_ENV_VAR, DEFAULT_USAGE_LOG)
+
+
+_log_lock = threading.Lock()
+
+
+def log_selection(view, selection, path=None):
+    # one line per rerun; the dashboard calls this with the active widget values
+    record = {"ts": round(time.time(), 3), "view": view, "selection": selection}
+    line = json.dumps(record, ensure_ascii=False)
+    with _log_lock:
+        try:
+            with open(path or usage_log_path(), "a", encoding="utf-8") as fh:
+                fh.write(line + "\n")
+        except OSError:
+            # usage logging must never take the page down
+            pass
+
+
+def top_selections(view, n, path=None):
+    # most frequent selections for a view, most used first
+    counts = Counter()
+    try:
+        with open(path or usage_log_path(), encoding="utf-8") as fh:
+            for line in fh:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get("view") != view:
+                    continue
+                counts[json.dumps(record.get("selection"), sort_keys=True)] += 1
+    except OSError:
+        return []
+    return [json.loads(key) for key, _ in counts.most_common(n)]
+
+
+class CacheWarmer:
+    """Runs warm-up tasks in priority order (lowest number first) on a daemon thread."""
+
+    def __init__(self, idle_seconds=1.0, poll_seconds=0.2):
+        self.idle_seconds = idle_seconds
+        self.poll_seconds = poll_seconds
+        self._queue = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._last_activity = 0.0
+        self._thread = None
+        self._stopped = False
+        self.done = []
+        self.failed = []
+
+    def submit(self, priority, name, fn, *args, **kwargs):
+        with self._cond:
+            heapq.heappush(self._queue, (priority, next(self._seq), name, fn, args, kwargs))
+            self._cond.notify()
+
+    def note_activity(self):
+        # called at the top of every real rerun; the worker waits until things are quiet
+        self._last_activity = time.monotonic()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="pcn-cache-warmer", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+    def status(self):
+        with self._cond:
+            pending = len(self._queue)
+        return {"done": len(self.done), "failed": len(self.failed), "pending": pending}
+
+    def _wait_for_idle(self):
+        while not self._stopped:
+            quiet_for = time.monotonic() - self._last_activity
+            if quiet_for >= self.idle_seconds:
+                return
+            time.sleep(max(self.poll_seconds, self.idle_seconds - quiet_for))
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._stopped:
+                    self._cond.wait()
+                if self._stopped:
+                    return
+                priority, _, name, fn, args, kwargs = heapq.heappop(self._queue)
+            self._wait_for_idle()
+            if self._stopped:
+                return
+            started = time.perf_counter()
+            try:
+                fn(*args, **kwargs)
+            except Exception as e:
+                self.failed.append((name, repr(e)))
+            else:
+                self.done.append((name, time.perf_counter() - started))